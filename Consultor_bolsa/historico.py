@@ -0,0 +1,107 @@
+"""
+Redução do histórico de cotações para os gráficos.
+
+- agregar_ohlc: junta os dias em candles semanais/mensais no banco
+  (GROUP BY por semana/mês) e busca abertura/fechamento numa consulta extra.
+- lttb: Largest-Triangle-Three-Buckets sobre o fechamento, escolhendo os
+  pontos que preservam a forma da curva (áreas calculadas com NumPy).
+
+As séries circulam como tuplas na ordem de CAMPOS_OHLC (saídas de values_list).
+"""
+from datetime import date
+from operator import itemgetter
+
+import numpy as np
+from django.db.models import Max, Min, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+TRUNC_POR_RESOLUCAO = {
+    "semanal": TruncWeek,
+    "mensal": TruncMonth,
+}
+
+CAMPOS_OHLC = ("data", "abertura", "alta", "baixa", "fechamento", "volume")
+
+EPOCA_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def agregar_ohlc(qs, resolucao):
+    """
+    `qs`: AcaoHistorico de uma ação já filtrado pelo período.
+    Retorna uma lista de tuplas na ordem de CAMPOS_OHLC, uma por semana/mês,
+    datadas pelo primeiro pregão do grupo.
+    """
+    trunc = TRUNC_POR_RESOLUCAO[resolucao]
+    grupos = list(
+        qs.order_by()
+        .annotate(grupo=trunc("data"))
+        .values("grupo")
+        .annotate(inicio=Min("data"), fim=Max("data"), alta=Max("alta"), baixa=Min("baixa"), volume=Sum("volume"))
+        .order_by("grupo")
+        .values_list("inicio", "fim", "alta", "baixa", "volume")
+    )
+    if not grupos:
+        return []
+
+    datas = {g[0] for g in grupos} | {g[1] for g in grupos}
+    extremos = {
+        d: (abertura, fechamento)
+        for d, abertura, fechamento in qs.order_by("data").filter(data__in=datas)
+        .values_list("data", "abertura", "fechamento")
+    }
+
+    return [
+        (inicio, extremos[inicio][0], alta, baixa, extremos[fim][1], volume)
+        for inicio, fim, alta, baixa, volume in grupos
+    ]
+
+
+def dias_desde_epoca(d):
+    """
+    Data como número de dias desde 1970-01-01 (formato colunar).
+    """
+    return d.toordinal() - EPOCA_ORDINAL
+
+
+def lttb(pontos, max_pontos, valor=itemgetter(CAMPOS_OHLC.index("fechamento"))):
+    """
+    Reduz `pontos` (ordenados no tempo) para até `max_pontos`, mantendo o
+    primeiro e o último. O eixo x é a posição do ponto na série.
+
+    Os limites dos baldes e as médias de cada próximo balde saem de uma vez; em cada balde, as áreas dos triângulos são
+    calculadas juntas. Só o laço sobre os baldes continua, porque o vértice
+    `a` de cada triângulo é o ponto escolhido no balde anterior.
+    """
+    n = len(pontos)
+    if max_pontos <= 0 or max_pontos >= n:
+        return list(pontos)
+    if max_pontos < 3:
+        return [pontos[0], pontos[-1]][:max_pontos]
+
+    ys = np.fromiter((float(valor(p) or 0) for p in pontos), dtype=float, count=n)
+    xs = np.arange(n)
+    baldes = max_pontos - 2
+    largura = (n - 2) / baldes
+    limites = (np.arange(baldes + 2) * largura).astype(int) + 1
+
+    # Média do próximo balde (ou o último ponto, no último balde)
+    prox_inicio = limites[1:baldes + 1].copy()
+    prox_fim = np.minimum(limites[2:], n)
+    vazios = prox_inicio >= prox_fim
+    prox_inicio[vazios], prox_fim[vazios] = n - 1, n
+    # Soma de cada fatia [inicio, fim) num reduceat só (o 0 extra cobre fim == n)
+    somas = np.add.reduceat(np.append(ys, 0.0), np.column_stack((prox_inicio, prox_fim)).ravel())[::2]
+    medias_x = (prox_inicio + prox_fim - 1) / 2
+    medias_y = somas / (prox_fim - prox_inicio)
+
+    escolhidos = [0]
+    a = 0
+    for i in range(baldes):
+        inicio, fim = limites[i], limites[i + 1]
+        ay = ys[a]
+        areas = np.abs((a - medias_x[i]) * (ys[inicio:fim] - ay) - (a - xs[inicio:fim]) * (medias_y[i] - ay))
+        a = int(inicio + np.argmax(areas))
+        escolhidos.append(a)
+
+    escolhidos.append(n - 1)
+    return [pontos[i] for i in escolhidos]
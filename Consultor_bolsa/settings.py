@@ -85,6 +85,18 @@ DATABASES = {
     }
 }
 
+# Com DB_HOST definido, o Django usa o mesmo Postgres dos serviços do Monitoramento
+# (motor de alertas, produtor e consumidor leem e gravam as tabelas tela_cadastro_*)
+if os.getenv('DB_HOST'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'HOST': os.getenv('DB_HOST'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+        'NAME': os.getenv('DB_NAME'),
+        'USER': os.getenv('DB_USER'),
+        'PASSWORD': os.getenv('DB_PASS'),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -134,3 +146,42 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 BRAPI_TOKEN = os.getenv("BRAPI_TOKEN", "")
+
+# Busca de cotações na BRAPI: requisições simultâneas e timeout (s) por requisição
+BRAPI_MAX_CONCORRENCIA = int(os.getenv("BRAPI_MAX_CONCORRENCIA", "8"))
+BRAPI_TIMEOUT = float(os.getenv("BRAPI_TIMEOUT", "10"))
+# Quantidade de tickers por chamada /quote/{T1,...,TN} (use 1 em planos que não aceitam múltiplos)
+BRAPI_TAMANHO_LOTE = int(os.getenv("BRAPI_TAMANHO_LOTE", "10"))
+# O cliente HTTP da BRAPI (api/brapi.py, também usado pelo Monitoramento) lê do ambiente:
+# BRAPI_CACHE_TTL (s, 0 desliga), BRAPI_REQUISICOES_POR_MINUTO e BRAPI_MAX_TENTATIVAS
+# Junta requisições iguais à BRAPI também entre processos (advisory lock do Postgres +
+# cache do Django, que deve ser compartilhado); dentro de um processo isso é sempre feito
+BRAPI_COALESCER_ENTRE_PROCESSOS = os.getenv("BRAPI_COALESCER_ENTRE_PROCESSOS", "false").lower() in ("1", "true", "yes")
+
+# Publica eventos de Monitoramento no RabbitMQ para o motor de alertas (Monitoramento/services)
+MONITORAMENTO_PUBLICAR_EVENTOS = bool(os.getenv("CLOUDAMQP_URL") or os.getenv("RABBITMQ_HOST"))
+
+# Tarefas de atualização da BRAPI (api/tarefas.py): "local" (threads do processo), "rabbitmq"
+# (fila_tarefas; exige `manage.py executar_tarefas` rodando) ou "imediato" (na própria thread)
+TAREFAS_MODO = os.getenv("TAREFAS_MODO", "local")
+TAREFAS_THREADS_LOCAIS = int(os.getenv("TAREFAS_THREADS_LOCAIS", "2"))
+# Tarefa EXECUTANDO há mais que isso (s) é tratada como interrompida
+TAREFAS_TIMEOUT_SEGUNDOS = int(os.getenv("TAREFAS_TIMEOUT_SEGUNDOS", "1800"))
+
+# Views assíncronas da BRAPI (api/views_async.py, sob ASGI): conexões do httpx por event loop
+# e lotes /quote em voo por requisição
+BRAPI_ASYNC_MAX_CONEXOES = int(os.getenv("BRAPI_ASYNC_MAX_CONEXOES", "200"))
+BRAPI_ASYNC_MAX_CONCORRENCIA = int(os.getenv("BRAPI_ASYNC_MAX_CONCORRENCIA", "50"))
+
+# Cache do Django (locmem por padrão; ex.: DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache)
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", "consultor-bolsa"),
+    }
+}
+# Tempo máximo (s) dos payloads de cotações no cache; gravações em Acao invalidam antes disso
+COTACOES_CACHE_TTL = int(os.getenv("COTACOES_CACHE_TTL", "300"))
+
+# Catálogo local de tickers (api/catalogo.py): idade máxima antes de baixar de novo da BRAPI
+CATALOGO_TTL_SEGUNDOS = int(os.getenv("CATALOGO_TTL_SEGUNDOS", str(24 * 3600)))
@@ -4,6 +4,7 @@ from django.conf.urls.static import static
 
 from Consultor_bolsa import settings
 from api import views as brapi
+from api import views_async as brapi_async
 from . import view
 from tela_cadastro import views as tc
 
@@ -29,11 +30,20 @@ urlpatterns = [
     path("ajax/adicionar-acao-completa/", brapi.adicionar_acao_completa, name="ajax_adicionar_acao_completa"),
     path('api/testar-essencial/', brapi.atualizar_acoes_completas, name='testar_essencial'),
     path("api/historico/<str:ticker>/", brapi.historico_acao, name="ajax_historico_acao"),
+    path("api/tarefas/<uuid:tarefa_id>/", brapi.status_tarefa, name="api_status_tarefa"),
+    path("ajax/sugerir-tickers/", brapi.sugerir_tickers, name="ajax_sugerir_tickers"),
+    # --------------------------------------------------------------
+
+    # ------------------------- brapi (async, para ASGI) ------------
+    path("ajax/async/adicionar-acao-completa/", brapi_async.adicionar_acao_completa, name="ajax_adicionar_acao_completa_async"),
+    path("api/async/testar-essencial/", brapi_async.atualizar_acoes_completas, name="testar_essencial_async"),
+    path("api/async/historico/<str:ticker>/", brapi_async.historico_acao, name="ajax_historico_acao_async"),
     # --------------------------------------------------------------
 
     # ------------------------- Gráfico ----------------------------
     path("banco/acoes/basicas/", view.dados_basicos_acoes, name="api_dados_basicos_acoes"),
     path("banco/historico_ou_basico/<str:ticker>/", view.historico_ou_basico, name="api_historico_ou_basico"),
+    path("banco/indicadores/<str:ticker>/", view.indicadores_acao, name="api_indicadores_acao"),
     # --------------------------------------------------------------
 ]
 
@@ -1,11 +1,18 @@
+import json
 from datetime import date, timedelta
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect, get_object_or_404
+from django.views.decorators.gzip import gzip_page
 from django.views.decorators.http import require_POST,require_GET
-from django.http import JsonResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags
 
-from tela_cadastro.models import Acao, AcaoHistorico, Monitoramento, Usuario
+from Consultor_bolsa.historico import CAMPOS_OHLC, TRUNC_POR_RESOLUCAO, agregar_ohlc, dias_desde_epoca, lttb
+from tela_cadastro.cache_cotacoes import payload_em_cache
+from tela_cadastro.indicadores import atualizar_indicadores
+from tela_cadastro.models import Acao, AcaoHistorico, AcaoIndicador, Monitoramento, Usuario
 
 @login_required(login_url='login')
 def home(request):
@@ -48,52 +55,86 @@ def criar_monitoramento(request):
 
     return redirect(request.META.get('HTTP_REFERER', 'listar_acoes'))
 
+def _serializar_dados_basicos():
+    acoes = Acao.objects.order_by("abreviacao").values_list(
+        "abreviacao", "nome", "valor_atual", "percentual_mudanca", "setor", "market_cap"
+    )
+    dados = [
+        {
+            "ticker": abreviacao,
+            "nome": nome,
+            "valor": valor,
+            "variacao": variacao,
+            "setor": setor or "",
+            "market_cap": market_cap,
+        }
+        for abreviacao, nome, valor, variacao, setor, market_cap in acoes
+    ]
+    return json.dumps({"ok": True, "dados": dados}, cls=DjangoJSONEncoder).encode()
+
+
 @require_GET
 def dados_basicos_acoes(request):
     """
     Retorna os dados básicos das ações cadastradas (sem histórico).
+    O JSON fica no cache até a próxima gravação de Acao; com If-None-Match
+    igual ao ETag responde 304 sem corpo.
     """
     try:
-        acoes = Acao.objects.all().order_by("abreviacao")
-        dados = [
-            {
-                "ticker": a.abreviacao,
-                "nome": a.nome,
-                "valor": a.valor_atual,
-                "variacao": a.percentual_mudanca,
-                "setor": a.setor or "",
-                "market_cap": a.market_cap,
-            }
-            for a in acoes
-        ]
-        return JsonResponse({"ok": True, "dados": dados})
+        corpo, etag = payload_em_cache("basicas", _serializar_dados_basicos)
     except Exception as e:
         return JsonResponse({"ok": False, "erro": str(e)})
 
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        resposta = HttpResponseNotModified()
+    else:
+        resposta = HttpResponse(corpo, content_type="application/json")
+    resposta["ETag"] = etag
+    # O navegador guarda a resposta, mas revalida a cada uso
+    resposta["Cache-Control"] = "no-cache"
+    return resposta
+
 
 
+DIAS_POR_PERIODO = {
+    "1w": 7,
+    "1mo": 30,
+    "3mo": 90,
+    "6mo": 180,
+    "1y": 365,
+    "2y": 730,
+    "5y": 1825,
+}
+
+
+@gzip_page
 @require_GET
 def historico_ou_basico(request, ticker):
     """
-    Retorna o histórico da ação filtrando pelo período (ex: 1w, 1mo, 3mo, 6mo, 1y),
+    Retorna o histórico da ação filtrando pelo período (ex: 1w, 1mo, 3mo, 6mo, 1y, 5y),
     ou, se não houver registros, retorna apenas o valor atual da ação.
+
+    Parâmetros opcionais para reduzir a série:
+      - resolucao: diaria (padrão), semanal ou mensal (candles OHLC agregados no banco);
+      - max_points: no máximo N pontos, escolhidos por LTTB sobre o fechamento;
+      - formato=colunar: `dados` vira um objeto de listas paralelas, com as datas
+        em dias desde 1970-01-01.
+    A resposta é comprimida com gzip quando o cliente aceita.
     """
     periodo = request.GET.get("periodo", "1mo").lower()
+    resolucao = request.GET.get("resolucao", "diaria").lower()
+    if resolucao != "diaria" and resolucao not in TRUNC_POR_RESOLUCAO:
+        return JsonResponse({"ok": False, "erro": f"Resolução '{resolucao}' inválida."}, status=400)
+    try:
+        max_points = int(request.GET.get("max_points", 0))
+    except ValueError:
+        return JsonResponse({"ok": False, "erro": "max_points deve ser um inteiro."}, status=400)
+    colunar = request.GET.get("formato", "").lower() == "colunar"
     hoje = date.today()
 
-    # 🔹 Define o intervalo com base no período
-    if periodo == "1w":
-        data_minima = hoje - timedelta(days=7)
-    elif periodo == "1mo":
-        data_minima = hoje - timedelta(days=30)
-    elif periodo == "3mo":
-        data_minima = hoje - timedelta(days=90)
-    elif periodo == "6mo":
-        data_minima = hoje - timedelta(days=180)
-    elif periodo == "1y":
-        data_minima = hoje - timedelta(days=365)
-    else:
-        data_minima = None  # caso inesperado
+    # 🔹 Define o intervalo com base no período (None = histórico inteiro)
+    dias = DIAS_POR_PERIODO.get(periodo)
+    data_minima = hoje - timedelta(days=dias) if dias else None
 
     try:
         acao = Acao.objects.get(abreviacao__iexact=ticker)
@@ -105,37 +146,99 @@ def historico_ou_basico(request, ticker):
     if data_minima:
         qs = qs.filter(data__gte=data_minima)
 
-    historicos = qs.order_by("data").values("data", "fechamento", "abertura", "alta", "baixa", "volume")
+    if resolucao == "diaria":
+        historicos = list(qs.order_by("data").values_list(*CAMPOS_OHLC))
+    else:
+        historicos = agregar_ohlc(qs, resolucao)
+    total_pontos = len(historicos)
+    if max_points:
+        historicos = lttb(historicos, max_points)
 
-    if historicos.exists():
-        dados = [
-            {
-                "data": h["data"].strftime("%d/%m/%Y") if h["data"] else "",
-                "fechamento": float(h.get("fechamento") or 0),
-                "abertura": float(h.get("abertura") or 0),
-                "alta": float(h.get("alta") or 0),
-                "baixa": float(h.get("baixa") or 0),
-                "volume": int(h.get("volume") or 0),
-            }
-            for h in historicos
-        ]
+    if historicos:
         origem = "historico"
     else:
         # 🔸 Se não há histórico, retorna o dado básico atual
-        dados = [{
-            "data": acao.atualizado_em.strftime("%d/%m/%Y") if getattr(acao, "atualizado_em", None) else "",
-            "fechamento": float(acao.valor_atual or 0),
-            "abertura": float(acao.preco_abertura or 0),
-            "alta": float(acao.alta_dia or 0),
-            "baixa": float(acao.baixa_dia or 0),
-            "volume": int(acao.volume or 0),
-        }]
+        historicos = [(
+            acao.atualizado_em.date() if getattr(acao, "atualizado_em", None) else None,
+            acao.preco_abertura,
+            acao.alta_dia,
+            acao.baixa_dia,
+            acao.valor_atual,
+            acao.volume,
+        )]
         origem = "basico"
 
+    if colunar:
+        datas, aberturas, altas, baixas, fechamentos, volumes = zip(*historicos)
+        dados = {
+            "data": [dias_desde_epoca(d) if d else None for d in datas],
+            "abertura": aberturas,
+            "alta": altas,
+            "baixa": baixas,
+            "fechamento": fechamentos,
+            "volume": [int(v or 0) for v in volumes],
+        }
+    else:
+        dados = [
+            {
+                "data": d.strftime("%d/%m/%Y") if d else "",
+                "fechamento": float(fechamento or 0),
+                "abertura": float(abertura or 0),
+                "alta": float(alta or 0),
+                "baixa": float(baixa or 0),
+                "volume": int(volume or 0),
+            }
+            for d, abertura, alta, baixa, fechamento, volume in historicos
+        ]
+
     return JsonResponse({
         "ok": True,
         "ticker": acao.abreviacao,
         "periodo": periodo,
         "origem": origem,
+        "resolucao": resolucao,
+        "total_pontos": total_pontos,
+        "formato": "colunar" if colunar else "linhas",
+        "dados": dados,
+    }, json_dumps_params={"separators": (",", ":")} if colunar else None)
+
+
+CAMPOS_INDICADORES = (
+    "fechamento", "sma_20", "sma_50", "ema_12", "ema_26", "rsi_14",
+    "bollinger_superior", "bollinger_inferior", "volatilidade_20",
+)
+
+
+@require_GET
+def indicadores_acao(request, ticker):
+    """
+    Retorna os indicadores técnicos (SMA, EMA, RSI, Bollinger, volatilidade)
+    gravados em AcaoIndicador, no mesmo filtro de período do historico_ou_basico.
+    Se a ação ainda não tem indicadores, calcula na hora.
+    """
+    periodo = request.GET.get("periodo", "1mo").lower()
+    dias = DIAS_POR_PERIODO.get(periodo)
+    data_minima = date.today() - timedelta(days=dias) if dias else None
+
+    try:
+        acao = Acao.objects.get(abreviacao__iexact=ticker)
+    except Acao.DoesNotExist:
+        return JsonResponse({"ok": False, "erro": f"Ação '{ticker}' não encontrada."}, status=404)
+
+    if not AcaoIndicador.objects.filter(acao=acao).exists():
+        atualizar_indicadores(acao)
+
+    qs = AcaoIndicador.objects.filter(acao=acao)
+    if data_minima:
+        qs = qs.filter(data__gte=data_minima)
+
+    dados = [
+        {"data": d.strftime("%d/%m/%Y"), **dict(zip(CAMPOS_INDICADORES, valores))}
+        for d, *valores in qs.order_by("data").values_list("data", *CAMPOS_INDICADORES)
+    ]
+    return JsonResponse({
+        "ok": True,
+        "ticker": acao.abreviacao,
+        "periodo": periodo,
         "dados": dados,
-    })
\ No newline at end of file
+    })
@@ -1,12 +1,24 @@
 import os 
+import threading
+from contextlib import contextmanager
+
 import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
+
+
+def _env_bool(nome, padrao=False):
+    valor = os.getenv(nome)
+    if valor is None:
+        return padrao
+    return valor.strip().lower() in ('1', 'true', 'sim', 'yes')
+
 
 class Database:
     
-    def __init__(self): 
+    def __init__(self, pool=None, min_size=None, max_size=None): 
         self.db_host = os.getenv('DB_HOST')
-        self.db_port = int(os.getenv('DB_PORT'))
+        self.db_port = int(os.getenv('DB_PORT', '5432'))
         self.db_name = os.getenv('DB_NAME')
         self.db_user = os.getenv('DB_USER')
         self.db_pass = os.getenv('DB_PASS')
@@ -20,9 +32,18 @@ class Database:
             f"password={self.db_pass}"
         )
         
+        # Modo pool (DB_POOL=1): várias threads dividem até max_size conexões
+        self.usa_pool = _env_bool('DB_POOL') if pool is None else pool
+        self.min_size = min_size or int(os.getenv('DB_POOL_MIN', '1'))
+        self.max_size = max_size or int(os.getenv('DB_POOL_MAX', '10'))
+        self.pool = None
+        
         self.connection = None
+        self._local = threading.local()
         
     def connect(self):
+        if self.usa_pool:
+            return self._abrir_pool()
         try: 
             self.connection = psycopg.connect(
                 self.conn_string, 
@@ -35,39 +56,119 @@ class Database:
             print(f"Falha ao conectar ao banco de dados: {e}")
             raise
     
-    def execute_query(self, query, params=None):
-        if not self.connection: 
-            self.connect()
-            
+    def _abrir_pool(self):
+        if self.pool is None:
+            try:
+                self.pool = ConnectionPool(
+                    self.conn_string,
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    kwargs={'row_factory': dict_row, 'autocommit': True},
+                    check=ConnectionPool.check_connection,
+                    open=True,
+                )
+                self.pool.wait()
+                print(f"Pool de conexões aberto ({self.min_size}-{self.max_size} conexões).")
+            except Exception as e:
+                print(f"Falha ao abrir pool de conexões: {e}")
+                self.pool = None
+                raise
+        return self.pool
+    
+    @contextmanager
+    def conexao(self):
+        """
+        Entrega uma conexão: a do pool (modo pool) ou a conexão única.
+        Chamadas aninhadas na mesma thread reaproveitam a mesma conexão, então os
+        helpers (insert_acao, register_worker, ...) participam da transação aberta
+        por quem os chamou.
+        """
+        atual = getattr(self._local, 'conexao', None)
+        if atual is not None:
+            yield atual
+            return
+        
+        if self.usa_pool:
+            with self._abrir_pool().connection() as conn:
+                self._local.conexao = conn
+                try:
+                    yield conn
+                finally:
+                    self._local.conexao = None
+        else:
+            if not self.connection or self.connection.closed:
+                self.connect()
+            yield self.connection
+    
+    @contextmanager
+    def transacao(self):
+        """
+        Agrupa várias instruções numa transação (commit no fim, rollback em erro).
+        """
+        with self.conexao() as conn, conn.transaction():
+            yield conn
+    
+    def execute_query(self, query, params=None, prepare=None):
         try: 
-           with self.connection.cursor() as cursor:
-                cursor.execute(query, params or ())
+           with self.conexao() as conn, conn.cursor() as cursor:
+                cursor.execute(query, params or (), prepare=prepare)
                 return cursor.fetchall()
         except Exception as e:
             print(f"Erro ao executar query: {e}")
             raise
     
-    def execute_update(self, query, params=None):
-        if not self.connection: 
-            self.connect()
-            
+    def execute_update(self, query, params=None, prepare=None):
         try: 
-           with self.connection.cursor() as cursor:
-                cursor.execute(query, params or ())
+           with self.conexao() as conn, conn.cursor() as cursor:
+                cursor.execute(query, params or (), prepare=prepare)
                 return cursor.rowcount
         except Exception as e:
             print(f"Erro ao executar update: {e}")
             raise
         
+    def executemany(self, query, params_seq):
+        """
+        Executa a mesma instrução para várias linhas numa única transação, em
+        pipeline mode: as instruções são enviadas sem esperar cada resposta.
+        """
+        try:
+            with self.transacao() as conn, conn.pipeline(), conn.cursor() as cursor:
+                cursor.executemany(query, params_seq)
+                return cursor.rowcount
+        except Exception as e:
+            print(f"Erro ao executar executemany: {e}")
+            raise
+    
+    def copy_merge(self, sql_staging, tabela_staging, colunas, linhas, sql_merge, params_merge=None):
+        """
+        Carrega `linhas` com COPY ... FROM STDIN numa tabela temporária e aplica
+        `sql_merge` (insert ... select ... on conflict) no destino, tudo na mesma
+        transação. `sql_staging` cria a tabela temporária (use ON COMMIT DROP).
+        """
+        try:
+            with self.transacao() as conn, conn.cursor() as cursor:
+                cursor.execute(sql_staging)
+                with cursor.copy(f"COPY {tabela_staging} ({', '.join(colunas)}) FROM STDIN") as copy:
+                    for linha in linhas:
+                        copy.write_row(linha)
+                cursor.execute(sql_merge, params_merge or ())
+                return cursor.rowcount
+        except Exception as e:
+            print(f"Erro ao executar copy_merge: {e}")
+            raise
+        
     def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+            print("Pool de conexões fechado.")
         if self.connection:
             self.connection.close()
             print("Conexão com o banco de dados fechada.")    
             
     # funções workers       
             
-def register_worker(db, nome, host='localhost', port=None):
-        query = """
+SQL_REGISTER_WORKER = """
             insert into worker (nome, host, porta, status, ultimo_heartbeat) 
             values(%s, %s, %s, 'online', CURRENT_TIMESTAMP)
             on conflict (nome) 
@@ -75,29 +176,52 @@ def register_worker(db, nome, host='localhost', port=None):
                 status = 'online',
                 ultimo_heartbeat = CURRENT_TIMESTAMP
             RETURNING id;
-            """        
-        result = db.execute_query(query, (nome, host, port))    
-        return result[0]['id'] if result else None
-    
-    
-def update_worker_heartbeat(db, nome, tempo_atividade):
-        query = """
+            """
+
+SQL_HEARTBEAT_WORKER = """
             update worker 
             set ultimo_heartbeat = CURRENT_TIMESTAMP,
                 tempo_atividade = %s
             where nome = %s;
-            """        
-        db.execute_update(query, (tempo_atividade, nome))
-        
-        return db.execute_update(query, (tempo_atividade, nome))
+            """
+
+# Vários workers numa instrução só: arrays paralelos de nomes e tempos
+SQL_HEARTBEAT_WORKERS = """
+            update worker w
+            set ultimo_heartbeat = CURRENT_TIMESTAMP,
+                tempo_atividade = v.tempo_atividade
+            from unnest(%s::text[], %s::integer[]) as v(nome, tempo_atividade)
+            where w.nome = v.nome;
+            """
+
+# Só toca o líder antigo e o novo, e nada se o líder já for `nome`
+SQL_SET_LIDER = """
+            update worker
+            set is_lider = (nome = %s)
+            where (is_lider or nome = %s)
+              and is_lider is distinct from (nome = %s);
+            """
+            
+def register_worker(db, nome, host='localhost', port=None):
+        result = db.execute_query(SQL_REGISTER_WORKER, (nome, host, port), prepare=True)    
+        return result[0]['id'] if result else None
+    
+    
+def update_worker_heartbeat(db, nome, tempo_atividade):
+        return db.execute_update(SQL_HEARTBEAT_WORKER, (tempo_atividade, nome), prepare=True)
+    
+def update_workers_heartbeat(db, heartbeats):
+        """
+        `heartbeats`: lista de (nome, tempo_atividade), gravada num único UPDATE.
+        """
+        if not heartbeats:
+            return 0
+        nomes = [nome for nome, _ in heartbeats]
+        tempos = [int(tempo) for _, tempo in heartbeats]
+        return db.execute_update(SQL_HEARTBEAT_WORKERS, (nomes, tempos), prepare=True)
     
 def set_worker_lider(db, nome):
-        db.execute_update("UPDATE worker SET is_lider = FALSE")
-        query = """
-            update worker 
-            set is_lider = TRUE where nome = %s;
-            """        
-        return db.execute_update(query, (nome,))
+        return db.execute_update(SQL_SET_LIDER, (nome, nome, nome), prepare=True)
     
 def get_all_workers(db):
         query = "SELECT * FROM worker order by nome"
@@ -105,24 +229,105 @@ def get_all_workers(db):
     
     # funções ação
     
-def insert_acao(db, abreviacao, nome, valor_atual):
-        query = """
-            insert into acao (abreviacao, nome, moeda, valor_atual, atualizado_em)
-            values (%s, %s, 'BRL', %s, CURRENT_TIMESTAMP)
+# tela_cadastro_acao é a tabela Acao do Django. O default=0 dos campos numéricos
+# só existe no ORM, então uma ação nova entra com eles zerados aqui
+COLUNAS_INSERT_ACAO = """abreviacao, nome, moeda, valor_atual, alta_dia, baixa_dia,
+                percentual_mudanca, variacao, volume, preco_abertura, preco_anterior,
+                market_cap, atualizado_em"""
+    
+SQL_INSERT_ACAO = f"""
+            insert into tela_cadastro_acao ({COLUNAS_INSERT_ACAO})
+            values (%s, %s, 'BRL', %s, 0, 0, 0, 0, 0, 0, 0, 0, CURRENT_TIMESTAMP)
             on conflict (abreviacao)
             do update set
                 valor_atual = EXCLUDED.valor_atual,
                 atualizado_em = CURRENT_TIMESTAMP                
             RETURNING id    
             """
-        result = db.execute_query(query, (abreviacao, nome, valor_atual))
+    
+def insert_acao(db, abreviacao, nome, valor_atual):
+        result = db.execute_query(SQL_INSERT_ACAO, (abreviacao, nome, valor_atual))
         return result[0]['id'] if result else None
     
+# Acima disso o lote vai por COPY + merge em vez de executemany
+LIMITE_COPY_ACOES = int(os.getenv('DB_LIMITE_COPY', '1000'))
+
+SQL_STAGING_ACAO = """
+            create temp table acao_staging (
+                ordem integer,
+                abreviacao text,
+                nome text,
+                valor_atual numeric
+            ) on commit drop
+            """
+
+SQL_MERGE_ACAO = f"""
+            insert into tela_cadastro_acao ({COLUNAS_INSERT_ACAO})
+            select distinct on (abreviacao) abreviacao, nome, 'BRL', valor_atual,
+                   0, 0, 0, 0, 0, 0, 0, 0, CURRENT_TIMESTAMP
+            from acao_staging
+            order by abreviacao, ordem desc
+            on conflict (abreviacao)
+            do update set
+                valor_atual = EXCLUDED.valor_atual,
+                atualizado_em = CURRENT_TIMESTAMP
+            """
+    
+def insert_acoes(db, linhas):
+        """
+        `linhas`: lista de (abreviacao, nome, valor_atual). Lotes pequenos vão
+        por executemany em pipeline; lotes grandes por COPY numa tabela
+        temporária seguido de um único upsert (se o ticker se repetir, vale a
+        última linha).
+        """
+        if not linhas:
+            return 0
+        if len(linhas) < LIMITE_COPY_ACOES:
+            return db.executemany(SQL_INSERT_ACAO, linhas)
+        return db.copy_merge(
+            SQL_STAGING_ACAO,
+            'acao_staging',
+            ['ordem', 'abreviacao', 'nome', 'valor_atual'],
+            ((i, abreviacao, nome, valor) for i, (abreviacao, nome, valor) in enumerate(linhas)),
+            SQL_MERGE_ACAO,
+        )
+    
 def get_acao(db, abreviacao):
-        query = "SELECT * FROM acao WHERE abreviacao = %s"
+        query = "SELECT * FROM tela_cadastro_acao WHERE abreviacao = %s"
         result = db.execute_query(query, (abreviacao,))
         return result[0] if result else None
     
+    # funções monitoramento
+    
+SQL_TICKERS_MONITORADOS = """
+            select distinct a.abreviacao
+            from tela_cadastro_monitoramento m
+            join tela_cadastro_acao a on a.id = m.acao_id
+            where m.ativo
+            order by a.abreviacao
+            """
+    
+def get_tickers_monitorados(db):
+        return [r['abreviacao'] for r in db.execute_query(SQL_TICKERS_MONITORADOS)]
+    
+SQL_MONITORAMENTOS_ATIVOS = """
+            select m.id, a.abreviacao as ticker, m.preco_alvo, m.direcao,
+                   m.usuario_id, u.chat_id, u.telefone
+            from tela_cadastro_monitoramento m
+            join tela_cadastro_acao a on a.id = m.acao_id
+            join tela_cadastro_usuario u on u.id = m.usuario_id
+            where m.ativo and m.id > %s
+            order by m.id
+            """
+
+SQL_DESATIVAR_MONITORAMENTOS = "update tela_cadastro_monitoramento set ativo = false where id = any(%s)"
+    
+def get_monitoramentos_ativos(db, desde_id=0):
+        return db.execute_query(SQL_MONITORAMENTOS_ATIVOS, (desde_id,))
+    
+def desativar_monitoramentos(db, ids):
+        return db.execute_update(SQL_DESATIVAR_MONITORAMENTOS, (list(ids),))
+    
     
     
             
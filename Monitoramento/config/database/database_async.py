@@ -0,0 +1,151 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from Monitoramento.config.database.database import (
+    Database,
+    SQL_DESATIVAR_MONITORAMENTOS,
+    SQL_INSERT_ACAO,
+    SQL_MONITORAMENTOS_ATIVOS,
+    SQL_TICKERS_MONITORADOS,
+    _env_bool,
+)
+
+
+class AsyncDatabase:
+    """
+    Versão asyncio do Database (psycopg.AsyncConnection), com as mesmas
+    variáveis de ambiente (DB_HOST, DB_PORT, ..., DB_POOL, DB_POOL_MIN, DB_POOL_MAX).
+
+    Sem pool, todas as tarefas dividem uma AsyncConnection: o uso dela é
+    serializado por um asyncio.Lock (uma tarefa por vez, do início ao fim da
+    instrução ou transação). Para gravar em paralelo, use DB_POOL=1.
+    """
+
+    def __init__(self, pool=None, min_size=None, max_size=None):
+        self.conn_string = Database().conn_string
+        self.usa_pool = _env_bool('DB_POOL') if pool is None else pool
+        self.min_size = min_size or int(os.getenv('DB_POOL_MIN', '1'))
+        self.max_size = max_size or int(os.getenv('DB_POOL_MAX', '10'))
+        self.pool = None
+        self.connection = None
+        # Conexão em uso pela tarefa atual (chamadas aninhadas reaproveitam)
+        self._atual = ContextVar('conexao_atual', default=None)
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        if self.usa_pool:
+            return await self._abrir_pool()
+        try:
+            self.connection = await psycopg.AsyncConnection.connect(
+                self.conn_string,
+                row_factory=dict_row,
+                autocommit=True,
+            )
+            print("Conexão assíncrona com o banco de dados estabelecida com sucesso.")
+            return self.connection
+        except Exception as e:
+            print(f"Falha ao conectar ao banco de dados: {e}")
+            raise
+
+    async def _abrir_pool(self):
+        if self.pool is None:
+            pool = AsyncConnectionPool(
+                self.conn_string,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                kwargs={'row_factory': dict_row, 'autocommit': True},
+                check=AsyncConnectionPool.check_connection,
+                open=False,
+            )
+            try:
+                await pool.open(wait=True)
+            except Exception as e:
+                print(f"Falha ao abrir pool de conexões: {e}")
+                raise
+            self.pool = pool
+            print(f"Pool assíncrono de conexões aberto ({self.min_size}-{self.max_size} conexões).")
+        return self.pool
+
+    @asynccontextmanager
+    async def conexao(self):
+        atual = self._atual.get()
+        if atual is not None:
+            yield atual
+            return
+
+        if self.usa_pool:
+            pool = await self._abrir_pool()
+            async with pool.connection() as conn:
+                token = self._atual.set(conn)
+                try:
+                    yield conn
+                finally:
+                    self._atual.reset(token)
+        else:
+            async with self._lock:
+                if not self.connection or self.connection.closed:
+                    await self.connect()
+                token = self._atual.set(self.connection)
+                try:
+                    yield self.connection
+                finally:
+                    self._atual.reset(token)
+
+    @asynccontextmanager
+    async def transacao(self):
+        async with self.conexao() as conn, conn.transaction():
+            yield conn
+
+    async def execute_query(self, query, params=None):
+        async with self.conexao() as conn, conn.cursor() as cursor:
+            await cursor.execute(query, params or ())
+            return await cursor.fetchall()
+
+    async def execute_update(self, query, params=None):
+        async with self.conexao() as conn, conn.cursor() as cursor:
+            await cursor.execute(query, params or ())
+            return cursor.rowcount
+
+    async def executemany(self, query, params_seq):
+        """
+        Executa a mesma instrução para várias linhas numa transação, em
+        pipeline mode.
+        """
+        async with self.transacao() as conn, conn.pipeline(), conn.cursor() as cursor:
+            await cursor.executemany(query, params_seq)
+            return cursor.rowcount
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            print("Pool assíncrono de conexões fechado.")
+        if self.connection:
+            await self.connection.close()
+            self.connection = None
+            print("Conexão assíncrona com o banco de dados fechada.")
+
+
+async def insert_acoes_async(db, linhas):
+    """
+    `linhas`: lista de (abreviacao, nome, valor_atual).
+    """
+    return await db.executemany(SQL_INSERT_ACAO, linhas)
+
+
+async def get_tickers_monitorados_async(db):
+    return [r['abreviacao'] for r in await db.execute_query(SQL_TICKERS_MONITORADOS)]
+
+
+async def get_monitoramentos_ativos_async(db, desde_id=0):
+    return await db.execute_query(SQL_MONITORAMENTOS_ATIVOS, (desde_id,))
+
+
+async def desativar_monitoramentos_async(db, ids):
+    return await db.execute_update(SQL_DESATIVAR_MONITORAMENTOS, (list(ids),))
@@ -0,0 +1,62 @@
+import threading
+import time
+
+from Monitoramento.config.database.database import (
+    get_all_workers,
+    register_worker,
+    set_worker_lider,
+    update_workers_heartbeat,
+)
+
+
+class RegistroWorkers:
+    """
+    Registro dos workers de um processo na tabela worker.
+
+    Os heartbeats dos workers locais são acumulados e gravados juntos, num único
+    UPDATE (unnest) a cada `intervalo_segundos`, então a carga no banco não cresce
+    com o número de workers. As instruções usam prepared statements no servidor.
+    """
+
+    def __init__(self, db, intervalo_segundos=2.0):
+        self.db = db
+        self.intervalo_segundos = intervalo_segundos
+        self._pendentes = {}
+        self._lock = threading.Lock()
+        self._ultimo_flush = time.monotonic()
+
+    def registrar(self, nome, host='localhost', porta=None):
+        return register_worker(self.db, nome, host, porta)
+
+    def heartbeat(self, nome, tempo_atividade):
+        """
+        Anota o heartbeat; grava todos os pendentes se o intervalo já passou.
+        """
+        with self._lock:
+            self._pendentes[nome] = tempo_atividade
+        if time.monotonic() - self._ultimo_flush >= self.intervalo_segundos:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, {}
+            self._ultimo_flush = time.monotonic()
+        if not pendentes:
+            return 0
+        try:
+            return update_workers_heartbeat(self.db, list(pendentes.items()))
+        except Exception:
+            # Devolve o que não foi gravado sem sobrescrever heartbeats mais novos
+            with self._lock:
+                for nome, tempo in pendentes.items():
+                    self._pendentes.setdefault(nome, tempo)
+            raise
+
+    def definir_lider(self, nome):
+        """
+        Troca o líder numa instrução só; retorna quantas linhas mudaram (0 se já era líder).
+        """
+        return set_worker_lider(self.db, nome)
+
+    def listar(self):
+        return get_all_workers(self.db)
@@ -1,7 +1,17 @@
 import pika 
 import os 
+import random
 import time
-from urllib.parse import urlparse
+from urllib.parse import quote, urlparse
+
+
+def espera_backoff(tentativa, base=0.5, maximo=30.0):
+    """
+    Backoff exponencial com jitter: base * 2^tentativa (limitado a `maximo`),
+    sorteado entre 50% e 100% do valor para espalhar as reconexões.
+    """
+    atraso = min(maximo, base * (2 ** tentativa))
+    return random.uniform(atraso / 2, atraso)
 
 class RabbitMQConfig:
     
@@ -17,7 +27,7 @@ class RabbitMQConfig:
             self.port = int(os.getenv('RABBITMQ_PORT'))
             self.username = os.getenv('RABBITMQ_USERNAME')
             self.password = os.getenv('RABBITMQ_PASSWORD')
-            self.virtual_host = os.getenv('RABBITMQ_VHOST', '/')
+            self.vhost = os.getenv('RABBITMQ_VHOST', '/')
             self.use_ssl = False
     
     def _parse_cloudamqp_url(self):
@@ -34,7 +44,16 @@ class RabbitMQConfig:
         print(f"   VHost: {self.vhost}")
         print(f"   SSL: {'Ativado' if self.use_ssl else 'Desativado'}")        
         
-    def get_connection(self):
+    def get_url(self):
+        # Usado pelos clientes assíncronos (aio-pika), que se conectam por URL
+        if self.cloudamqp_url:
+            return self.cloudamqp_url
+        return (
+            f"amqp://{quote(self.username or '', safe='')}:{quote(self.password or '', safe='')}"
+            f"@{self.host}:{self.port}/{quote(self.vhost, safe='')}"
+        )
+        
+    def get_parameters(self):
         
         credentials = pika.PlainCredentials(self.username, self.password)
         
@@ -46,7 +65,7 @@ class RabbitMQConfig:
                 server_hostname=self.host
             )
         
-        parameters = pika.ConnectionParameters (
+        return pika.ConnectionParameters (
             host=self.host, 
             port=self.port,
             virtual_host=self.vhost,
@@ -57,6 +76,9 @@ class RabbitMQConfig:
             socket_timeout=10   #10s
         )    
         
+    def get_connection(self):
+        
+        parameters = self.get_parameters()
         
         max_retires = 3 
         for attempt in range(max_retires): 
@@ -70,8 +92,9 @@ class RabbitMQConfig:
                 if attempt == max_retires - 1:
                     print("\nN�mero m�ximo de tentativas de conex�o atingido. Abortando.")
                     raise
-                print("Tentando novamente em 5 segundos...\n")
-                time.sleep(5)
+                atraso = espera_backoff(attempt, base=2.0)
+                print(f"Tentando novamente em {atraso:.1f} segundos...\n")
+                time.sleep(atraso)
     
     def setup_exchanges_and_queues(self, channel): 
         print("CONFIGURANDO RABBIT MQ...\n")
@@ -131,6 +154,23 @@ class RabbitMQConfig:
         )   
         
         print("\n fila_heartbeat criada com sucesso.")
+        
+        channel.queue_declare(
+            queue='fila_motor_alertas',
+            durable=True, 
+            arguments={
+                'x-message-ttl': 60000   # 60 segundos
+            } # Eventos de monitoramento expirados são recuperados na ressincronização do motor
+        )
+        
+        print("\n fila_motor_alertas criada com sucesso.")
+        
+        channel.queue_declare(
+            queue='fila_tarefas',
+            durable=True, 
+        )
+        
+        print("\n fila_tarefas criada com sucesso.")
                 
         print("\nConfigurando bindings ...\n")
         channel.queue_bind(
@@ -152,12 +192,46 @@ class RabbitMQConfig:
         print(" stock_topic ? fila_alertas (routing: alerta.#)")
         print("\n Binding para fila_alertas criado com sucesso.")
         
+        channel.queue_bind(
+            exchange='stock_topic', 
+            queue='fila_notificacoes',
+            routing_key='alerta.#'
+        )
+          
+        print(" stock_topic ? fila_notificacoes (routing: alerta.#)")
+        print("\n Binding para fila_notificacoes criado com sucesso.")
+        
+        channel.queue_bind(
+            exchange='stock_topic', 
+            queue='fila_motor_alertas',
+            routing_key='cotacao.#'
+        )
+        
+        channel.queue_bind(
+            exchange='stock_topic', 
+            queue='fila_motor_alertas',
+            routing_key='monitoramento.#'
+        )
+          
+        print(" stock_topic ? fila_motor_alertas (routing: cotacao.#, monitoramento.#)")
+        print("\n Bindings para fila_motor_alertas criados com sucesso.")
+        
+        channel.queue_bind(
+            exchange='stock_topic', 
+            queue='fila_tarefas',
+            routing_key='tarefa.#'
+        )
+          
+        print(" stock_topic ? fila_tarefas (routing: tarefa.#)")
+        print("\n Binding para fila_tarefas criado com sucesso.")
+        
         channel.queue_bind(
             exchange='election', 
-            queue='fila_heartbeat'
+            queue='fila_heartbeat',
+            routing_key='heartbeat.#'
         )
         
-        print(" election ? fila_heartbeat")
+        print(" election ? fila_heartbeat (routing: heartbeat.#)")
         print("\n Binding para fila_heartbeat criado com sucesso.")
                 
         print("\nConfigura��o do RabbitMQ conclu�da com sucesso.")
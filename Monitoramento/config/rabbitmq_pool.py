@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pika
+from pika.exceptions import AMQPChannelError, AMQPConnectionError, StreamLostError
+
+from Monitoramento.config.rabbitmq_config import RabbitMQConfig, espera_backoff
+
+ERROS_CONEXAO = (AMQPConnectionError, AMQPChannelError, StreamLostError, ConnectionError)
+
+
+class RabbitMQPool:
+    """
+    Mantém `tamanho` conexões BlockingConnection de longa duração.
+
+    Cada thread é fixada numa conexão (round-robin), e cada conexão tem um único
+    canal. Como a BlockingConnection não é thread-safe, o uso de cada conexão é
+    serializado por um lock: o canal só é entregue dentro de `with pool.canal()`,
+    então threads de vida curta (ex.: uma por signal) não abrem canais novos.
+    Conexões/canais mortos são descartados e reabertos com backoff + jitter.
+    """
+
+    def __init__(self, config=None, tamanho=None, max_tentativas=None, backoff_base=None, backoff_max=None):
+        self.config = config or RabbitMQConfig()
+        self.tamanho = tamanho or int(os.getenv('RABBITMQ_POOL_TAMANHO', '2'))
+        self.max_tentativas = max_tentativas or int(os.getenv('RABBITMQ_POOL_TENTATIVAS', '5'))
+        self.backoff_base = backoff_base or float(os.getenv('RABBITMQ_BACKOFF_BASE', '0.5'))
+        self.backoff_max = backoff_max or float(os.getenv('RABBITMQ_BACKOFF_MAX', '30'))
+        self._parametros = self.config.get_parameters()
+
+        self._conexoes = [None] * self.tamanho
+        self._canais = [None] * self.tamanho
+        self._locks = [threading.Lock() for _ in range(self.tamanho)]
+        self._local = threading.local()
+        self._proximo = 0
+        self._lock_proximo = threading.Lock()
+
+    def _indice_da_thread(self):
+        indice = getattr(self._local, 'indice', None)
+        if indice is None:
+            with self._lock_proximo:
+                indice = self._proximo % self.tamanho
+                self._proximo += 1
+            self._local.indice = indice
+        return indice
+
+    def _conectar(self, indice):
+        for tentativa in range(self.max_tentativas):
+            try:
+                conexao = pika.BlockingConnection(self._parametros)
+                self._conexoes[indice] = conexao
+                self._canais[indice] = None
+                return conexao
+            except AMQPConnectionError as e:
+                if tentativa == self.max_tentativas - 1:
+                    raise
+                atraso = espera_backoff(tentativa, self.backoff_base, self.backoff_max)
+                print(f"Falha ao conectar no RabbitMQ ({e}). Nova tentativa em {atraso:.1f}s...")
+                time.sleep(atraso)
+
+    def _canal_aberto(self, indice):
+        conexao = self._conexoes[indice]
+        if conexao is None or not conexao.is_open:
+            conexao = self._conectar(indice)
+        else:
+            # Atende heartbeats/fechamentos pendentes; levanta erro se a conexão morreu
+            conexao.process_data_events(time_limit=0)
+
+        canal = self._canais[indice]
+        if canal is None or not canal.is_open:
+            canal = self._canais[indice] = conexao.channel()
+        return canal
+
+    def _descartar(self, indice):
+        conexao = self._conexoes[indice]
+        self._conexoes[indice] = None
+        self._canais[indice] = None
+        if conexao is not None and conexao.is_open:
+            try:
+                conexao.close()
+            except Exception:
+                pass
+
+    @contextmanager
+    def canal(self):
+        indice = self._indice_da_thread()
+        with self._locks[indice]:
+            try:
+                canal = self._canal_aberto(indice)
+            except ERROS_CONEXAO:
+                # Conexão morta detectada no teste de vida: reabre uma vez
+                self._descartar(indice)
+                canal = self._canal_aberto(indice)
+            try:
+                yield canal
+            except ERROS_CONEXAO:
+                self._descartar(indice)
+                raise
+
+    def publicar(self, exchange, routing_key, corpo, propriedades=None):
+        """
+        Publica reaproveitando a conexão do pool; se ela tiver caído, reconecta e tenta de novo uma vez.
+        """
+        for tentativa in range(2):
+            try:
+                with self.canal() as canal:
+                    canal.basic_publish(exchange=exchange, routing_key=routing_key, body=corpo, properties=propriedades)
+                return
+            except ERROS_CONEXAO:
+                if tentativa == 1:
+                    raise
+
+    def fechar(self):
+        for indice in range(self.tamanho):
+            with self._locks[indice]:
+                self._descartar(indice)
+
+
+_pool = None
+_lock_pool = threading.Lock()
+
+
+def get_pool():
+    """
+    Pool compartilhado pelo processo (views do Django, serviços).
+    """
+    global _pool
+    if _pool is None:
+        with _lock_pool:
+            if _pool is None:
+                _pool = RabbitMQPool()
+    return _pool
@@ -0,0 +1,170 @@
+"""
+Consumidor da fila_cotacoes.
+
+Lê as mensagens `cotacao.<TICKER>` publicadas no exchange stock_topic, agrupa
+em lotes (por tamanho ou janela de tempo) e grava cada lote numa única
+transação via insert_acoes (executemany em pipeline ou COPY). As mensagens só recebem ack depois do commit.
+
+As cotações vão para tela_cadastro_acao, a mesma tabela Acao que as views do
+Django leem (o banco precisa ser o do Django, ver README). Como a gravação não
+passa pelo ORM, a versão do cache das cotações é trocada aqui depois do commit.
+
+Uso (na raiz do projeto):
+    python -m Monitoramento.services.consumidor_cotacoes
+"""
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from Monitoramento.config.rabbitmq_config import RabbitMQConfig
+from Monitoramento.config.database.database import Database, insert_acoes
+from tela_cadastro.cache_cotacoes import invalidar_cotacoes
+
+
+def invalidar_cache_cotacoes():
+    """
+    Faz o papel do on_commit(invalidar_cotacoes) do Django para gravações feitas
+    por aqui. Só chega ao processo web com um cache compartilhado
+    (DJANGO_CACHE_BACKEND); com o LocMemCache padrão vale o COTACOES_CACHE_TTL.
+    """
+    try:
+        invalidar_cotacoes()
+    except Exception as e:
+        print(f"⚠️ Falha ao invalidar o cache das cotações: {e}")
+
+
+class LoteCotacoes:
+    """
+    Lote de cotações à espera de gravação, sem dependência do RabbitMQ.
+
+    Fecha por tamanho (`tamanho`) ou por tempo (`janela_segundos` desde a
+    primeira cotação); `gravar` persiste uma linha por ticker e só então
+    confirma as mensagens até a última tag recebida.
+    """
+
+    def __init__(self, tamanho, janela_segundos):
+        self.tamanho = tamanho
+        self.janela_segundos = janela_segundos
+        self.cotacoes = []
+        self.ultimo_tag = None
+        self._inicio = None
+
+    def __len__(self):
+        return len(self.cotacoes)
+
+    def adicionar(self, tag, ticker, nome, preco):
+        if not self.cotacoes:
+            self._inicio = time.monotonic()
+        self.cotacoes.append((ticker, nome, preco))
+        self.ultimo_tag = tag
+
+    def pronto(self):
+        if not self.cotacoes:
+            return False
+        if len(self.cotacoes) >= self.tamanho:
+            return True
+        return time.monotonic() - self._inicio >= self.janela_segundos
+
+    def gravar(self, persistir, confirmar, rejeitar):
+        """
+        Chama `persistir(linhas)` e depois `confirmar(ultimo_tag)`; se persistir
+        falhar, chama `rejeitar(ultimo_tag)` e relança. O lote é esvaziado nos
+        dois casos. Retorna quantos tickers foram gravados.
+        """
+        # Várias cotações do mesmo ticker no lote: só a mais recente importa
+        ultimas = {ticker: (nome, preco) for ticker, nome, preco in self.cotacoes}
+        tag = self.ultimo_tag
+        self.cotacoes = []
+        self.ultimo_tag = None
+        self._inicio = None
+
+        try:
+            persistir([(ticker, nome, preco) for ticker, (nome, preco) in ultimas.items()])
+        except Exception:
+            rejeitar(tag)
+            raise
+        confirmar(tag)
+        return len(ultimas)
+
+
+class ConsumidorCotacoes:
+
+    def __init__(self, tamanho_lote=None, janela_segundos=None, prefetch=None, fila='fila_cotacoes'):
+        self.tamanho_lote = tamanho_lote or int(os.getenv('COTACOES_TAMANHO_LOTE', '200'))
+        self.janela_segundos = janela_segundos or float(os.getenv('COTACOES_JANELA_SEGUNDOS', '1'))
+        # O prefetch precisa ser >= tamanho_lote, senão o lote só fecha pela janela de tempo
+        self.prefetch = prefetch or int(os.getenv('COTACOES_PREFETCH', str(self.tamanho_lote * 2)))
+        self.fila = fila
+
+        self.rabbitmq = RabbitMQConfig()
+        self.db = Database()
+
+        self.lote = LoteCotacoes(self.tamanho_lote, self.janela_segundos)
+
+    def iniciar(self):
+        connection = self.rabbitmq.get_connection()
+        channel = connection.channel()
+        self.rabbitmq.setup_exchanges_and_queues(channel)
+        channel.basic_qos(prefetch_count=self.prefetch)
+
+        print(f"Consumindo {self.fila} (lote={self.tamanho_lote}, janela={self.janela_segundos}s, prefetch={self.prefetch})")
+
+        try:
+            for method, properties, body in channel.consume(self.fila, inactivity_timeout=self.janela_segundos):
+                if method is not None:
+                    self._receber(channel, method, body)
+                if self.lote.pronto():
+                    self._gravar_lote(channel)
+        except KeyboardInterrupt:
+            print("\nEncerrando consumidor...")
+        finally:
+            if self.lote and channel.is_open:
+                self._gravar_lote(channel)
+            if channel.is_open:
+                channel.cancel()
+            if connection.is_open:
+                connection.close()
+            self.db.close()
+
+    def _receber(self, channel, method, body):
+        try:
+            cotacao = json.loads(body)
+            ticker = str(cotacao['symbol']).upper()
+            preco = float(cotacao['price'])
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Mensagem inválida descartada: {e}")
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+
+        self.lote.adicionar(method.delivery_tag, ticker, cotacao.get('nome') or cotacao.get('name') or ticker, preco)
+
+    def _gravar_lote(self, channel):
+        quantidade = len(self.lote)
+        inicio = time.monotonic()
+
+        try:
+            tickers = self.lote.gravar(
+                lambda linhas: insert_acoes(self.db, linhas),
+                lambda tag: channel.basic_ack(delivery_tag=tag, multiple=True),
+                lambda tag: channel.basic_nack(delivery_tag=tag, multiple=True, requeue=True),
+            )
+        except Exception as e:
+            print(f"❌ Falha ao gravar lote de {quantidade} cotações: {e}")
+            if not self.db.usa_pool:
+                # Conexão única possivelmente quebrada: a próxima transação reconecta
+                self.db.close()
+            time.sleep(1)
+        else:
+            invalidar_cache_cotacoes()
+            print(f"✓ {quantidade} cotações ({tickers} tickers) gravadas em {time.monotonic() - inicio:.3f}s")
+
+def main():
+    load_dotenv()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Consultor_bolsa.settings')
+    ConsumidorCotacoes().iniciar()
+
+
+if __name__ == "__main__":
+    main()
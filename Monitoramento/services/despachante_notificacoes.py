@@ -0,0 +1,226 @@
+"""
+Despachante da fila_notificacoes.
+
+Recebe os alertas (`alerta.<TICKER>`), agrupa os do mesmo destinatário que
+chegam dentro de NOTIFICACOES_JANELA_SEGUNDOS numa única mensagem e entrega
+pelo transporte configurado (ver transportes.py), respeitando um balde de
+tokens por destinatário e outro global.
+
+As entregas rodam num pool de threads: um destino lento não trava a fila.
+Cada mensagem do RabbitMQ só recebe ack depois da entrega; em caso de falha
+volta para a fila uma vez (na segunda falha é descartada).
+
+Uso (na raiz do projeto):
+    python -m Monitoramento.services.despachante_notificacoes
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from dotenv import load_dotenv
+
+from Monitoramento.config.rabbitmq_config import RabbitMQConfig
+from Monitoramento.services.transportes import criar_transporte
+
+DESCRICAO_DIRECAO = {
+    'acima': 'acima de',
+    'acima_ou_igual': 'acima ou igual a',
+    'abaixo': 'abaixo de',
+    'abaixo_ou_igual': 'abaixo ou igual a',
+}
+
+# Campos usados por formatar_alertas: sem eles a mensagem é descartada já na chegada
+CAMPOS_ALERTA = ('ticker', 'preco', 'preco_alvo', 'direcao')
+
+
+class BaldeTokens:
+    """
+    Token bucket: `taxa` tokens por segundo, acumulando até `capacidade`.
+    """
+
+    def __init__(self, taxa, capacidade):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.tokens = capacidade
+        self._ultimo = time.monotonic()
+
+    def _repor(self):
+        agora = time.monotonic()
+        self.tokens = min(self.capacidade, self.tokens + (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    def disponivel(self):
+        self._repor()
+        return self.tokens >= 1
+
+    def consumir(self):
+        self._repor()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def cheio(self):
+        self._repor()
+        return self.tokens >= self.capacidade
+
+
+def validar_alerta(alerta):
+    """
+    Levanta ValueError se `alerta` não for um objeto com os CAMPOS_ALERTA e
+    preços numéricos.
+    """
+    if not isinstance(alerta, dict):
+        raise ValueError(f"esperado um objeto JSON, recebido {type(alerta).__name__}")
+    faltando = [campo for campo in CAMPOS_ALERTA if alerta.get(campo) is None]
+    if faltando:
+        raise ValueError(f"campos ausentes: {', '.join(faltando)}")
+    float(alerta['preco'])
+    float(alerta['preco_alvo'])
+
+
+def descartar_baldes_cheios(baldes, em_uso):
+    """
+    Remove de `baldes` os destinos fora de `em_uso` cujo balde já encheu de novo:
+    equivalem a um balde novo, então recriá-los depois não muda o limite de envio.
+    """
+    for destino in [d for d, balde in baldes.items() if d not in em_uso and balde.cheio()]:
+        del baldes[destino]
+
+
+def formatar_alertas(alertas):
+    linhas = [
+        f"🔔 {a['ticker']} a R$ {float(a['preco']):.2f} "
+        f"(alvo: {DESCRICAO_DIRECAO.get(a['direcao'], a['direcao'])} R$ {float(a['preco_alvo']):.2f})"
+        for a in alertas
+    ]
+    return "\n".join(linhas)
+
+
+class DespachanteNotificacoes:
+
+    def __init__(self, transporte=None, fila='fila_notificacoes', janela_segundos=None,
+                 taxa_destino=None, rajada_destino=None, taxa_global=None, max_envios=None, prefetch=None):
+        self.transporte = transporte or criar_transporte()
+        self.fila = fila
+        self.janela_segundos = janela_segundos or float(os.getenv('NOTIFICACOES_JANELA_SEGUNDOS', '2'))
+        self.taxa_destino = taxa_destino or float(os.getenv('NOTIFICACOES_TAXA_DESTINO', '1'))
+        self.rajada_destino = rajada_destino or float(os.getenv('NOTIFICACOES_RAJADA_DESTINO', '3'))
+        self.taxa_global = taxa_global or float(os.getenv('NOTIFICACOES_TAXA_GLOBAL', '30'))
+        self.max_envios = max_envios or int(os.getenv('NOTIFICACOES_MAX_ENVIOS', '8'))
+        self.prefetch = prefetch or int(os.getenv('NOTIFICACOES_PREFETCH', '500'))
+        self.intervalo_limpeza = float(os.getenv('NOTIFICACOES_LIMPEZA_BALDES_SEGUNDOS', '60'))
+
+        self.rabbitmq = RabbitMQConfig()
+        self.balde_global = BaldeTokens(self.taxa_global, self.taxa_global)
+        self._baldes = {}
+        self._buffers = {}
+        self._em_envio = set()
+        self._ultima_limpeza = time.monotonic()
+        self._connection = None
+        self._channel = None
+
+        self.entregues = 0
+        self.falhas = 0
+
+    def iniciar(self):
+        self._connection = self.rabbitmq.get_connection()
+        self._channel = self._connection.channel()
+        self.rabbitmq.setup_exchanges_and_queues(self._channel)
+        self._channel.basic_qos(prefetch_count=self.prefetch)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_envios)
+        try:
+            for method, properties, body in self._channel.consume(self.fila, inactivity_timeout=0.2):
+                if method is not None:
+                    self._receber(method, body)
+                self._despachar_prontos(executor)
+        except KeyboardInterrupt:
+            print("\nEncerrando despachante...")
+        finally:
+            executor.shutdown(wait=True)
+            if self._connection.is_open:
+                # Processa os acks agendados pelas últimas entregas
+                self._connection.process_data_events(time_limit=0)
+                self._connection.close()
+
+    def _receber(self, method, body):
+        try:
+            alerta = json.loads(body)
+            validar_alerta(alerta)
+            destino = self.transporte.destino(alerta)
+        except (ValueError, TypeError) as e:
+            print(f"⚠️ Mensagem inválida descartada: {e}")
+            self._channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+
+        if destino is None:
+            print(f"⚠️ Alerta sem destinatário para este transporte: {alerta.get('id')}")
+            self._channel.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        buffer = self._buffers.setdefault(destino, {'inicio': time.monotonic(), 'alertas': [], 'tags': []})
+        buffer['alertas'].append(alerta)
+        buffer['tags'].append((method.delivery_tag, method.redelivered))
+
+    def _balde(self, destino):
+        balde = self._baldes.get(destino)
+        if balde is None:
+            balde = self._baldes[destino] = BaldeTokens(self.taxa_destino, self.rajada_destino)
+        return balde
+
+    def _despachar_prontos(self, executor):
+        agora = time.monotonic()
+        for destino, buffer in list(self._buffers.items()):
+            # Um envio por destino por vez, para manter a ordem das mensagens
+            if destino in self._em_envio or agora - buffer['inicio'] < self.janela_segundos:
+                continue
+            balde = self._balde(destino)
+            if not balde.disponivel() or not self.balde_global.disponivel():
+                continue
+            balde.consumir()
+            self.balde_global.consumir()
+
+            del self._buffers[destino]
+            self._em_envio.add(destino)
+            executor.submit(self._entregar, destino, buffer)
+
+        if agora - self._ultima_limpeza >= self.intervalo_limpeza:
+            descartar_baldes_cheios(self._baldes, self._buffers.keys() | self._em_envio)
+            self._ultima_limpeza = agora
+
+    def _entregar(self, destino, buffer):
+        """
+        Roda numa thread do pool: não pode mexer no canal, só agendar o ack.
+        """
+        try:
+            self.transporte.enviar(destino, formatar_alertas(buffer['alertas']))
+            sucesso = True
+        except Exception as e:
+            print(f"❌ Falha ao notificar {destino}: {e}")
+            sucesso = False
+        self._connection.add_callback_threadsafe(partial(self._concluir, destino, buffer['tags'], sucesso))
+
+    def _concluir(self, destino, tags, sucesso):
+        self._em_envio.discard(destino)
+        if sucesso:
+            self.entregues += len(tags)
+        else:
+            self.falhas += len(tags)
+
+        for tag, reentregue in tags:
+            if sucesso:
+                self._channel.basic_ack(delivery_tag=tag)
+            else:
+                self._channel.basic_nack(delivery_tag=tag, requeue=not reentregue)
+
+
+def main():
+    load_dotenv()
+    DespachanteNotificacoes().iniciar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Eleição de líder entre os workers do Monitoramento.
+
+Cada nó se registra na tabela worker (register_worker), publica um heartbeat
+`heartbeat.<nome>` no exchange election a cada ELEICAO_INTERVALO_SEGUNDOS e
+escuta os heartbeats dos outros numa fila exclusiva.
+
+Regras:
+  - um nó é considerado vivo se mandou heartbeat há menos de ELEICAO_TIMEOUT_SEGUNDOS;
+  - enquanto o líder atual (quem anuncia `lider: true`) estiver vivo, ele continua
+    líder, mesmo que entre um nó com id menor (evita troca desnecessária);
+  - sem líder vivo, assume o nó vivo de menor id; se dois se anunciarem líderes,
+    o de id maior desiste.
+
+Assim o failover leva no máximo timeout + intervalo. O novo líder grava o
+resultado com RegistroWorkers.definir_lider e só ele roda o produtor de cotações; os demais
+nós ficam livres para os consumidores.
+
+Uso (na raiz do projeto):
+    python -m Monitoramento.services.eleicao
+"""
+import json
+import os
+import socket
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from Monitoramento.config.rabbitmq_config import RabbitMQConfig
+from Monitoramento.config.database.database import Database
+from Monitoramento.config.database.registro_workers import RegistroWorkers
+
+
+class NoEleicao:
+
+    def __init__(self, nome=None, intervalo_segundos=None, timeout_segundos=None,
+                 ao_assumir_lideranca=None, ao_perder_lideranca=None, host=None, porta=None):
+        self.nome = nome or os.getenv('WORKER_NOME') or f"{socket.gethostname()}-{os.getpid()}"
+        self.intervalo_segundos = intervalo_segundos or float(os.getenv('ELEICAO_INTERVALO_SEGUNDOS', '2'))
+        self.timeout_segundos = timeout_segundos or float(os.getenv('ELEICAO_TIMEOUT_SEGUNDOS', '6'))
+        self.ao_assumir_lideranca = ao_assumir_lideranca
+        self.ao_perder_lideranca = ao_perder_lideranca
+        self.host = host or socket.gethostname()
+        self.porta = porta
+
+        self.rabbitmq = RabbitMQConfig()
+        self.db = Database()
+        self.registro = RegistroWorkers(self.db, intervalo_segundos=self.intervalo_segundos)
+
+        self.id = None
+        self.lider = False
+        self.lider_id = None
+        self._pares = {}
+        self._parando = False
+        self._inicio = None
+        self._ultimo_envio = 0
+        self._lider_perdido_em = None
+
+        # Métricas
+        self.heartbeats_enviados = 0
+        self.heartbeats_recebidos = 0
+        self.bytes_enviados = 0
+        self.ultimo_failover_segundos = None
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+    def iniciar(self):
+        self.id = self.registro.registrar(self.nome, self.host, self.porta)
+        self._inicio = time.monotonic()
+
+        connection = self.rabbitmq.get_connection()
+        channel = connection.channel()
+        self.rabbitmq.setup_exchanges_and_queues(channel)
+
+        fila = channel.queue_declare(queue='', exclusive=True, auto_delete=True).method.queue
+        channel.queue_bind(exchange='election', queue=fila, routing_key='heartbeat.*')
+        channel.basic_consume(queue=fila, on_message_callback=self._ao_receber, auto_ack=True)
+
+        print(f"Nó {self.nome} (id={self.id}) participando da eleição")
+
+        try:
+            while not self._parando:
+                connection.process_data_events(time_limit=min(0.2, self.intervalo_segundos))
+                agora = time.monotonic()
+                if agora - self._ultimo_envio >= self.intervalo_segundos:
+                    self._enviar_heartbeat(channel, agora)
+                self._avaliar(agora)
+        except KeyboardInterrupt:
+            print("\nSaindo da eleição...")
+        finally:
+            if self.lider:
+                self._deixar_lideranca()
+            if connection.is_open:
+                connection.close()
+            self.db.close()
+
+    def parar(self):
+        self._parando = True
+
+    def metricas(self):
+        return {
+            'id': self.id,
+            'lider': self.lider,
+            'lider_id': self.lider_id,
+            'pares_vivos': len(self._vivos(time.monotonic())) - 1,
+            'heartbeats_enviados': self.heartbeats_enviados,
+            'heartbeats_recebidos': self.heartbeats_recebidos,
+            'bytes_enviados': self.bytes_enviados,
+            'ultimo_failover_segundos': self.ultimo_failover_segundos,
+        }
+
+    # ------------------------------------------------------------------
+    # Heartbeats
+    # ------------------------------------------------------------------
+    def _enviar_heartbeat(self, channel, agora):
+        corpo = json.dumps({'id': self.id, 'nome': self.nome, 'lider': self.lider})
+        channel.basic_publish(exchange='election', routing_key=f'heartbeat.{self.nome}', body=corpo)
+        self._ultimo_envio = agora
+        self.heartbeats_enviados += 1
+        self.bytes_enviados += len(corpo)
+
+        try:
+            self.registro.heartbeat(self.nome, int(agora - self._inicio))
+        except Exception as e:
+            print(f"⚠️ Falha ao gravar heartbeat: {e}")
+
+    def _ao_receber(self, channel, method, properties, body):
+        try:
+            hb = json.loads(body)
+            par_id = int(hb['id'])
+        except (ValueError, KeyError, TypeError):
+            return
+        if par_id == self.id:
+            return
+
+        self.heartbeats_recebidos += 1
+        self._pares[par_id] = {'nome': hb.get('nome'), 'lider': bool(hb.get('lider')), 'visto_em': time.monotonic()}
+
+    # ------------------------------------------------------------------
+    # Eleição
+    # ------------------------------------------------------------------
+    def _vivos(self, agora):
+        vivos = {i: p for i, p in self._pares.items() if agora - p['visto_em'] < self.timeout_segundos}
+        vivos[self.id] = {'nome': self.nome, 'lider': self.lider, 'visto_em': agora}
+        return vivos
+
+    def _avaliar(self, agora):
+        # Na partida, espera um timeout inteiro para conhecer um líder já existente
+        if agora - self._inicio < self.timeout_segundos:
+            return
+
+        # Esquece quem sumiu há muito tempo, guardando o instante para medir o failover
+        for par_id, par in list(self._pares.items()):
+            if agora - par['visto_em'] >= self.timeout_segundos:
+                if par_id == self.lider_id:
+                    self._lider_perdido_em = par['visto_em']
+                del self._pares[par_id]
+
+        vivos = self._vivos(agora)
+        lideres = [i for i, p in vivos.items() if p['lider']]
+        eleito = min(lideres) if lideres else min(vivos)
+
+        if eleito != self.lider_id:
+            self.lider_id = eleito
+            print(f"Líder atual: {vivos[eleito]['nome']} (id={eleito})")
+
+        if eleito == self.id and not self.lider:
+            self._assumir_lideranca(agora)
+        elif eleito != self.id and self.lider:
+            self._deixar_lideranca()
+
+    def _assumir_lideranca(self, agora):
+        self.lider = True
+        if self._lider_perdido_em is not None:
+            self.ultimo_failover_segundos = agora - self._lider_perdido_em
+            self._lider_perdido_em = None
+            print(f"👑 {self.nome} assumiu a liderança (failover em {self.ultimo_failover_segundos:.2f}s)")
+        else:
+            print(f"👑 {self.nome} assumiu a liderança")
+
+        try:
+            self.registro.definir_lider(self.nome)
+        except Exception as e:
+            print(f"⚠️ Falha ao gravar líder: {e}")
+
+        if self.ao_assumir_lideranca:
+            self.ao_assumir_lideranca()
+
+    def _deixar_lideranca(self):
+        self.lider = False
+        print(f"{self.nome} deixou a liderança")
+        if self.ao_perder_lideranca:
+            self.ao_perder_lideranca()
+
+
+def main():
+    """
+    Roda um nó da eleição; enquanto for líder, roda também o produtor de cotações.
+    """
+    load_dotenv()
+    from Monitoramento.services.produtor_cotacoes import ProdutorCotacoes
+
+    estado = {}
+
+    def assumir():
+        produtor = ProdutorCotacoes()
+        estado['produtor'] = produtor
+        threading.Thread(target=produtor.iniciar, daemon=True).start()
+
+    def perder():
+        produtor = estado.pop('produtor', None)
+        if produtor:
+            produtor.parar()
+
+    NoEleicao(ao_assumir_lideranca=assumir, ao_perder_lideranca=perder).iniciar()
+
+
+if __name__ == "__main__":
+    main()
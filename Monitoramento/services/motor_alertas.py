@@ -0,0 +1,273 @@
+"""
+Motor de alertas de preço.
+
+Mantém em memória um índice dos monitoramentos ativos (tela_cadastro.Monitoramento):
+para cada ticker e direção, uma lista ordenada de preços-alvo. Cada cotação
+recebida vira uma busca binária por direção, sem varrer a tabela. Os alvos
+atingidos são publicados como `alerta.<TICKER>` no stock_topic e desativados
+(cada monitoramento dispara uma única vez).
+
+O índice é atualizado incrementalmente pelos eventos `monitoramento.<TICKER>`
+publicados pelo Django ao criar/desativar/remover monitoramentos. Como rede de
+segurança, novos ids são buscados periodicamente no banco e o índice inteiro é
+reconstruído a cada MOTOR_ALERTAS_RESYNC_SEGUNDOS.
+
+As tabelas tela_cadastro_* são lidas no Postgres de DB_HOST/DB_NAME, que precisa
+ser o mesmo banco do Django (ver README).
+
+Uso (na raiz do projeto):
+    python -m Monitoramento.services.motor_alertas
+"""
+import json
+import os
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+import pika
+from dotenv import load_dotenv
+
+from Monitoramento.config.rabbitmq_config import RabbitMQConfig
+from Monitoramento.config.database.database import (
+    Database,
+    desativar_monitoramentos,
+    get_monitoramentos_ativos,
+)
+
+DIRECOES = ('acima', 'acima_ou_igual', 'abaixo', 'abaixo_ou_igual')
+
+
+class _AlvosDirecao:
+    """
+    Preços-alvo de um ticker numa direção, ordenados, com os ids em paralelo.
+    """
+    __slots__ = ('precos', 'ids')
+
+    def __init__(self):
+        self.precos = []
+        self.ids = []
+
+    def inserir(self, preco, monitoramento_id):
+        pos = bisect_right(self.precos, preco)
+        self.precos.insert(pos, preco)
+        self.ids.insert(pos, monitoramento_id)
+
+    def remover(self, preco, monitoramento_id):
+        pos = bisect_left(self.precos, preco)
+        while pos < len(self.precos) and self.precos[pos] == preco:
+            if self.ids[pos] == monitoramento_id:
+                del self.precos[pos]
+                del self.ids[pos]
+                return True
+            pos += 1
+        return False
+
+    def retirar_prefixo(self, fim):
+        ids = self.ids[:fim]
+        del self.precos[:fim]
+        del self.ids[:fim]
+        return ids
+
+    def retirar_sufixo(self, inicio):
+        ids = self.ids[inicio:]
+        del self.precos[inicio:]
+        del self.ids[inicio:]
+        return ids
+
+
+class IndiceAlvos:
+    """
+    Índice ticker -> direção -> alvos ordenados.
+
+    Para um preço p:
+      acima            dispara alvos <  p  (prefixo até bisect_left)
+      acima_ou_igual   dispara alvos <= p  (prefixo até bisect_right)
+      abaixo           dispara alvos >  p  (sufixo a partir de bisect_right)
+      abaixo_ou_igual  dispara alvos >= p  (sufixo a partir de bisect_left)
+    """
+
+    def __init__(self):
+        self._por_ticker = {}
+        self._por_id = {}
+        self.maior_id = 0
+
+    def __len__(self):
+        return len(self._por_id)
+
+    def adicionar(self, monitoramento):
+        """
+        `monitoramento` é um dict com id, ticker, preco_alvo, direcao e os dados do
+        usuário que vão no alerta (usuario_id, chat_id, telefone).
+        """
+        if monitoramento['direcao'] not in DIRECOES:
+            return
+        monitoramento_id = monitoramento['id']
+        self.remover(monitoramento_id)
+
+        ticker = monitoramento['ticker'].upper()
+        preco = float(monitoramento['preco_alvo'])
+        direcoes = self._por_ticker.setdefault(ticker, {})
+        direcoes.setdefault(monitoramento['direcao'], _AlvosDirecao()).inserir(preco, monitoramento_id)
+
+        self._por_id[monitoramento_id] = dict(monitoramento, ticker=ticker, preco_alvo=preco)
+        self.maior_id = max(self.maior_id, monitoramento_id)
+
+    def remover(self, monitoramento_id):
+        monitoramento = self._por_id.pop(monitoramento_id, None)
+        if monitoramento is None:
+            return False
+        alvos = self._por_ticker[monitoramento['ticker']][monitoramento['direcao']]
+        return alvos.remover(monitoramento['preco_alvo'], monitoramento_id)
+
+    def disparar(self, ticker, preco):
+        """
+        Retira do índice e retorna os monitoramentos atingidos pelo preço.
+        """
+        direcoes = self._por_ticker.get(ticker.upper())
+        if not direcoes:
+            return []
+
+        ids = []
+        if 'acima' in direcoes:
+            alvos = direcoes['acima']
+            ids += alvos.retirar_prefixo(bisect_left(alvos.precos, preco))
+        if 'acima_ou_igual' in direcoes:
+            alvos = direcoes['acima_ou_igual']
+            ids += alvos.retirar_prefixo(bisect_right(alvos.precos, preco))
+        if 'abaixo' in direcoes:
+            alvos = direcoes['abaixo']
+            ids += alvos.retirar_sufixo(bisect_right(alvos.precos, preco))
+        if 'abaixo_ou_igual' in direcoes:
+            alvos = direcoes['abaixo_ou_igual']
+            ids += alvos.retirar_sufixo(bisect_left(alvos.precos, preco))
+
+        return [self._por_id.pop(i) for i in ids]
+
+
+class MotorAlertas:
+
+    def __init__(self, fila='fila_motor_alertas', prefetch=None, intervalo_novos=None, intervalo_resync=None):
+        self.fila = fila
+        self.prefetch = prefetch or int(os.getenv('MOTOR_ALERTAS_PREFETCH', '500'))
+        self.intervalo_novos = intervalo_novos or float(os.getenv('MOTOR_ALERTAS_NOVOS_SEGUNDOS', '30'))
+        self.intervalo_resync = intervalo_resync or float(os.getenv('MOTOR_ALERTAS_RESYNC_SEGUNDOS', '600'))
+
+        self.rabbitmq = RabbitMQConfig()
+        self.db = Database()
+        self.indice = IndiceAlvos()
+
+        self._ultima_busca_novos = 0
+        self._ultimo_resync = 0
+
+    # ------------------------------------------------------------------
+    # Carga do índice
+    # ------------------------------------------------------------------
+    def recarregar(self):
+        """
+        Reconstrói o índice inteiro a partir do banco e troca de uma vez.
+        """
+        indice = IndiceAlvos()
+        for monitoramento in get_monitoramentos_ativos(self.db):
+            indice.adicionar(monitoramento)
+        self.indice = indice
+        self._ultimo_resync = self._ultima_busca_novos = time.monotonic()
+        print(f"Índice de alertas carregado: {len(indice)} monitoramentos ativos")
+
+    def buscar_novos(self):
+        """
+        Carrega só os monitoramentos com id maior que o último já indexado.
+        """
+        for monitoramento in get_monitoramentos_ativos(self.db, self.indice.maior_id):
+            self.indice.adicionar(monitoramento)
+        self._ultima_busca_novos = time.monotonic()
+
+    def _manutencao(self):
+        agora = time.monotonic()
+        try:
+            if agora - self._ultimo_resync >= self.intervalo_resync:
+                self.recarregar()
+            elif agora - self._ultima_busca_novos >= self.intervalo_novos:
+                self.buscar_novos()
+        except Exception as e:
+            print(f"⚠️ Falha ao atualizar índice de alertas: {e}")
+
+    # ------------------------------------------------------------------
+    # Processamento
+    # ------------------------------------------------------------------
+    def iniciar(self):
+        connection = self.rabbitmq.get_connection()
+        channel = connection.channel()
+        self.rabbitmq.setup_exchanges_and_queues(channel)
+        channel.basic_qos(prefetch_count=self.prefetch)
+        self.recarregar()
+
+        try:
+            for method, properties, body in channel.consume(self.fila, inactivity_timeout=1):
+                if method is not None:
+                    self._processar(channel, method, body)
+                self._manutencao()
+        except KeyboardInterrupt:
+            print("\nEncerrando motor de alertas...")
+        finally:
+            if channel.is_open:
+                channel.cancel()
+            if connection.is_open:
+                connection.close()
+            self.db.close()
+
+    def _processar(self, channel, method, body):
+        try:
+            mensagem = json.loads(body)
+            if method.routing_key.startswith('monitoramento.'):
+                self.aplicar_evento(mensagem)
+            else:
+                self.avaliar_cotacao(channel, mensagem['symbol'], float(mensagem['price']))
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Mensagem inválida descartada: {e}")
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+
+    def aplicar_evento(self, evento):
+        if evento.get('ativo'):
+            self.indice.adicionar(evento)
+        else:
+            self.indice.remover(evento['id'])
+
+    def avaliar_cotacao(self, channel, ticker, preco):
+        disparados = self.indice.disparar(ticker, preco)
+        if not disparados:
+            return []
+
+        # Desativa antes de publicar: um alerta publicado nunca volta num resync.
+        # Se o UPDATE falhar, os alvos voltam ao índice e a próxima cotação tenta de novo.
+        try:
+            desativar_monitoramentos(self.db, [m['id'] for m in disparados])
+        except Exception as e:
+            print(f"⚠️ Falha ao desativar monitoramentos disparados, alertas adiados: {e}")
+            for monitoramento in disparados:
+                self.indice.adicionar(monitoramento)
+            return []
+
+        agora = datetime.now().isoformat(timespec='seconds')
+        propriedades = pika.BasicProperties(delivery_mode=2, content_type='application/json')
+        for monitoramento in disparados:
+            alerta = dict(monitoramento, preco=preco, timestamp=agora)
+            channel.basic_publish(
+                exchange='stock_topic',
+                routing_key=f"alerta.{monitoramento['ticker']}",
+                body=json.dumps(alerta),
+                properties=propriedades,
+            )
+
+        print(f"🔔 {ticker} a R$ {preco}: {len(disparados)} alerta(s) disparado(s)")
+        return disparados
+
+def main():
+    load_dotenv()
+    MotorAlertas().iniciar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Produtor de cotações para o exchange stock_topic.
+
+A cada ciclo busca na BRAPI as cotações dos tickers acompanhados (monitoramentos
+ativos + universo configurado em COTACOES_UNIVERSO) e publica uma mensagem
+`cotacao.<TICKER>` por cotação. Os monitoramentos vêm das tabelas tela_cadastro_*
+no Postgres de DB_HOST/DB_NAME, o mesmo banco do Django (ver README).
+
+A publicação usa publisher confirms de forma assíncrona (pika.SelectConnection):
+até `janela_confirmacoes` mensagens ficam em voo sem esperar confirmação
+individual; cada ack/nack do broker libera espaço para o próximo lote, e
+mensagens rejeitadas (nack) voltam para a fila de publicação.
+
+Uso (na raiz do projeto):
+    python -m Monitoramento.services.produtor_cotacoes
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import pika
+from dotenv import load_dotenv
+
+from api import brapi
+from Monitoramento.config.rabbitmq_config import RabbitMQConfig
+from Monitoramento.config.database.database import Database, get_tickers_monitorados
+
+
+class ProdutorCotacoes:
+
+    def __init__(self, intervalo_segundos=None, universo=None, janela_confirmacoes=None, exchange='stock_topic'):
+        self.intervalo_segundos = intervalo_segundos or float(os.getenv('COTACOES_INTERVALO_SEGUNDOS', '60'))
+        if universo is None:
+            universo = [t.strip().upper() for t in os.getenv('COTACOES_UNIVERSO', '').split(',') if t.strip()]
+        self.universo = universo
+        self.janela_confirmacoes = janela_confirmacoes or int(os.getenv('COTACOES_JANELA_CONFIRMACOES', '500'))
+        self.exchange = exchange
+
+        self.rabbitmq = RabbitMQConfig()
+        self.db = Database()
+
+        self._connection = None
+        self._channel = None
+        self._parando = False
+
+        self._a_publicar = deque()
+        self._pendentes = {}
+        self._proximo_tag = 0
+        self._inicio_ciclo = None
+        self._timer_ciclo = None
+        self._coletando = False
+
+        self.publicadas = 0
+        self.confirmadas = 0
+        self.rejeitadas = 0
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+    def iniciar(self):
+        """
+        Roda o ioloop até `parar()` ser chamado, reconectando se a conexão cair.
+        """
+        # Sem as tabelas do Django no banco só o universo seria publicado: falha já na partida
+        monitorados = get_tickers_monitorados(self.db)
+        print(f"{len(monitorados)} tickers monitorados, {len(self.universo)} no universo")
+
+        while not self._parando:
+            self._connection = pika.SelectConnection(
+                self.rabbitmq.get_parameters(),
+                on_open_callback=self._ao_abrir_conexao,
+                on_open_error_callback=self._ao_falhar_conexao,
+                on_close_callback=self._ao_fechar_conexao,
+            )
+            self._connection.ioloop.start()
+
+            if not self._parando:
+                print("Conexão com RabbitMQ perdida. Reconectando em 5 segundos...")
+                time.sleep(5)
+
+        self.db.close()
+
+    def parar(self):
+        """
+        Pode ser chamado de outra thread.
+        """
+        self._parando = True
+        if self._connection is not None:
+            self._connection.ioloop.add_callback_threadsafe(self._encerrar)
+
+    def _encerrar(self):
+        if self._connection.is_open:
+            self._connection.close()
+        else:
+            self._connection.ioloop.stop()
+
+    def _ao_abrir_conexao(self, connection):
+        connection.channel(on_open_callback=self._ao_abrir_canal)
+
+    def _ao_falhar_conexao(self, connection, erro):
+        print(f"Falha ao conectar no RabbitMQ: {erro}")
+        connection.ioloop.stop()
+
+    def _ao_fechar_conexao(self, connection, motivo):
+        self._channel = None
+        # O timer morre junto com o ioloop desta conexão
+        self._timer_ciclo = None
+        connection.ioloop.stop()
+
+    def _ao_abrir_canal(self, channel):
+        self._channel = channel
+        # Um canal novo recomeça a numeração de delivery tags
+        self._a_publicar.extendleft(reversed(list(self._pendentes.values())))
+        self._pendentes = {}
+        self._proximo_tag = 0
+
+        channel.exchange_declare(
+            exchange=self.exchange,
+            exchange_type='topic',
+            durable=True,
+            callback=lambda _: channel.confirm_delivery(
+                self._ao_confirmar,
+                callback=lambda _: self._agendar_ciclo(0),
+            ),
+        )
+
+    # ------------------------------------------------------------------
+    # Coleta
+    # ------------------------------------------------------------------
+    def _agendar_ciclo(self, atraso):
+        """
+        Agenda o próximo ciclo, substituindo o que já estiver agendado: só existe
+        um timer por vez, mesmo depois de uma reconexão.
+        """
+        ioloop = self._connection.ioloop
+        if self._timer_ciclo is not None:
+            ioloop.remove_timeout(self._timer_ciclo)
+        self._timer_ciclo = ioloop.call_later(atraso, self._iniciar_ciclo)
+
+    def _iniciar_ciclo(self):
+        self._timer_ciclo = None
+        if self._coletando:
+            # Coleta anterior (ex.: iniciada antes de uma reconexão) ainda em curso
+            self._agendar_ciclo(1)
+            return
+        self._coletando = True
+        self._inicio_ciclo = time.monotonic()
+        # A busca na BRAPI é bloqueante; roda fora do ioloop para não atrasar os confirms
+        threading.Thread(target=self._coletar, daemon=True).start()
+
+    def tickers_acompanhados(self):
+        try:
+            monitorados = get_tickers_monitorados(self.db)
+        except Exception as e:
+            print(f"⚠️ Falha ao buscar tickers monitorados: {e}")
+            monitorados = []
+        return sorted(set(monitorados) | set(self.universo))
+
+    def _coletar(self):
+        try:
+            tickers = self.tickers_acompanhados()
+            cotacoes, falhas = brapi.buscar_cotacoes_concorrente(tickers)
+            for ticker, erro in falhas.items():
+                print(f"⚠️ {ticker}: {erro}")
+
+            mensagens = [
+                self._montar_mensagem(ticker, quote)
+                for ticker, quote in cotacoes.items()
+                if quote and quote.get('regularMarketPrice') is not None
+            ]
+        except Exception as e:
+            print(f"⚠️ Falha ao coletar cotações: {e}")
+            mensagens = []
+        try:
+            # Com mensagens ou sem, o ciclo precisa terminar para agendar o próximo
+            if self._connection is not None and not self._parando:
+                self._connection.ioloop.add_callback_threadsafe(lambda: self._enfileirar(mensagens))
+        finally:
+            self._coletando = False
+
+    @staticmethod
+    def _montar_mensagem(ticker, quote):
+        ticker = brapi.simbolo_base(ticker)
+        corpo = {
+            'symbol': ticker,
+            'nome': quote.get('shortName') or ticker,
+            'price': quote.get('regularMarketPrice'),
+            'change': quote.get('regularMarketChangePercent'),
+            'timestamp': quote.get('regularMarketTime') or datetime.now().isoformat(timespec='seconds'),
+        }
+        return f'cotacao.{ticker}', json.dumps(corpo)
+
+    # ------------------------------------------------------------------
+    # Publicação com confirms
+    # ------------------------------------------------------------------
+    def _enfileirar(self, mensagens):
+        self._a_publicar.extend(mensagens)
+        self._publicar()
+
+    def _publicar(self):
+        if self._channel is None or not self._channel.is_open:
+            return
+
+        propriedades = pika.BasicProperties(delivery_mode=2, content_type='application/json')
+        while self._a_publicar and len(self._pendentes) < self.janela_confirmacoes:
+            routing_key, corpo = self._a_publicar.popleft()
+            self._channel.basic_publish(self.exchange, routing_key, corpo, propriedades)
+            self._proximo_tag += 1
+            self._pendentes[self._proximo_tag] = (routing_key, corpo)
+            self.publicadas += 1
+
+        if not self._a_publicar and not self._pendentes:
+            self._finalizar_ciclo()
+
+    def _ao_confirmar(self, frame):
+        metodo = frame.method
+        confirmado = isinstance(metodo, pika.spec.Basic.Ack)
+
+        if metodo.multiple:
+            tags = [t for t in self._pendentes if t <= metodo.delivery_tag]
+        else:
+            tags = [metodo.delivery_tag]
+
+        for tag in tags:
+            mensagem = self._pendentes.pop(tag, None)
+            if mensagem is None:
+                continue
+            if confirmado:
+                self.confirmadas += 1
+            else:
+                self.rejeitadas += 1
+                self._a_publicar.append(mensagem)
+
+        self._publicar()
+
+    def _finalizar_ciclo(self):
+        if self._inicio_ciclo is None:
+            return
+        duracao = time.monotonic() - self._inicio_ciclo
+        self._inicio_ciclo = None
+        print(
+            f"✓ Ciclo concluído em {duracao:.2f}s — publicadas={self.publicadas} "
+            f"confirmadas={self.confirmadas} rejeitadas={self.rejeitadas}"
+        )
+        self._agendar_ciclo(max(0, self.intervalo_segundos - duracao))
+
+
+def main():
+    load_dotenv()
+    produtor = ProdutorCotacoes()
+    try:
+        produtor.iniciar()
+    except KeyboardInterrupt:
+        print("\nEncerrando produtor...")
+        produtor.parar()
+
+
+if __name__ == "__main__":
+    main()
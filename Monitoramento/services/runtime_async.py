@@ -0,0 +1,466 @@
+"""
+Runtime asyncio dos serviços do Monitoramento.
+
+Um único processo consome várias filas (aio-pika), busca cotações na BRAPI
+(httpx.AsyncClient) e grava no Postgres (psycopg.AsyncConnection) ao mesmo
+tempo, no mesmo event loop. Substitui vários workers síncronos de uma tarefa
+só por poucos processos por máquina.
+
+Cada serviço síncrono tem sua versão aqui, ligada por uma flag:
+    --cotacoes      fila_cotacoes       (ConsumidorCotacoes)
+    --alertas       fila_motor_alertas  (MotorAlertas)
+    --notificacoes  fila_notificacoes   (DespachanteNotificacoes)
+    --produtor      publica cotações    (ProdutorCotacoes)
+
+Uso (na raiz do projeto):
+    python -m Monitoramento.services.runtime_async --cotacoes --alertas --notificacoes --produtor
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import aio_pika
+import httpx
+from dotenv import load_dotenv
+
+from api import brapi
+from Monitoramento.config.rabbitmq_config import RabbitMQConfig
+from Monitoramento.config.database.database_async import (
+    AsyncDatabase,
+    desativar_monitoramentos_async,
+    get_monitoramentos_ativos_async,
+    get_tickers_monitorados_async,
+    insert_acoes_async,
+)
+from Monitoramento.services.consumidor_cotacoes import invalidar_cache_cotacoes
+from Monitoramento.services.despachante_notificacoes import (
+    BaldeTokens,
+    descartar_baldes_cheios,
+    formatar_alertas,
+    validar_alerta,
+)
+from Monitoramento.services.motor_alertas import IndiceAlvos
+from Monitoramento.services.transportes import criar_transporte
+
+
+class RuntimeAsync:
+
+    def __init__(self):
+        self.rabbitmq = RabbitMQConfig()
+        self.db = AsyncDatabase()
+        self.connection = None
+        self._consumidores = []
+        self._periodicos = []
+        self._finalizadores = []
+
+    def consumir(self, fila, handler, prefetch=100):
+        """
+        Registra `handler(message)` (corrotina) para a fila. Cada fila ganha seu
+        próprio canal e prefetch; o handler decide quando dar ack.
+        """
+        self._consumidores.append((fila, handler, prefetch))
+
+    def periodico(self, intervalo_segundos, corrotina):
+        self._periodicos.append((intervalo_segundos, corrotina))
+
+    def ao_encerrar(self, corrotina):
+        """
+        Registra `corrotina()` para liberar recursos (clientes HTTP etc.) no encerramento.
+        """
+        self._finalizadores.append(corrotina)
+
+    def _configurar_topologia(self):
+        connection = self.rabbitmq.get_connection()
+        try:
+            self.rabbitmq.setup_exchanges_and_queues(connection.channel())
+        finally:
+            connection.close()
+
+    async def executar(self):
+        # Reaproveita a declaração de filas/bindings do RabbitMQConfig (síncrona)
+        await asyncio.to_thread(self._configurar_topologia)
+        self.connection = await aio_pika.connect_robust(self.rabbitmq.get_url())
+
+        tarefas = []
+        try:
+            for fila, handler, prefetch in self._consumidores:
+                channel = await self.connection.channel()
+                await channel.set_qos(prefetch_count=prefetch)
+                queue = await channel.get_queue(fila, ensure=True)
+                await queue.consume(handler)
+                print(f"Consumindo {fila} (prefetch={prefetch})")
+
+            for intervalo, corrotina in self._periodicos:
+                tarefas.append(asyncio.create_task(self._repetir(intervalo, corrotina)))
+
+            await asyncio.Future()
+        finally:
+            for tarefa in tarefas:
+                tarefa.cancel()
+            for finalizar in reversed(self._finalizadores):
+                try:
+                    await finalizar()
+                except Exception as e:
+                    print(f"⚠️ Falha ao encerrar recurso: {e}")
+            await self.connection.close()
+            await self.db.close()
+
+    @staticmethod
+    async def _repetir(intervalo, corrotina):
+        while True:
+            inicio = time.monotonic()
+            try:
+                await corrotina()
+            except Exception as e:
+                print(f"⚠️ Falha na tarefa periódica: {e}")
+            await asyncio.sleep(max(0, intervalo - (time.monotonic() - inicio)))
+
+
+class IngestaoCotacoesAsync:
+    """
+    Mesmo papel do ConsumidorCotacoes, em asyncio: junta as mensagens em lotes
+    (tamanho ou janela de tempo), grava cada lote numa transação e só então dá ack.
+    """
+
+    def __init__(self, db, tamanho_lote=None, janela_segundos=None):
+        self.db = db
+        self.tamanho_lote = tamanho_lote or int(os.getenv('COTACOES_TAMANHO_LOTE', '200'))
+        self.janela_segundos = janela_segundos or float(os.getenv('COTACOES_JANELA_SEGUNDOS', '1'))
+        self._lote = []
+        self._ultima_mensagem = None
+        self._lock = asyncio.Lock()
+        self._gravacao_agendada = None
+
+    async def __call__(self, message):
+        try:
+            cotacao = json.loads(message.body)
+            ticker = str(cotacao['symbol']).upper()
+            preco = float(cotacao['price'])
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Mensagem inválida descartada: {e}")
+            await message.reject(requeue=False)
+            return
+
+        self._lote.append((ticker, cotacao.get('nome') or cotacao.get('name') or ticker, preco))
+        self._ultima_mensagem = message
+
+        if len(self._lote) >= self.tamanho_lote:
+            await self.gravar()
+        elif self._gravacao_agendada is None:
+            self._gravacao_agendada = asyncio.get_running_loop().call_later(
+                self.janela_segundos, lambda: asyncio.ensure_future(self.gravar())
+            )
+
+    async def gravar(self):
+        async with self._lock:
+            if self._gravacao_agendada is not None:
+                self._gravacao_agendada.cancel()
+                self._gravacao_agendada = None
+            if not self._lote:
+                return
+
+            lote, ultima = self._lote, self._ultima_mensagem
+            self._lote, self._ultima_mensagem = [], None
+            ultimas = {ticker: (ticker, nome, preco) for ticker, nome, preco in lote}
+
+            try:
+                await insert_acoes_async(self.db, list(ultimas.values()))
+            except Exception as e:
+                print(f"❌ Falha ao gravar lote de {len(lote)} cotações: {e}")
+                await ultima.nack(multiple=True, requeue=True)
+                if not self.db.usa_pool:
+                    await self.db.close()
+                return
+
+            await ultima.ack(multiple=True)
+            invalidar_cache_cotacoes()
+            print(f"✓ {len(lote)} cotações ({len(ultimas)} tickers) gravadas")
+
+
+class ProdutorCotacoesAsync:
+    """
+    Mesmo papel do ProdutorCotacoes, em asyncio: busca a BRAPI com httpx e
+    publica com publisher confirms aguardados em paralelo.
+    """
+
+    def __init__(self, runtime, universo=None):
+        self.runtime = runtime
+        if universo is None:
+            universo = [t.strip().upper() for t in os.getenv('COTACOES_UNIVERSO', '').split(',') if t.strip()]
+        self.universo = universo
+        self._exchange = None
+        self._cliente = httpx.AsyncClient()
+        runtime.ao_encerrar(self.fechar)
+
+    async def fechar(self):
+        await self._cliente.aclose()
+
+    async def __call__(self):
+        if self._exchange is None:
+            channel = await self.runtime.connection.channel(publisher_confirms=True)
+            self._exchange = await channel.get_exchange('stock_topic')
+
+        try:
+            monitorados = await get_tickers_monitorados_async(self.runtime.db)
+        except Exception as e:
+            print(f"⚠️ Falha ao buscar tickers monitorados: {e}")
+            monitorados = []
+        tickers = sorted(set(monitorados) | set(self.universo))
+
+        cotacoes, falhas = await brapi.buscar_cotacoes_async(tickers, cliente=self._cliente)
+        for ticker, erro in falhas.items():
+            print(f"⚠️ {ticker}: {erro}")
+
+        publicacoes = []
+        for ticker, quote in cotacoes.items():
+            if not quote or quote.get('regularMarketPrice') is None:
+                continue
+            ticker = brapi.simbolo_base(ticker)
+            corpo = {
+                'symbol': ticker,
+                'nome': quote.get('shortName') or ticker,
+                'price': quote.get('regularMarketPrice'),
+                'change': quote.get('regularMarketChangePercent'),
+                'timestamp': quote.get('regularMarketTime') or datetime.now().isoformat(timespec='seconds'),
+            }
+            mensagem = aio_pika.Message(
+                json.dumps(corpo).encode(),
+                content_type='application/json',
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            )
+            publicacoes.append(self._exchange.publish(mensagem, routing_key=f'cotacao.{ticker}'))
+
+        resultados = await asyncio.gather(*publicacoes, return_exceptions=True)
+        rejeitadas = sum(1 for r in resultados if isinstance(r, Exception))
+        print(f"✓ {len(resultados) - rejeitadas} cotações publicadas e confirmadas ({rejeitadas} rejeitadas)")
+
+
+class MotorAlertasAsync:
+    """
+    Mesmo papel do MotorAlertas, em asyncio: mantém o IndiceAlvos em memória,
+    aplica os eventos `monitoramento.*`, avalia as cotações e publica os
+    alertas (com publisher confirms) depois de desativar os monitoramentos.
+
+    As mensagens são tratadas uma de cada vez (como no motor síncrono), para
+    que a troca do índice no resync não perca eventos nem alertas em curso.
+    """
+
+    def __init__(self, runtime, intervalo_novos=None, intervalo_resync=None):
+        self.runtime = runtime
+        self.db = runtime.db
+        self.intervalo_novos = intervalo_novos or float(os.getenv('MOTOR_ALERTAS_NOVOS_SEGUNDOS', '30'))
+        self.intervalo_resync = intervalo_resync or float(os.getenv('MOTOR_ALERTAS_RESYNC_SEGUNDOS', '600'))
+        self.prefetch = int(os.getenv('MOTOR_ALERTAS_PREFETCH', '500'))
+        self.indice = None
+        self._exchange = None
+        self._lock = asyncio.Lock()
+        self._ultimo_resync = 0
+
+    async def recarregar(self):
+        indice = IndiceAlvos()
+        for monitoramento in await get_monitoramentos_ativos_async(self.db):
+            indice.adicionar(monitoramento)
+        self.indice = indice
+        self._ultimo_resync = time.monotonic()
+        print(f"Índice de alertas carregado: {len(indice)} monitoramentos ativos")
+
+    async def manutencao(self):
+        """
+        Tarefa periódica (a cada intervalo_novos): busca ids novos ou reconstrói o índice.
+        """
+        async with self._lock:
+            if self.indice is None or time.monotonic() - self._ultimo_resync >= self.intervalo_resync:
+                await self.recarregar()
+            else:
+                for monitoramento in await get_monitoramentos_ativos_async(self.db, self.indice.maior_id):
+                    self.indice.adicionar(monitoramento)
+
+    async def __call__(self, message):
+        async with self._lock:
+            if self.indice is None:
+                await self.recarregar()
+            try:
+                mensagem = json.loads(message.body)
+                if message.routing_key.startswith('monitoramento.'):
+                    self.aplicar_evento(mensagem)
+                else:
+                    await self.avaliar_cotacao(mensagem['symbol'], float(mensagem['price']))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"⚠️ Mensagem inválida descartada: {e}")
+                await message.reject(requeue=False)
+                return
+        await message.ack()
+
+    def aplicar_evento(self, evento):
+        if evento.get('ativo'):
+            self.indice.adicionar(evento)
+        else:
+            self.indice.remover(evento['id'])
+
+    async def avaliar_cotacao(self, ticker, preco):
+        disparados = self.indice.disparar(ticker, preco)
+        if not disparados:
+            return []
+
+        try:
+            await desativar_monitoramentos_async(self.db, [m['id'] for m in disparados])
+        except Exception as e:
+            print(f"⚠️ Falha ao desativar monitoramentos disparados, alertas adiados: {e}")
+            for monitoramento in disparados:
+                self.indice.adicionar(monitoramento)
+            return []
+
+        if self._exchange is None:
+            channel = await self.runtime.connection.channel(publisher_confirms=True)
+            self._exchange = await channel.get_exchange('stock_topic')
+
+        agora = datetime.now().isoformat(timespec='seconds')
+        await asyncio.gather(*(
+            self._exchange.publish(
+                aio_pika.Message(
+                    json.dumps(dict(m, preco=preco, timestamp=agora)).encode(),
+                    content_type='application/json',
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                ),
+                routing_key=f"alerta.{m['ticker']}",
+            )
+            for m in disparados
+        ))
+        print(f"🔔 {ticker} a R$ {preco}: {len(disparados)} alerta(s) disparado(s)")
+        return disparados
+
+
+class NotificacoesAsync:
+    """
+    Mesmo papel do DespachanteNotificacoes, em asyncio: agrupa os alertas por
+    destinatário dentro da janela, respeita os baldes de tokens e entrega pelo
+    transporte (síncrono, numa thread) até max_envios ao mesmo tempo. Cada
+    mensagem só recebe ack depois da entrega; em falha volta para a fila uma vez.
+    """
+
+    def __init__(self, transporte=None):
+        self.transporte = transporte or criar_transporte()
+        self.janela_segundos = float(os.getenv('NOTIFICACOES_JANELA_SEGUNDOS', '2'))
+        self.taxa_destino = float(os.getenv('NOTIFICACOES_TAXA_DESTINO', '1'))
+        self.rajada_destino = float(os.getenv('NOTIFICACOES_RAJADA_DESTINO', '3'))
+        self.prefetch = int(os.getenv('NOTIFICACOES_PREFETCH', '500'))
+        self.intervalo_limpeza = float(os.getenv('NOTIFICACOES_LIMPEZA_BALDES_SEGUNDOS', '60'))
+        taxa_global = float(os.getenv('NOTIFICACOES_TAXA_GLOBAL', '30'))
+        self.balde_global = BaldeTokens(taxa_global, taxa_global)
+        self._envios = asyncio.Semaphore(int(os.getenv('NOTIFICACOES_MAX_ENVIOS', '8')))
+        self._baldes = {}
+        self._buffers = {}
+        self._em_envio = set()
+        self._ultima_limpeza = time.monotonic()
+        self._tarefas = set()
+
+    async def __call__(self, message):
+        try:
+            alerta = json.loads(message.body)
+            validar_alerta(alerta)
+            destino = self.transporte.destino(alerta)
+        except (ValueError, TypeError) as e:
+            print(f"⚠️ Mensagem inválida descartada: {e}")
+            await message.reject(requeue=False)
+            return
+
+        if destino is None:
+            print(f"⚠️ Alerta sem destinatário para este transporte: {alerta.get('id')}")
+            await message.ack()
+            return
+
+        buffer = self._buffers.setdefault(destino, {'inicio': time.monotonic(), 'alertas': [], 'mensagens': []})
+        buffer['alertas'].append(alerta)
+        buffer['mensagens'].append(message)
+
+    async def despachar_prontos(self):
+        """
+        Tarefa periódica: dispara a entrega dos buffers cuja janela já fechou.
+        """
+        agora = time.monotonic()
+        for destino, buffer in list(self._buffers.items()):
+            if destino in self._em_envio or agora - buffer['inicio'] < self.janela_segundos:
+                continue
+            balde = self._baldes.get(destino)
+            if balde is None:
+                balde = self._baldes[destino] = BaldeTokens(self.taxa_destino, self.rajada_destino)
+            if not balde.disponivel() or not self.balde_global.disponivel():
+                continue
+            balde.consumir()
+            self.balde_global.consumir()
+
+            del self._buffers[destino]
+            self._em_envio.add(destino)
+            tarefa = asyncio.create_task(self._entregar(destino, buffer))
+            self._tarefas.add(tarefa)
+            tarefa.add_done_callback(self._tarefas.discard)
+
+        if agora - self._ultima_limpeza >= self.intervalo_limpeza:
+            descartar_baldes_cheios(self._baldes, self._buffers.keys() | self._em_envio)
+            self._ultima_limpeza = agora
+
+    async def _entregar(self, destino, buffer):
+        try:
+            async with self._envios:
+                await asyncio.to_thread(self.transporte.enviar, destino, formatar_alertas(buffer['alertas']))
+            sucesso = True
+        except Exception as e:
+            print(f"❌ Falha ao notificar {destino}: {e}")
+            sucesso = False
+        finally:
+            self._em_envio.discard(destino)
+
+        for message in buffer['mensagens']:
+            if sucesso:
+                await message.ack()
+            else:
+                await message.nack(requeue=not message.redelivered)
+
+    async def fechar(self):
+        # Espera as entregas em andamento para não perder os acks
+        if self._tarefas:
+            await asyncio.gather(*self._tarefas, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runtime asyncio do Monitoramento")
+    parser.add_argument('--cotacoes', action='store_true', help="consome fila_cotacoes e grava no banco")
+    parser.add_argument('--alertas', action='store_true', help="consome fila_motor_alertas e dispara alertas")
+    parser.add_argument('--notificacoes', action='store_true', help="consome fila_notificacoes e entrega os alertas")
+    parser.add_argument('--produtor', action='store_true', help="publica cotações da BRAPI periodicamente")
+    args = parser.parse_args()
+
+    load_dotenv()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Consultor_bolsa.settings')
+    if sys.platform == 'win32':
+        # psycopg async não funciona com o ProactorEventLoop padrão do Windows
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    runtime = RuntimeAsync()
+    if args.cotacoes:
+        ingestao = IngestaoCotacoesAsync(runtime.db)
+        runtime.consumir('fila_cotacoes', ingestao, prefetch=ingestao.tamanho_lote * 2)
+    if args.alertas:
+        motor = MotorAlertasAsync(runtime)
+        runtime.consumir('fila_motor_alertas', motor, prefetch=motor.prefetch)
+        runtime.periodico(motor.intervalo_novos, motor.manutencao)
+    if args.notificacoes:
+        notificacoes = NotificacoesAsync()
+        runtime.consumir('fila_notificacoes', notificacoes, prefetch=notificacoes.prefetch)
+        runtime.periodico(0.2, notificacoes.despachar_prontos)
+        runtime.ao_encerrar(notificacoes.fechar)
+    if args.produtor:
+        intervalo = float(os.getenv('COTACOES_INTERVALO_SEGUNDOS', '60'))
+        runtime.periodico(intervalo, ProdutorCotacoesAsync(runtime))
+
+    try:
+        asyncio.run(runtime.executar())
+    except KeyboardInterrupt:
+        print("\nEncerrando runtime...")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Transportes de notificação usados pelo despachante_notificacoes.
+
+Cada transporte sabe extrair o destino de um alerta e entregar um texto nele.
+Escolha pelo NOTIFICACOES_TRANSPORTE (telegram | local).
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+
+import requests
+
+
+class Transporte(ABC):
+
+    @abstractmethod
+    def destino(self, alerta):
+        """
+        Retorna a chave do destinatário do alerta (ou None se não houver como entregar).
+        """
+
+    @abstractmethod
+    def enviar(self, destino, texto):
+        """
+        Entrega `texto` em `destino`; levanta exceção se a entrega falhar.
+        """
+
+
+class TransporteTelegram(Transporte):
+
+    def __init__(self, token=None, timeout=10):
+        self.token = token or os.getenv('TELEGRAM_BOT_TOKEN')
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def destino(self, alerta):
+        return alerta.get('chat_id') or None
+
+    def enviar(self, destino, texto):
+        resp = self.session.post(
+            f"https://api.telegram.org/bot{self.token}/sendMessage",
+            json={'chat_id': destino, 'text': texto},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+
+
+class TransporteLocal(Transporte):
+    """
+    Transporte de teste: não sai da máquina, só guarda e imprime as mensagens.
+    """
+
+    def __init__(self):
+        self.enviadas = []
+        self._lock = threading.Lock()
+
+    def destino(self, alerta):
+        return alerta.get('chat_id') or alerta.get('telefone') or alerta.get('usuario_id')
+
+    def enviar(self, destino, texto):
+        with self._lock:
+            self.enviadas.append((destino, texto))
+        print(f"[{destino}] {texto}")
+
+
+TRANSPORTES = {
+    'telegram': TransporteTelegram,
+    'local': TransporteLocal,
+}
+
+
+def criar_transporte(nome=None):
+    nome = nome or os.getenv('NOTIFICACOES_TRANSPORTE', 'local')
+    return TRANSPORTES[nome]()
@@ -0,0 +1,934 @@
+"""
+Testes unitários dos serviços do Monitoramento (sem RabbitMQ nem Postgres).
+
+Rodam junto com os do Django: python manage.py test
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import unittest
+from contextlib import asynccontextmanager, contextmanager
+from unittest import mock
+
+from Monitoramento.config.database import database, database_async
+from Monitoramento.config.database.database_async import AsyncDatabase
+from Monitoramento.config.database.database import SQL_HEARTBEAT_WORKERS, SQL_SET_LIDER
+from Monitoramento.config.database.registro_workers import RegistroWorkers
+from Monitoramento.config.rabbitmq_pool import RabbitMQPool
+from Monitoramento.services import consumidor_cotacoes, despachante_notificacoes, eleicao, motor_alertas, produtor_cotacoes, runtime_async
+from Monitoramento.services.consumidor_cotacoes import ConsumidorCotacoes, LoteCotacoes
+from Monitoramento.services.despachante_notificacoes import BaldeTokens, DespachanteNotificacoes
+from Monitoramento.services.motor_alertas import IndiceAlvos, MotorAlertas
+from Monitoramento.services.transportes import Transporte
+from tela_cadastro.cache_cotacoes import versao_cotacoes
+
+
+def _monitoramento(id, direcao, preco_alvo=10.0, ticker="PETR4"):
+    return {"id": id, "ticker": ticker, "preco_alvo": preco_alvo, "direcao": direcao, "usuario_id": 1}
+
+
+class IndiceAlvosTests(unittest.TestCase):
+    def _indice(self):
+        indice = IndiceAlvos()
+        for i, direcao in enumerate(motor_alertas.DIRECOES, start=1):
+            indice.adicionar(_monitoramento(i, direcao))
+        return indice
+
+    def _disparados(self, preco):
+        return sorted(m["direcao"] for m in self._indice().disparar("petr4", preco))
+
+    def test_preco_acima_do_alvo(self):
+        self.assertEqual(self._disparados(10.01), ["acima", "acima_ou_igual"])
+
+    def test_preco_igual_ao_alvo_so_dispara_inclusivos(self):
+        self.assertEqual(self._disparados(10.0), ["abaixo_ou_igual", "acima_ou_igual"])
+
+    def test_preco_abaixo_do_alvo(self):
+        self.assertEqual(self._disparados(9.99), ["abaixo", "abaixo_ou_igual"])
+
+    def test_dispara_so_os_alvos_atingidos_e_uma_vez(self):
+        indice = IndiceAlvos()
+        for i, alvo in enumerate((8.0, 9.0, 11.0, 12.0), start=1):
+            indice.adicionar(_monitoramento(i, "acima", alvo))
+            indice.adicionar(_monitoramento(10 + i, "abaixo", alvo))
+
+        self.assertEqual(sorted(m["id"] for m in indice.disparar("PETR4", 10.0)), [1, 2, 13, 14])
+        self.assertEqual(indice.disparar("PETR4", 10.0), [])
+        self.assertEqual(len(indice), 4)
+        self.assertEqual(indice.disparar("VALE3", 10.0), [])
+
+
+class AvaliarCotacaoTests(unittest.TestCase):
+    def setUp(self):
+        # Sem __init__: não conecta em RabbitMQ nem no banco
+        self.motor = MotorAlertas.__new__(MotorAlertas)
+        self.motor.db = mock.Mock()
+        self.motor.indice = IndiceAlvos()
+        self.motor.indice.adicionar(_monitoramento(1, "acima", 9.0))
+        self.canal = mock.Mock()
+
+    def test_desativa_antes_de_publicar(self):
+        ordem = []
+        self.canal.basic_publish.side_effect = lambda **kw: ordem.append("publicar")
+        with mock.patch.object(motor_alertas, "desativar_monitoramentos", side_effect=lambda db, ids: ordem.append("desativar")):
+            disparados = self.motor.avaliar_cotacao(self.canal, "PETR4", 10.0)
+
+        self.assertEqual([m["id"] for m in disparados], [1])
+        self.assertEqual(ordem, ["desativar", "publicar"])
+
+    def test_falha_ao_desativar_nao_publica_e_devolve_ao_indice(self):
+        with mock.patch.object(motor_alertas, "desativar_monitoramentos", side_effect=RuntimeError("banco fora")):
+            self.assertEqual(self.motor.avaliar_cotacao(self.canal, "PETR4", 10.0), [])
+
+        self.canal.basic_publish.assert_not_called()
+        self.assertEqual(len(self.motor.indice), 1)
+        with mock.patch.object(motor_alertas, "desativar_monitoramentos") as desativar:
+            self.assertEqual(len(self.motor.avaliar_cotacao(self.canal, "PETR4", 10.0)), 1)
+        desativar.assert_called_once_with(self.motor.db, [1])
+
+
+class _Relogio:
+    """
+    Substitui time.monotonic: só anda quando o teste manda.
+    """
+
+    def __init__(self, agora=1000.0):
+        self.agora = agora
+
+    def __call__(self):
+        return self.agora
+
+    def avancar(self, segundos):
+        self.agora += segundos
+
+
+class _ExecutorImediato:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class BaldeTokensTests(unittest.TestCase):
+    def setUp(self):
+        self.relogio = _Relogio()
+        patcher = mock.patch("time.monotonic", self.relogio)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rajada_ate_a_capacidade_e_reposicao_pela_taxa(self):
+        balde = BaldeTokens(taxa=2, capacidade=3)
+        self.assertEqual([balde.consumir() for _ in range(4)], [True, True, True, False])
+        self.assertFalse(balde.disponivel())
+
+        self.relogio.avancar(0.5)
+        self.assertTrue(balde.consumir())
+        self.assertFalse(balde.consumir())
+
+    def test_nao_acumula_acima_da_capacidade(self):
+        balde = BaldeTokens(taxa=10, capacidade=2)
+        self.relogio.avancar(60)
+        self.assertEqual([balde.consumir() for _ in range(3)], [True, True, False])
+
+
+class DespachanteTests(unittest.TestCase):
+    def setUp(self):
+        self.relogio = _Relogio()
+        patcher = mock.patch("time.monotonic", self.relogio)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.transporte = despachante_notificacoes.criar_transporte("local")
+        with mock.patch.object(despachante_notificacoes, "RabbitMQConfig"), mock.patch("builtins.print"):
+            self.despachante = DespachanteNotificacoes(
+                transporte=self.transporte, janela_segundos=2, taxa_destino=0.25, rajada_destino=1, taxa_global=100,
+            )
+        self.despachante._channel = mock.Mock()
+        self.despachante._connection = mock.Mock()
+        self.despachante._connection.add_callback_threadsafe.side_effect = lambda callback: callback()
+        self.tag = 0
+
+    def _receber(self, corpo):
+        self.tag += 1
+        metodo = mock.Mock(delivery_tag=self.tag, redelivered=False)
+        with mock.patch("builtins.print"):
+            self.despachante._receber(metodo, corpo if isinstance(corpo, bytes) else json.dumps(corpo))
+
+    def _alerta(self, ticker, chat_id=7):
+        return {"id": 1, "ticker": ticker, "preco": 10, "preco_alvo": 9, "direcao": "acima", "chat_id": chat_id}
+
+    def _despachar(self):
+        with mock.patch("builtins.print"):
+            self.despachante._despachar_prontos(_ExecutorImediato())
+
+    def test_agrupa_alertas_do_mesmo_destino_dentro_da_janela(self):
+        self._receber(self._alerta("PETR4"))
+        self.relogio.avancar(1)
+        self._receber(self._alerta("VALE3"))
+        self._receber(self._alerta("ITUB4", chat_id=8))
+
+        self._despachar()
+        self.assertEqual(self.transporte.enviadas, [])
+
+        self.relogio.avancar(1)
+        self._despachar()
+        self.assertEqual(len(self.transporte.enviadas), 1)
+        destino, texto = self.transporte.enviadas[0]
+        self.assertEqual(destino, 7)
+        self.assertIn("PETR4", texto)
+        self.assertIn("VALE3", texto)
+
+        self.relogio.avancar(1)
+        self._despachar()
+        self.assertEqual([d for d, _ in self.transporte.enviadas], [7, 8])
+        acks = sorted(c.kwargs["delivery_tag"] for c in self.despachante._channel.basic_ack.call_args_list)
+        self.assertEqual(acks, [1, 2, 3])
+
+    def test_balde_do_destino_adia_o_proximo_envio(self):
+        self._receber(self._alerta("PETR4"))
+        self.relogio.avancar(2)
+        self._despachar()
+        self._receber(self._alerta("VALE3"))
+        self.relogio.avancar(2)
+        self._despachar()
+        self.assertEqual(len(self.transporte.enviadas), 1)
+
+        self.relogio.avancar(2)
+        self._despachar()
+        self.assertEqual(len(self.transporte.enviadas), 2)
+
+    def test_falha_na_entrega_devolve_para_a_fila(self):
+        self.transporte.enviar = mock.Mock(side_effect=RuntimeError("fora do ar"))
+        self._receber(self._alerta("PETR4"))
+        self.relogio.avancar(2)
+        self._despachar()
+
+        self.despachante._channel.basic_nack.assert_called_once_with(delivery_tag=1, requeue=True)
+        self.assertEqual(self.despachante.falhas, 1)
+
+    def test_descarta_json_que_nao_e_objeto(self):
+        for corpo in (b"[1, 2]", b'"texto"', b"42", b"{quebrado"):
+            self._receber(corpo)
+        nacks = [c.kwargs for c in self.despachante._channel.basic_nack.call_args_list]
+        self.assertEqual(nacks, [{"delivery_tag": t, "requeue": False} for t in range(1, 5)])
+        self.assertEqual(self.despachante._buffers, {})
+
+    def test_descarta_alerta_sem_campos_obrigatorios(self):
+        sem_preco = self._alerta("PETR4")
+        del sem_preco["preco"]
+        for corpo in (sem_preco, dict(self._alerta("VALE3"), direcao=None), dict(self._alerta("ITUB4"), preco_alvo="dez")):
+            self._receber(corpo)
+
+        nacks = [c.kwargs for c in self.despachante._channel.basic_nack.call_args_list]
+        self.assertEqual(nacks, [{"delivery_tag": t, "requeue": False} for t in range(1, 4)])
+        self.assertEqual(self.despachante._buffers, {})
+
+    def test_balde_ocioso_e_cheio_e_descartado(self):
+        self.despachante.intervalo_limpeza = 1
+        self._receber(self._alerta("PETR4"))
+        self.relogio.avancar(2)
+        self._despachar()
+        # Balde ainda vazio (taxa 0.25/s): continua valendo
+        self.assertIn(7, self.despachante._baldes)
+
+        self.relogio.avancar(4)
+        self._despachar()
+        self.assertEqual(self.despachante._baldes, {})
+
+
+class TransporteTests(unittest.TestCase):
+    def test_transporte_incompleto_nao_instancia(self):
+        class SoDestino(Transporte):
+            def destino(self, alerta):
+                return alerta.get("chat_id")
+
+        with self.assertRaises(TypeError):
+            Transporte()
+        with self.assertRaises(TypeError):
+            SoDestino()
+
+
+class NoEleicaoTests(unittest.TestCase):
+    """
+    _avaliar com relógio falso e banco falso (RegistroWorkers de verdade por cima).
+    """
+
+    def setUp(self):
+        self.relogio = _Relogio()
+        for patcher in (mock.patch("time.monotonic", self.relogio), mock.patch("builtins.print")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _no(self, id, nome=None):
+        with mock.patch.object(eleicao, "RabbitMQConfig"), mock.patch.object(eleicao, "Database"):
+            no = eleicao.NoEleicao(
+                nome=nome or f"no-{id}", intervalo_segundos=2, timeout_segundos=6,
+                ao_assumir_lideranca=mock.Mock(), ao_perder_lideranca=mock.Mock(),
+            )
+        no.id = id
+        no._inicio = self.relogio()
+        return no
+
+    def _heartbeat(self, no, par_id, lider=False):
+        corpo = json.dumps({"id": par_id, "nome": f"no-{par_id}", "lider": lider})
+        no._ao_receber(None, None, None, corpo)
+
+    def _lider_gravado(self, no):
+        return [c.args[1][0] for c in no.db.execute_update.call_args_list if c.args[0] == SQL_SET_LIDER]
+
+    def test_assume_lideranca_depois_da_partida(self):
+        no = self._no(1)
+        self._heartbeat(no, 2)
+        self.relogio.avancar(3)
+        no._avaliar(self.relogio())
+        self.assertFalse(no.lider)
+
+        self.relogio.avancar(3)
+        no._avaliar(self.relogio())
+        self.assertTrue(no.lider)
+        self.assertEqual(no.lider_id, 1)
+        no.ao_assumir_lideranca.assert_called_once_with()
+        self.assertEqual(self._lider_gravado(no), ["no-1"])
+
+    def test_lider_vivo_renova_sem_regravar_nem_ceder_para_id_menor(self):
+        no = self._no(5)
+        self.relogio.avancar(6)
+        no._avaliar(self.relogio())
+        self.assertTrue(no.lider)
+
+        for _ in range(5):
+            self.relogio.avancar(2)
+            self._heartbeat(no, 2)
+            no._avaliar(self.relogio())
+
+        self.assertTrue(no.lider)
+        self.assertEqual(no.lider_id, 5)
+        no.ao_assumir_lideranca.assert_called_once_with()
+        no.ao_perder_lideranca.assert_not_called()
+        self.assertEqual(self._lider_gravado(no), ["no-5"])
+
+    def test_lider_sem_heartbeat_e_substituido(self):
+        no = self._no(3)
+        self._heartbeat(no, 1, lider=True)
+        self.relogio.avancar(6)
+        self._heartbeat(no, 1, lider=True)
+        no._avaliar(self.relogio())
+        self.assertFalse(no.lider)
+        self.assertEqual(no.lider_id, 1)
+
+        # O líder para de mandar heartbeat: some depois de timeout_segundos
+        self.relogio.avancar(5)
+        no._avaliar(self.relogio())
+        self.assertFalse(no.lider)
+        self.relogio.avancar(1)
+        no._avaliar(self.relogio())
+
+        self.assertTrue(no.lider)
+        self.assertEqual(no.lider_id, 3)
+        self.assertEqual(no.ultimo_failover_segundos, 6)
+        self.assertEqual(self._lider_gravado(no), ["no-3"])
+
+    def test_dois_lideres_o_de_id_maior_desiste(self):
+        no = self._no(2)
+        self.relogio.avancar(6)
+        no._avaliar(self.relogio())
+        self.assertTrue(no.lider)
+
+        self._heartbeat(no, 1, lider=True)
+        no._avaliar(self.relogio())
+        self.assertFalse(no.lider)
+        self.assertEqual(no.lider_id, 1)
+        no.ao_perder_lideranca.assert_called_once_with()
+
+
+class _CursorFalso:
+    def __init__(self, log):
+        self.log = log
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=(), prepare=None):
+        self.log.append(("execute", query, params))
+
+    def executemany(self, query, params_seq):
+        params_seq = list(params_seq)
+        self.log.append(("executemany", query, params_seq))
+        self.rowcount = len(params_seq)
+
+    @contextmanager
+    def copy(self, statement):
+        linhas = []
+        self.log.append(("copy", statement, linhas))
+        yield mock.Mock(write_row=linhas.append)
+        self.rowcount = len(linhas)
+
+
+class _ConexaoFalsa:
+    closed = False
+
+    def __init__(self):
+        self.log = []
+
+    def cursor(self):
+        return _CursorFalso(self.log)
+
+    @contextmanager
+    def transaction(self):
+        self.log.append(("begin",))
+        try:
+            yield
+        except Exception:
+            self.log.append(("rollback",))
+            raise
+        self.log.append(("commit",))
+
+    @contextmanager
+    def pipeline(self):
+        yield
+
+
+class _PoolFalso:
+    """
+    ConnectionPool que entrega uma _ConexaoFalsa nova por empréstimo e conta as devoluções.
+    """
+
+    def __init__(self):
+        self.conexoes = []
+        self.em_uso = 0
+        self.devolvidas = 0
+        self.esperou = False
+
+    def wait(self):
+        self.esperou = True
+
+    @contextmanager
+    def connection(self):
+        conexao = _ConexaoFalsa()
+        self.conexoes.append(conexao)
+        self.em_uso += 1
+        try:
+            yield conexao
+        finally:
+            self.em_uso -= 1
+            self.devolvidas += 1
+
+
+class DatabasePoolTests(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.dict(os.environ, {"DB_PORT": "5432"}):
+            self.db = database.Database(pool=True, min_size=2, max_size=4)
+        self.pool = _PoolFalso()
+        patcher = mock.patch.object(database, "ConnectionPool", return_value=self.pool)
+        self.fabrica = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_abre_o_pool_uma_vez(self):
+        self.db.execute_update("update a")
+        self.db.execute_update("update b")
+
+        self.fabrica.assert_called_once()
+        self.assertEqual(self.fabrica.call_args.args, (self.db.conn_string,))
+        self.assertEqual(
+            {k: self.fabrica.call_args.kwargs[k] for k in ("min_size", "max_size", "open")},
+            {"min_size": 2, "max_size": 4, "open": True},
+        )
+        self.assertTrue(self.pool.esperou)
+        self.assertEqual(len(self.pool.conexoes), 2)
+
+    def test_devolve_a_conexao_no_sucesso_e_na_excecao(self):
+        with self.db.conexao() as conexao:
+            # Chamadas aninhadas na mesma thread reaproveitam a conexão emprestada
+            with self.db.conexao() as interna:
+                self.assertIs(interna, conexao)
+        self.assertEqual((self.pool.em_uso, self.pool.devolvidas), (0, 1))
+
+        with self.assertRaises(RuntimeError):
+            with self.db.conexao():
+                raise RuntimeError("falhou no meio")
+        self.assertEqual((self.pool.em_uso, self.pool.devolvidas), (0, 2))
+        self.assertIsNone(self.db._local.conexao)
+
+    def test_transacao_faz_commit_ou_rollback(self):
+        with self.db.transacao():
+            self.db.execute_update("update a")
+        with self.assertRaises(RuntimeError):
+            with self.db.transacao():
+                self.db.execute_update("update b")
+                raise RuntimeError("falhou no meio")
+
+        primeira, segunda = self.pool.conexoes
+        self.assertEqual([op[0] for op in primeira.log], ["begin", "execute", "commit"])
+        self.assertEqual([op[0] for op in segunda.log], ["begin", "execute", "rollback"])
+        self.assertEqual((self.pool.em_uso, self.pool.devolvidas), (0, 2))
+
+    def test_cada_thread_usa_a_sua_conexao(self):
+        barreira = threading.Barrier(2)
+        usadas = []
+
+        def trabalhar():
+            with self.db.conexao() as conexao:
+                barreira.wait(timeout=5)
+                usadas.append(conexao)
+
+        threads = [threading.Thread(target=trabalhar) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(usadas), 2)
+        self.assertIsNot(usadas[0], usadas[1])
+        self.assertEqual((self.pool.em_uso, self.pool.devolvidas), (0, 2))
+
+
+class InsertAcoesTests(unittest.TestCase):
+    """
+    insert_acoes sobre os métodos reais do Database, com uma conexão psycopg falsa.
+    """
+
+    def setUp(self):
+        with mock.patch.dict(os.environ, {"DB_PORT": "5432"}):
+            self.db = database.Database(pool=False)
+        self.conexao = _ConexaoFalsa()
+        self.db.connection = self.conexao
+        patcher = mock.patch.object(database, "LIMITE_COPY_ACOES", 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _linhas(self, n):
+        return [(f"T{i}", f"Empresa {i}", 10.0 + i) for i in range(n)]
+
+    def test_abaixo_do_limite_usa_executemany(self):
+        linhas = self._linhas(2)
+        self.assertEqual(database.insert_acoes(self.db, linhas), 2)
+
+        operacoes = [op[0] for op in self.conexao.log]
+        self.assertEqual(operacoes, ["begin", "executemany", "commit"])
+        _, query, params = self.conexao.log[1]
+        self.assertIs(query, database.SQL_INSERT_ACAO)
+        self.assertEqual(params, linhas)
+        self.assertEqual(query.count("%s"), len(linhas[0]))
+
+    def test_a_partir_do_limite_usa_copy_e_merge(self):
+        linhas = self._linhas(3) + [("T0", "Empresa 0", 99.0)]
+        self.assertEqual(database.insert_acoes(self.db, linhas), 4)
+
+        operacoes = [op[0] for op in self.conexao.log]
+        self.assertEqual(operacoes, ["begin", "execute", "copy", "execute", "commit"])
+        self.assertIs(self.conexao.log[1][1], database.SQL_STAGING_ACAO)
+        _, comando_copy, copiadas = self.conexao.log[2]
+        self.assertEqual(comando_copy, "COPY acao_staging (ordem, abreviacao, nome, valor_atual) FROM STDIN")
+        self.assertEqual(copiadas, [(i,) + linha for i, linha in enumerate(linhas)])
+        self.assertIs(self.conexao.log[3][1], database.SQL_MERGE_ACAO)
+
+    def test_lote_vazio_nao_toca_o_banco(self):
+        self.assertEqual(database.insert_acoes(self.db, []), 0)
+        self.assertEqual(self.conexao.log, [])
+
+    def test_sql_da_staging_e_do_merge(self):
+        staging = " ".join(database.SQL_STAGING_ACAO.split())
+        merge = " ".join(database.SQL_MERGE_ACAO.split())
+
+        colunas = re.search(r"create temp table acao_staging \((.*)\) on commit drop", staging).group(1)
+        self.assertEqual([c.split()[0] for c in colunas.split(", ")], ["ordem", "abreviacao", "nome", "valor_atual"])
+        # Um ticker repetido no lote vira uma linha só, a de maior ordem (a última)
+        self.assertIn("select distinct on (abreviacao)", merge)
+        self.assertIn("from acao_staging order by abreviacao, ordem desc", merge)
+        self.assertIn("on conflict (abreviacao) do update set", merge)
+        self.assertNotIn("%s", merge)
+        # As cotações vão para a tabela Acao que o Django lê
+        self.assertIn("insert into tela_cadastro_acao (", merge)
+        self.assertIn("insert into tela_cadastro_acao (", " ".join(database.SQL_INSERT_ACAO.split()))
+
+
+class RegistroWorkersTests(unittest.TestCase):
+    def setUp(self):
+        self.relogio = _Relogio()
+        patcher = mock.patch("time.monotonic", self.relogio)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db = mock.Mock()
+        self.db.execute_update.return_value = 2
+        self.registro = RegistroWorkers(self.db, intervalo_segundos=2)
+
+    def test_heartbeats_acumulados_vao_num_unico_update(self):
+        self.registro.heartbeat("a", 10)
+        self.registro.heartbeat("b", 20)
+        self.registro.heartbeat("a", 11)
+        self.db.execute_update.assert_not_called()
+
+        self.relogio.avancar(2)
+        self.registro.heartbeat("b", 21)
+
+        self.db.execute_update.assert_called_once_with(SQL_HEARTBEAT_WORKERS, (["a", "b"], [11, 21]), prepare=True)
+        self.assertEqual(self.registro._pendentes, {})
+        self.assertEqual(self.registro.flush(), 0)
+        self.db.execute_update.assert_called_once()
+
+    def test_falha_no_flush_devolve_os_pendentes(self):
+        self.registro.heartbeat("a", 10)
+        self.db.execute_update.side_effect = RuntimeError("banco fora")
+        with self.assertRaises(RuntimeError):
+            self.registro.flush()
+        self.assertEqual(self.registro._pendentes, {"a": 10})
+
+
+class LoteCotacoesTests(unittest.TestCase):
+    def setUp(self):
+        self.relogio = _Relogio()
+        patcher = mock.patch("time.monotonic", self.relogio)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.lote = LoteCotacoes(tamanho=3, janela_segundos=1)
+        self.eventos = []
+
+    def _gravar(self, persistir=None):
+        return self.lote.gravar(
+            persistir or (lambda linhas: self.eventos.append(("persistir", linhas))),
+            lambda tag: self.eventos.append(("ack", tag)),
+            lambda tag: self.eventos.append(("nack", tag)),
+        )
+
+    def test_fecha_pelo_tamanho(self):
+        self.assertFalse(self.lote.pronto())
+        self.lote.adicionar(1, "PETR4", "Petrobras", 10.0)
+        self.lote.adicionar(2, "VALE3", "Vale", 60.0)
+        self.assertFalse(self.lote.pronto())
+        self.lote.adicionar(3, "ITUB4", "Itaú", 30.0)
+        self.assertTrue(self.lote.pronto())
+
+    def test_fecha_pela_janela_contada_da_primeira_cotacao(self):
+        self.lote.adicionar(1, "PETR4", "Petrobras", 10.0)
+        self.relogio.avancar(0.6)
+        self.lote.adicionar(2, "VALE3", "Vale", 60.0)
+        self.assertFalse(self.lote.pronto())
+        self.relogio.avancar(0.4)
+        self.assertTrue(self.lote.pronto())
+
+    def test_ack_depois_de_persistir_com_a_ultima_cotacao_de_cada_ticker(self):
+        self.lote.adicionar(1, "PETR4", "Petrobras", 10.0)
+        self.lote.adicionar(2, "VALE3", "Vale", 60.0)
+        self.lote.adicionar(3, "PETR4", "Petrobras", 10.5)
+
+        self.assertEqual(self._gravar(), 2)
+        self.assertEqual(self.eventos, [
+            ("persistir", [("PETR4", "Petrobras", 10.5), ("VALE3", "Vale", 60.0)]),
+            ("ack", 3),
+        ])
+        self.assertEqual(len(self.lote), 0)
+        self.assertFalse(self.lote.pronto())
+
+    def test_falha_ao_persistir_rejeita_sem_ack(self):
+        self.lote.adicionar(7, "PETR4", "Petrobras", 10.0)
+        self.lote.adicionar(8, "VALE3", "Vale", 60.0)
+
+        with self.assertRaises(RuntimeError):
+            self._gravar(mock.Mock(side_effect=RuntimeError("banco fora")))
+        self.assertEqual(self.eventos, [("nack", 8)])
+        self.assertEqual(len(self.lote), 0)
+
+        self.lote.adicionar(9, "ITUB4", "Itaú", 30.0)
+        self.relogio.avancar(0.5)
+        self.assertFalse(self.lote.pronto())
+
+
+class ConsumidorCotacoesTests(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.object(consumidor_cotacoes, "RabbitMQConfig"), mock.patch.object(consumidor_cotacoes, "Database"):
+            self.consumidor = ConsumidorCotacoes(tamanho_lote=10, janela_segundos=1)
+        self.channel = mock.Mock()
+        self.consumidor.lote.adicionar(1, "PETR4", "Petrobras", 10.0)
+
+    def test_gravacao_troca_a_versao_do_cache_das_cotacoes(self):
+        versao = versao_cotacoes()
+        with mock.patch.object(consumidor_cotacoes, "insert_acoes") as insert, mock.patch("builtins.print"):
+            self.consumidor._gravar_lote(self.channel)
+
+        insert.assert_called_once_with(self.consumidor.db, [("PETR4", "Petrobras", 10.0)])
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=1, multiple=True)
+        self.assertNotEqual(versao_cotacoes(), versao)
+
+    def test_falha_na_gravacao_mantem_o_cache(self):
+        versao = versao_cotacoes()
+        with mock.patch.object(consumidor_cotacoes, "insert_acoes", side_effect=RuntimeError("banco fora")), \
+                mock.patch.object(consumidor_cotacoes.time, "sleep"), mock.patch("builtins.print"):
+            self.consumidor._gravar_lote(self.channel)
+
+        self.channel.basic_nack.assert_called_once_with(delivery_tag=1, multiple=True, requeue=True)
+        self.assertEqual(versao_cotacoes(), versao)
+
+
+class RabbitMQPoolTests(unittest.TestCase):
+    def test_um_canal_por_conexao_mesmo_com_uma_thread_por_publicacao(self):
+        conexoes = []
+
+        def nova_conexao(parametros):
+            conexao = mock.Mock(is_open=True)
+            conexao.channel.side_effect = lambda: mock.Mock(is_open=True)
+            conexoes.append(conexao)
+            return conexao
+
+        pool = RabbitMQPool(config=mock.Mock(), tamanho=2)
+        with mock.patch("pika.BlockingConnection", side_effect=nova_conexao):
+            # Como os signals do Django: uma thread nova a cada evento
+            for i in range(10):
+                thread = threading.Thread(target=pool.publicar, args=("stock_topic", f"teste.{i}", "{}"))
+                thread.start()
+                thread.join()
+
+        self.assertEqual(len(conexoes), 2)
+        self.assertEqual([c.channel.call_count for c in conexoes], [1, 1])
+        publicados = sum(canal.basic_publish.call_count for canal in pool._canais)
+        self.assertEqual(publicados, 10)
+
+    def test_canal_fechado_e_reaberto_na_mesma_conexao(self):
+        conexao = mock.Mock(is_open=True)
+        conexao.channel.side_effect = lambda: mock.Mock(is_open=True)
+        pool = RabbitMQPool(config=mock.Mock(), tamanho=1)
+        with mock.patch("pika.BlockingConnection", return_value=conexao):
+            with pool.canal() as canal:
+                canal.is_open = False
+            with pool.canal() as novo:
+                self.assertIsNot(novo, canal)
+        self.assertEqual(conexao.channel.call_count, 2)
+
+
+class _ConexaoAsyncFalsa:
+    """
+    AsyncConnection que acusa duas tarefas usando a conexão ao mesmo tempo.
+    """
+    closed = False
+
+    def __init__(self):
+        self.em_uso = 0
+        self.sobreposicoes = 0
+
+    @asynccontextmanager
+    async def cursor(self):
+        conexao = self
+
+        class Cursor:
+            rowcount = 1
+
+            async def execute(self, query, params=()):
+                conexao.em_uso += 1
+                if conexao.em_uso > 1:
+                    conexao.sobreposicoes += 1
+                await asyncio.sleep(0.01)
+                conexao.em_uso -= 1
+
+            async def fetchall(self):
+                return [{"abreviacao": "PETR4"}]
+
+        yield Cursor()
+
+
+class _ConexaoPoolAsyncFalsa:
+    closed = False
+
+    def __init__(self):
+        self.log = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.log.append("begin")
+        try:
+            yield
+        except Exception:
+            self.log.append("rollback")
+            raise
+        self.log.append("commit")
+
+    @asynccontextmanager
+    async def cursor(self):
+        conexao = self
+
+        class Cursor:
+            rowcount = 1
+
+            async def execute(self, query, params=()):
+                conexao.log.append("execute")
+                await asyncio.sleep(0)
+
+        yield Cursor()
+
+
+class _PoolAsyncFalso:
+    def __init__(self):
+        self.conexoes = []
+        self.em_uso = 0
+        self.maximo_em_uso = 0
+        self.devolvidas = 0
+        self.open = mock.AsyncMock()
+
+    @asynccontextmanager
+    async def connection(self):
+        conexao = _ConexaoPoolAsyncFalsa()
+        self.conexoes.append(conexao)
+        self.em_uso += 1
+        self.maximo_em_uso = max(self.maximo_em_uso, self.em_uso)
+        try:
+            yield conexao
+        finally:
+            self.em_uso -= 1
+            self.devolvidas += 1
+
+
+class AsyncDatabasePoolTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        with mock.patch.dict(os.environ, {"DB_PORT": "5432"}):
+            self.db = AsyncDatabase(pool=True, min_size=2, max_size=4)
+        self.pool = _PoolAsyncFalso()
+        patcher = mock.patch.object(database_async, "AsyncConnectionPool", return_value=self.pool)
+        self.fabrica = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_abre_o_pool_uma_vez_e_devolve_a_conexao(self):
+        await self.db.execute_update("update a")
+        await self.db.execute_update("update b")
+
+        self.fabrica.assert_called_once()
+        self.assertEqual(self.fabrica.call_args.kwargs["open"], False)
+        self.pool.open.assert_awaited_once_with(wait=True)
+        self.assertEqual((self.pool.em_uso, self.pool.devolvidas), (0, 2))
+
+    async def test_devolve_a_conexao_na_excecao(self):
+        with self.assertRaises(RuntimeError):
+            async with self.db.conexao():
+                raise RuntimeError("falhou no meio")
+
+        self.assertEqual((self.pool.em_uso, self.pool.devolvidas), (0, 1))
+        self.assertIsNone(self.db._atual.get())
+
+    async def test_transacao_faz_commit_ou_rollback(self):
+        async with self.db.transacao():
+            await self.db.execute_update("update a")
+        with self.assertRaises(RuntimeError):
+            async with self.db.transacao():
+                await self.db.execute_update("update b")
+                raise RuntimeError("falhou no meio")
+
+        primeira, segunda = self.pool.conexoes
+        self.assertEqual(primeira.log, ["begin", "execute", "commit"])
+        self.assertEqual(segunda.log, ["begin", "execute", "rollback"])
+        self.assertEqual(self.pool.em_uso, 0)
+
+    async def test_tarefas_concorrentes_nao_dividem_conexao(self):
+        async def trabalhar():
+            async with self.db.conexao() as conexao:
+                await asyncio.sleep(0.01)
+                # Dentro da mesma tarefa, chamadas aninhadas reaproveitam a conexão
+                async with self.db.conexao() as interna:
+                    self.assertIs(interna, conexao)
+                return conexao
+
+        usadas = await asyncio.gather(trabalhar(), trabalhar())
+
+        self.assertIsNot(usadas[0], usadas[1])
+        self.assertEqual(self.pool.maximo_em_uso, 2)
+        self.assertEqual((self.pool.em_uso, self.pool.devolvidas), (0, 2))
+
+
+class RuntimeAsyncTests(unittest.IsolatedAsyncioTestCase):
+    async def test_conexao_unica_e_usada_por_uma_tarefa_de_cada_vez(self):
+        with mock.patch.dict(os.environ, {"DB_PORT": "5432"}):
+            db = AsyncDatabase(pool=False)
+        db.connection = _ConexaoAsyncFalsa()
+
+        await asyncio.gather(*(db.execute_query("select 1") for _ in range(5)))
+        self.assertEqual(db.connection.sobreposicoes, 0)
+
+    async def test_produtor_fecha_o_cliente_http_no_encerramento(self):
+        runtime = mock.Mock(_finalizadores=[])
+        runtime.ao_encerrar.side_effect = runtime._finalizadores.append
+        produtor = runtime_async.ProdutorCotacoesAsync(runtime, universo=["PETR4"])
+
+        self.assertEqual(runtime._finalizadores, [produtor.fechar])
+        await produtor.fechar()
+        self.assertTrue(produtor._cliente.is_closed)
+
+    async def test_motor_async_nao_publica_se_a_desativacao_falhar(self):
+        runtime = mock.Mock()
+        motor = runtime_async.MotorAlertasAsync(runtime)
+        motor.indice = IndiceAlvos()
+        motor.indice.adicionar(_monitoramento(1, "acima", 9.0))
+        mensagem = mock.AsyncMock(body=json.dumps({"symbol": "PETR4", "price": 10.0}).encode(),
+                                  routing_key="cotacao.PETR4")
+
+        with mock.patch.object(runtime_async, "desativar_monitoramentos_async", side_effect=RuntimeError("banco fora")), \
+                mock.patch("builtins.print"):
+            await motor(mensagem)
+
+        runtime.connection.channel.assert_not_called()
+        mensagem.ack.assert_awaited_once()
+        self.assertEqual(len(motor.indice), 1)
+
+
+class _IOLoopFalso:
+    def __init__(self):
+        self.timers = {}
+        self.callbacks = []
+        self._proximo = 0
+
+    def add_callback_threadsafe(self, callback):
+        self.callbacks.append(callback)
+
+    def call_later(self, atraso, callback):
+        self._proximo += 1
+        self.timers[self._proximo] = (atraso, callback)
+        return self._proximo
+
+    def remove_timeout(self, handle):
+        del self.timers[handle]
+
+
+class ProdutorCotacoesTests(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.object(produtor_cotacoes, "RabbitMQConfig"), mock.patch.object(produtor_cotacoes, "Database"):
+            self.produtor = produtor_cotacoes.ProdutorCotacoes(intervalo_segundos=60, universo=["PETR4"])
+        self.ioloop = _IOLoopFalso()
+        self.produtor._connection = mock.Mock(ioloop=self.ioloop)
+
+    def test_reagendar_substitui_o_timer_pendente(self):
+        self.produtor._agendar_ciclo(60)
+        self.produtor._agendar_ciclo(0)
+
+        self.assertEqual(list(self.ioloop.timers.values()), [(0, self.produtor._iniciar_ciclo)])
+
+    def test_nao_inicia_ciclo_com_coleta_anterior_em_curso(self):
+        self.produtor._coletando = True
+        with mock.patch.object(produtor_cotacoes.threading, "Thread") as thread:
+            self.produtor._iniciar_ciclo()
+
+        thread.assert_not_called()
+        self.assertEqual(list(self.ioloop.timers.values()), [(1, self.produtor._iniciar_ciclo)])
+
+    def test_nao_sobe_sem_as_tabelas_do_django(self):
+        self.produtor.db = mock.Mock()
+        with mock.patch.object(produtor_cotacoes, "get_tickers_monitorados", side_effect=RuntimeError("relation does not exist")), \
+                mock.patch.object(produtor_cotacoes.pika, "SelectConnection") as conexao:
+            with self.assertRaises(RuntimeError):
+                self.produtor.iniciar()
+
+        conexao.assert_not_called()
+
+    def test_coleta_com_falha_libera_o_proximo_ciclo(self):
+        self.produtor._coletando = True
+        with mock.patch.object(produtor_cotacoes.brapi, "buscar_cotacoes_concorrente", side_effect=RuntimeError("fora")), \
+                mock.patch.object(produtor_cotacoes, "get_tickers_monitorados", return_value=[]), \
+                mock.patch("builtins.print"):
+            self.produtor._coletar()
+
+        self.assertFalse(self.produtor._coletando)
+        self.assertEqual(len(self.ioloop.callbacks), 1)
@@ -0,0 +1,337 @@
+"""
+Atualizações da BRAPI para o banco (lista de ações e histórico).
+
+São executadas pelas tarefas de api/tarefas.py, fora da requisição HTTP; as
+views assíncronas (api/views_async.py) reaproveitam as partes sem I/O externo.
+`progresso`, quando informado, recebe definir_total(n) e registrar({ticker: resultado})
+conforme cada ticker termina.
+"""
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Max, Min
+
+from api import brapi
+from api.brapi import safe_get
+from api.persistencia import salvar_acoes_em_lote, salvar_historico_em_lote
+from tela_cadastro.indicadores import atualizar_indicadores
+from tela_cadastro.models import Acao, AcaoHistorico
+
+
+def _opcoes_busca():
+    return {
+        "max_concorrencia": getattr(settings, "BRAPI_MAX_CONCORRENCIA", brapi.MAX_CONCORRENCIA_PADRAO),
+        "timeout": getattr(settings, "BRAPI_TIMEOUT", brapi.TIMEOUT_PADRAO),
+        "tamanho_lote": getattr(settings, "BRAPI_TAMANHO_LOTE", brapi.TAMANHO_LOTE_PADRAO),
+    }
+
+
+def linha_acao(s, quote):
+    """
+    Campos do model Acao a partir do item do /quote/list (`s`) e da cotação detalhada.
+    """
+    ticker = s.get("stock")
+    return {
+        "abreviacao": ticker,
+        "nome": safe_get(s, "name", ticker),
+        "nome_completo": safe_get(quote, "longName", safe_get(s, "name", ticker)),
+        "moeda": safe_get(quote, "currency", "BRL"),
+        "valor_atual": safe_get(s, "close", safe_get(quote, "regularMarketPrice", 0)),
+        "alta_dia": safe_get(quote, "regularMarketDayHigh", 0),
+        "baixa_dia": safe_get(quote, "regularMarketDayLow", 0),
+        "percentual_mudanca": safe_get(s, "change", safe_get(quote, "regularMarketChangePercent", 0)),
+        "variacao": safe_get(quote, "regularMarketChange", 0),
+        "volume": safe_get(s, "volume", safe_get(quote, "regularMarketVolume", 0)),
+        "preco_abertura": safe_get(quote, "regularMarketOpen", 0),
+        "preco_anterior": safe_get(quote, "regularMarketPreviousClose", 0),
+        "faixa_dia": f"{safe_get(quote, 'regularMarketDayLow', 0)} - {safe_get(quote, 'regularMarketDayHigh', 0)}",
+        "market_cap": safe_get(s, "market_cap", safe_get(quote, "marketCap", 0)),
+        "logo_url": safe_get(s, "logo", safe_get(quote, "logourl", "")),
+        "setor": safe_get(s, "sector", safe_get(quote, "sector", "")),
+        "industria": safe_get(quote, "industry", ""),
+    }
+
+
+def linha_acao_detalhada(ticker, nome, quote, profile):
+    """
+    Campos do model Acao a partir do /quote/{ticker} com o módulo summaryProfile.
+    """
+    return {
+        "abreviacao": ticker,
+        "nome": nome,
+        "nome_completo": safe_get(quote, "longName", nome),
+        "moeda": safe_get(quote, "currency", "BRL"),
+        "valor_atual": safe_get(quote, "regularMarketPrice", 0),
+        "alta_dia": safe_get(quote, "regularMarketDayHigh", 0),
+        "baixa_dia": safe_get(quote, "regularMarketDayLow", 0),
+        "percentual_mudanca": safe_get(quote, "regularMarketChangePercent", 0),
+        "variacao": safe_get(quote, "regularMarketChange", 0),
+        "volume": safe_get(quote, "regularMarketVolume", 0),
+        "preco_abertura": safe_get(quote, "regularMarketOpen", 0),
+        "preco_anterior": safe_get(quote, "regularMarketPreviousClose", 0),
+        "faixa_dia": f"{safe_get(quote, 'regularMarketDayLow', 0)} - {safe_get(quote, 'regularMarketDayHigh', 0)}",
+        "market_cap": safe_get(quote, "marketCap", 0),
+        "logo_url": safe_get(quote, "logourl", ""),
+        "setor": safe_get(profile, "sector", safe_get(quote, "sector", "")),
+        "industria": safe_get(profile, "industry", safe_get(quote, "industry", "")),
+    }
+
+
+def ticker_para_fallback(ticker, profile):
+    """
+    Ticker do papel de origem (ex.: BDR AAPL34 -> AAPL) para completar setor e
+    indústria quando o summaryProfile veio vazio; None se não se aplica.
+    """
+    if profile.get("sector") or ticker.endswith(("11", "12")):
+        return None
+    base_ticker = (
+        ticker.replace("34", "")
+            .replace("F", "")
+            .rstrip()
+    )
+    return base_ticker if base_ticker != ticker else None
+
+
+def montar_linhas(stocks, cotacoes, falhas):
+    """
+    Linhas do upsert de Acao e lista de erros [{ticker: erro}] dos que falharam.
+    """
+    linhas, erros = [], []
+    for s in stocks:
+        ticker = s.get("stock")
+        if ticker in falhas:
+            erros.append({ticker: falhas[ticker]})
+            continue
+        linhas.append(linha_acao(s, cotacoes.get(ticker)))
+    return linhas, erros
+
+
+def executar_atualizar_acoes(progresso=None):
+    """
+    Busca lista de ações na BRAPI e preenche o máximo possível de campos no model Acao.
+    Usa /quote/list para base e /quote/{T1,...,TN} para os detalhes, agrupando
+    BRAPI_TAMANHO_LOTE tickers por requisição e disparando os lotes em paralelo
+    (até BRAPI_MAX_CONCORRENCIA requisições simultâneas).
+    """
+    opcoes = _opcoes_busca()
+
+    # 1️⃣ Buscar lista geral (máximo 100 ações por página)
+    params = {"limit": 100, "sortBy": "volume", "sortOrder": "desc"}
+    try:
+        data = brapi.get_cliente().get_json("/quote/list", params, opcoes["timeout"])
+    except brapi.requests.HTTPError as e:
+        return {
+            "ok": False,
+            "erro": f"Falha ao buscar lista ({e.response.status_code})",
+            "detalhe": e.response.text,
+        }
+
+    stocks = data.get("stocks", [])
+    if progresso:
+        progresso.definir_total(len(stocks))
+
+    def lote_concluido(cotacoes_lote, falhas_lote):
+        # Só as falhas já são definitivas; os demais terminam no upsert
+        if progresso and falhas_lote:
+            progresso.registrar({t: {"ok": False, "erro": erro} for t, erro in falhas_lote.items()})
+
+    # 2️⃣ Buscar detalhes de todas as ações em lotes paralelos
+    cotacoes, falhas = brapi.buscar_cotacoes_concorrente(
+        [s.get("stock") for s in stocks],
+        params={"range": "1d"},
+        ao_concluir_lote=lote_concluido,
+        **opcoes,
+    )
+
+    # 3️⃣ Normalizar as linhas e gravar tudo com um único upsert
+    linhas, erros = montar_linhas(stocks, cotacoes, falhas)
+
+    try:
+        criadas, atualizadas = salvar_acoes_em_lote(linhas)
+    except Exception as e:
+        criadas, atualizadas = [], []
+        erros.extend({linha["abreviacao"]: str(e)} for linha in linhas)
+
+    if progresso:
+        progresso.registrar({
+            **{t: {"ok": True, "acao": "criada"} for t in criadas},
+            **{t: {"ok": True, "acao": "atualizada"} for t in atualizadas},
+            **{t: {"ok": False, "erro": erro} for e in erros for t, erro in e.items()},
+        })
+
+    return {
+        "ok": True,
+        "criadas": criadas,
+        "atualizadas": atualizadas,
+        "falhas": erros,
+        "qtde_processadas": len(stocks),
+    }
+
+
+def salvar_historico(ticker, r, periodo, desde=None):
+    """
+    Grava o `historicalDataPrice` de um item de `results` da BRAPI no AcaoHistorico.
+    Com `desde` (modo sync), descarta os dias anteriores e não reescreve os inalterados.
+    Retorna {"ok": True, "inseridos": n, "atualizados": m} ou {"ok": False, "erro": ...}.
+    """
+    if not r:
+        return {"ok": False, "erro": f"Ticker '{ticker}' não encontrado na BRAPI."}
+
+    prices = r.get("historicalDataPrice", [])
+    if desde is not None:
+        prices = [p for p in prices if datetime.fromtimestamp(p["date"]).date() >= desde]
+    if not prices:
+        if desde is not None:
+            return {"ok": True, "inseridos": 0, "atualizados": 0}
+        return {"ok": False, "erro": f"Sem dados para o período '{periodo}'."}
+
+    acao = Acao.objects.filter(abreviacao=ticker).first()
+    if not acao:
+        return {"ok": False, "erro": f"Ação '{ticker}' não existe no banco."}
+
+    inseridos, atualizados = salvar_historico_em_lote(
+        acao, prices, ignorar_inalterados=desde is not None
+    )
+
+    # Recalcula os indicadores só a partir do primeiro dia recebido
+    if inseridos or atualizados:
+        try:
+            atualizar_indicadores(acao, desde=datetime.fromtimestamp(min(p["date"] for p in prices)).date())
+        except Exception as e:
+            print(f"⚠️ Falha ao atualizar indicadores de {ticker}: {e}")
+
+    return {"ok": True, "inseridos": inseridos, "atualizados": atualizados}
+
+
+# Dias sem pregão (fim de semana, feriados) entre o início do período e o
+# primeiro dia gravado que ainda não contam como buraco no começo
+FOLGA_INICIO_DIAS = 7
+
+
+def faixas_para_sync(tickers, periodo):
+    """
+    Para cada ticker, o último dia já gravado e a menor faixa da BRAPI (sem
+    passar de `periodo`) que cobre do último dia até hoje (o último dia é
+    buscado de novo, pois pode ter sido gravado com o pregão ainda aberto).
+    Se o que está gravado começa depois do início de `periodo` (ex.: só há
+    1mo e foi pedido 1y), busca o período inteiro.
+    Retorna {ticker: (faixa, ultima_data ou None)}.
+    """
+    datas = {t: (primeira, ultima) for t, primeira, ultima in consulta_datas_gravadas(tickers)}
+    return calcular_faixas(tickers, periodo, datas)
+
+
+def consulta_datas_gravadas(tickers):
+    """
+    Queryset de (ticker, primeiro dia gravado, último dia gravado) dos `tickers`.
+    """
+    return (
+        AcaoHistorico.objects.filter(acao__abreviacao__in=tickers)
+        .values("acao__abreviacao")
+        .annotate(primeira=Min("data"), ultima=Max("data"))
+        .values_list("acao__abreviacao", "primeira", "ultima")
+    )
+
+
+def dias_do_periodo(periodo, hoje=None):
+    """
+    Dias corridos cobertos por `periodo` (None para "max" ou desconhecido).
+    """
+    hoje = hoje or date.today()
+    if periodo == "ytd":
+        return (hoje - date(hoje.year, 1, 1)).days + 1
+    return dict(brapi.FAIXAS).get(periodo)
+
+
+def calcular_faixas(tickers, periodo, datas):
+    """
+    `datas`: {ticker: (primeira, ultima)} do que já está gravado.
+    """
+    hoje = date.today()
+    dias = dias_do_periodo(periodo, hoje)
+    inicio = hoje - timedelta(days=dias) if dias else None
+
+    faixas = {}
+    for t in tickers:
+        if t not in datas:
+            faixas[t] = (periodo, None)
+            continue
+        primeira, ultima = datas[t]
+        if inicio is not None and primeira > inicio + timedelta(days=FOLGA_INICIO_DIAS):
+            # Buraco no começo: o upsert em (acao, data) absorve a sobreposição
+            faixas[t] = (periodo, None)
+        else:
+            faixas[t] = (brapi.faixa_minima((hoje - ultima).days + 1, periodo), ultima)
+    return faixas
+
+
+def resumo_historico(por_ticker, periodo):
+    """
+    Corpo da resposta do histórico: o resultado do ticker, se for um só, ou o
+    total com o detalhe por ticker.
+    """
+    if len(por_ticker) == 1:
+        resultado = next(iter(por_ticker.values()))
+        if not resultado["ok"]:
+            return resultado
+        return {
+            "ok": True,
+            "msg": f"Histórico ({periodo}) salvo com sucesso — {resultado['inseridos']} registros inseridos.",
+            "periodo": periodo,
+            **{k: v for k, v in resultado.items() if k != "ok"},
+        }
+
+    total = sum(r.get("inseridos", 0) for r in por_ticker.values())
+    return {
+        "ok": any(r["ok"] for r in por_ticker.values()),
+        "msg": f"Histórico ({periodo}) salvo para {len(por_ticker)} ações — {total} registros inseridos.",
+        "periodo": periodo,
+        "por_ticker": por_ticker,
+    }
+
+
+def executar_historico(tickers, periodo="1mo", sync=False, progresso=None):
+    """
+    Busca o histórico de preços dos `tickers` na BRAPI, em lotes de
+    BRAPI_TAMANHO_LOTE por requisição, e salva no banco.
+
+    Com `sync`, busca só o que falta: para cada ticker pede à BRAPI a menor
+    faixa que cobre do último dia gravado até hoje e ignora os dias inalterados
+    (ou o período inteiro, se o gravado não chega ao início dele).
+    """
+    if progresso:
+        progresso.definir_total(len(tickers))
+
+    # Corrige o ticker automaticamente
+    tickers_brapi = {t: t if "." in t else f"{t}.SA" for t in tickers}
+
+    if sync:
+        faixas = faixas_para_sync([brapi.simbolo_base(t) for t in tickers], periodo)
+        faixas = {t: faixas[brapi.simbolo_base(t)] for t in tickers}
+    else:
+        faixas = {t: (periodo, None) for t in tickers}
+
+    # Uma busca concorrente por faixa, cada uma com seus lotes /quote/{T1,...,TN}
+    cotacoes, falhas = {}, {}
+    for faixa in dict.fromkeys(f for f, _ in faixas.values()):
+        c, f = brapi.buscar_cotacoes_concorrente(
+            [tickers_brapi[t] for t, (ft, _) in faixas.items() if ft == faixa],
+            params={"range": faixa, "interval": "1d"},
+            **_opcoes_busca(),
+        )
+        cotacoes.update(c)
+        falhas.update(f)
+
+    por_ticker = {}
+    for t, t_brapi in tickers_brapi.items():
+        if t_brapi in falhas:
+            por_ticker[t] = {"ok": False, "erro": falhas[t_brapi]}
+        else:
+            faixa, ultima = faixas[t]
+            por_ticker[t] = salvar_historico(t, cotacoes.get(t_brapi), periodo, desde=ultima)
+            if sync:
+                por_ticker[t]["faixa"] = faixa
+        if progresso:
+            progresso.registrar({t: por_ticker[t]})
+
+    return resumo_historico(por_ticker, periodo)
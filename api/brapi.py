@@ -0,0 +1,479 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = "https://brapi.dev/api"
+
+MAX_CONCORRENCIA_PADRAO = int(os.getenv("BRAPI_MAX_CONCORRENCIA", "8"))
+TIMEOUT_PADRAO = float(os.getenv("BRAPI_TIMEOUT", "10"))
+TAMANHO_LOTE_PADRAO = int(os.getenv("BRAPI_TAMANHO_LOTE", "10"))
+
+# Cliente HTTP: cache das respostas (s), orçamento global de requisições por
+# minuto e novas tentativas em 429/5xx
+CACHE_TTL_PADRAO = float(os.getenv("BRAPI_CACHE_TTL", "30"))
+REQUISICOES_POR_MINUTO_PADRAO = int(os.getenv("BRAPI_REQUISICOES_POR_MINUTO", "120"))
+MAX_TENTATIVAS_PADRAO = int(os.getenv("BRAPI_MAX_TENTATIVAS", "3"))
+STATUS_REPETIR = {429, 500, 502, 503, 504}
+
+# Valores de `range` da BRAPI, do menor para o maior, com quantos dias corridos
+# cada um cobre no mínimo ("5d" são 5 pregões, ou seja, pelo menos 5 dias).
+FAIXAS = [
+    ("1d", 1),
+    ("5d", 5),
+    ("1mo", 30),
+    ("3mo", 90),
+    ("6mo", 180),
+    ("1y", 365),
+    ("2y", 730),
+    ("5y", 1825),
+    ("10y", 3650),
+    ("max", None),
+]
+
+
+class OrcamentoRequisicoes:
+    """
+    Token bucket global: `por_minuto` requisições por minuto, com rajada de até
+    `por_minuto`. `reservar()` desconta um token e devolve quantos segundos o
+    chamador deve esperar antes de enviar (serve para threads e para asyncio).
+    """
+
+    def __init__(self, por_minuto):
+        self.taxa = por_minuto / 60.0
+        self.capacidade = float(por_minuto)
+        self.tokens = self.capacidade
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reservar(self):
+        with self._lock:
+            agora = time.monotonic()
+            self.tokens = min(self.capacidade, self.tokens + (agora - self._ultimo) * self.taxa)
+            self._ultimo = agora
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.taxa
+
+
+class CacheTTL:
+    """
+    Cache em memória com expiração por item e limite de tamanho (LRU).
+    """
+
+    def __init__(self, max_itens=2000):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+def _espera_retry_after(valor, maximo):
+    """
+    Interpreta o cabeçalho Retry-After (segundos ou data HTTP).
+    """
+    if not valor:
+        return None
+    try:
+        return min(maximo, max(0.0, float(valor)))
+    except ValueError:
+        pass
+    try:
+        return min(maximo, max(0.0, parsedate_to_datetime(valor).timestamp() - time.time()))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Voo:
+    __slots__ = ("evento", "resultado", "erro")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class VooUnico:
+    """
+    Single-flight entre threads: chamadas simultâneas com a mesma chave
+    esperam a primeira (a líder) e recebem o mesmo resultado ou a mesma exceção.
+    """
+
+    def __init__(self):
+        self._voos = {}
+        self._lock = threading.Lock()
+
+    def executar(self, chave, funcao):
+        with self._lock:
+            voo = self._voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._voos[chave] = _Voo()
+
+        if not lider:
+            voo.evento.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            return voo.resultado
+
+        try:
+            voo.resultado = funcao()
+            return voo.resultado
+        except BaseException as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._voos[chave]
+            voo.evento.set()
+
+
+class ClienteBrapi:
+    """
+    Cliente da BRAPI compartilhado pelo processo: sessão keep-alive com pool de
+    conexões, cache TTL por URL + parâmetros, orçamento global de requisições
+    por minuto e novas tentativas com backoff + jitter em 429/5xx e erros de
+    rede, respeitando o Retry-After.
+
+    Requisições iguais em andamento ao mesmo tempo viram uma só (single-flight
+    por thread e por event loop). Com um `coordenador` (ver api/coordenacao.py)
+    a líder também trava a chave entre processos e publica a resposta num cache
+    compartilhado.
+    """
+
+    def __init__(self, base_url=BASE_URL, timeout=None, cache_ttl=None, por_minuto=None,
+                 max_tentativas=None, backoff_base=0.5, backoff_max=30.0, tamanho_pool=None,
+                 coordenador=None):
+        self.base_url = base_url
+        self.timeout = timeout or TIMEOUT_PADRAO
+        self.cache_ttl = CACHE_TTL_PADRAO if cache_ttl is None else cache_ttl
+        self.max_tentativas = max(1, max_tentativas or MAX_TENTATIVAS_PADRAO)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.orcamento = OrcamentoRequisicoes(por_minuto or REQUISICOES_POR_MINUTO_PADRAO)
+        self.cache = CacheTTL()
+        self.coordenador = coordenador
+        self.voos = VooUnico()
+        self._voos_async = {}
+
+        self.session = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=tamanho_pool or MAX_CONCORRENCIA_PADRAO * 2)
+        self.session.mount("https://", adaptador)
+        self.session.mount("http://", adaptador)
+
+    @staticmethod
+    def _chave(caminho, params):
+        return caminho + "?" + "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+
+    def _espera(self, tentativa, retry_after=None):
+        espera = _espera_retry_after(retry_after, self.backoff_max)
+        if espera is None:
+            espera = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** tentativa))
+        return espera
+
+    def get_json(self, caminho, params=None, timeout=None, ttl=None):
+        """
+        GET em `caminho` (ex.: "/quote/PETR4") e retorna o JSON. Respostas de
+        sucesso ficam no cache por `ttl` segundos (padrão BRAPI_CACHE_TTL; 0 desliga).
+        """
+        chave = self._chave(caminho, params)
+        ttl = self.cache_ttl if ttl is None else ttl
+        if ttl > 0:
+            guardado = self.cache.obter(chave)
+            if guardado is not None:
+                return guardado
+        return self.voos.executar(chave, lambda: self._buscar_coordenado(chave, caminho, params, timeout, ttl))
+
+    def _buscar_coordenado(self, chave, caminho, params, timeout, ttl):
+        # Sem cache (ttl=0) não há onde publicar a resposta para outros processos
+        if self.coordenador is None or ttl <= 0:
+            data = self._requisitar(caminho, params, timeout)
+        else:
+            with self.coordenador.travar(chave):
+                data = self.coordenador.obter(chave)
+                if data is None:
+                    data = self._requisitar(caminho, params, timeout)
+                    self.coordenador.guardar(chave, data, ttl)
+        self.cache.guardar(chave, data, ttl)
+        return data
+
+    def _requisitar(self, caminho, params, timeout):
+        for tentativa in range(self.max_tentativas):
+            time.sleep(self.orcamento.reservar())
+            ultima = tentativa == self.max_tentativas - 1
+            try:
+                resp = self.session.get(
+                    f"{self.base_url}{caminho}",
+                    headers=cabecalhos(),
+                    params=params or {},
+                    timeout=timeout or self.timeout,
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if ultima:
+                    raise
+                time.sleep(self._espera(tentativa))
+                continue
+
+            if resp.status_code in STATUS_REPETIR and not ultima:
+                time.sleep(self._espera(tentativa, resp.headers.get("Retry-After")))
+                continue
+            resp.raise_for_status()
+            return resp.json()
+
+    async def get_json_async(self, cliente, caminho, params=None, timeout=None, ttl=None):
+        """
+        Mesmo que get_json, com um httpx.AsyncClient; divide cache e orçamento
+        com as chamadas síncronas do processo. O single-flight vale dentro do
+        event loop (o coordenador entre processos não é usado aqui).
+        """
+        chave = self._chave(caminho, params)
+        ttl = self.cache_ttl if ttl is None else ttl
+        if ttl > 0:
+            guardado = self.cache.obter(chave)
+            if guardado is not None:
+                return guardado
+
+        loop = asyncio.get_running_loop()
+        voo = self._voos_async.get((loop, chave))
+        if voo is None:
+            voo = loop.create_task(self._requisitar_async(cliente, caminho, params, timeout))
+            self._voos_async[(loop, chave)] = voo
+            voo.add_done_callback(lambda _: self._voos_async.pop((loop, chave), None))
+        # shield: um chamador cancelado não cancela a busca dos outros
+        data = await asyncio.shield(voo)
+        self.cache.guardar(chave, data, ttl)
+        return data
+
+    async def _requisitar_async(self, cliente, caminho, params, timeout):
+        for tentativa in range(self.max_tentativas):
+            await asyncio.sleep(self.orcamento.reservar())
+            ultima = tentativa == self.max_tentativas - 1
+            try:
+                resp = await cliente.get(
+                    f"{self.base_url}{caminho}",
+                    headers=cabecalhos(),
+                    params=params or {},
+                    timeout=timeout or self.timeout,
+                )
+            except httpx.TransportError:
+                if ultima:
+                    raise
+                await asyncio.sleep(self._espera(tentativa))
+                continue
+
+            if resp.status_code in STATUS_REPETIR and not ultima:
+                await asyncio.sleep(self._espera(tentativa, resp.headers.get("Retry-After")))
+                continue
+            resp.raise_for_status()
+            return resp.json()
+
+
+_cliente = None
+_lock_cliente = threading.Lock()
+
+
+def get_cliente():
+    """
+    Cliente da BRAPI compartilhado pelo processo (views do Django, serviços).
+    """
+    global _cliente
+    if _cliente is None:
+        with _lock_cliente:
+            if _cliente is None:
+                _cliente = ClienteBrapi()
+    return _cliente
+
+
+def cabecalhos():
+    """
+    Monta o cabeçalho de autenticação da BRAPI a partir do BRAPI_TOKEN (se houver).
+    """
+    token = os.getenv("BRAPI_TOKEN")
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+def safe_get(obj, key, default=0):
+    """
+    Retorna valor seguro de um dicionário, evitando None, KeyError e valores vazios.
+    """
+    if not obj:
+        return default
+    val = obj.get(key)
+    return val if val not in (None, "", "null") else default
+
+
+def simbolo_base(ticker):
+    """
+    Normaliza o ticker para comparar com o `symbol` devolvido pela BRAPI (PETR4.SA -> PETR4).
+    """
+    ticker = (ticker or "").strip().upper()
+    return ticker[:-3] if ticker.endswith(".SA") else ticker
+
+
+def faixa_minima(dias, teto=None):
+    """
+    Menor `range` da BRAPI que cobre os últimos `dias` dias corridos, sem passar
+    de `teto` (o período pedido originalmente).
+    """
+    ordem = [nome for nome, _ in FAIXAS]
+    for nome, cobertura in FAIXAS:
+        if teto in ordem and ordem.index(nome) >= ordem.index(teto):
+            return teto
+        if cobertura is None or cobertura >= dias:
+            return nome
+    return teto or "max"
+
+
+def dividir_em_lotes(itens, tamanho):
+    tamanho = max(1, tamanho)
+    return [itens[i:i + tamanho] for i in range(0, len(itens), tamanho)]
+
+
+def buscar_cotacoes_lote(tickers, params=None, timeout=None):
+    """
+    Busca vários tickers em uma única chamada /quote/{T1,T2,...} e distribui o
+    array `results` de volta por ticker. Retorna dict ticker -> quote (ou None).
+    """
+    data = get_cliente().get_json(f"/quote/{','.join(tickers)}", params, timeout)
+    por_simbolo = {
+        simbolo_base(r.get("symbol")): r
+        for r in (data.get("results") or [])
+    }
+    return {t: por_simbolo.get(simbolo_base(t)) for t in tickers}
+
+
+def buscar_cotacao(ticker, params=None, timeout=None):
+    """
+    Busca /quote/{ticker} e retorna o primeiro item de `results` (ou None).
+    """
+    return buscar_cotacoes_lote([ticker], params, timeout)[ticker]
+
+
+def _buscar_lote_com_fallback(lote, params, timeout):
+    """
+    Busca um lote; se a chamada agrupada falhar (ex.: um ticker inválido derruba
+    o lote inteiro), refaz ticker a ticker para isolar a falha.
+    Retorna (cotacoes, falhas).
+    """
+    try:
+        return buscar_cotacoes_lote(lote, params, timeout), {}
+    except Exception as e:
+        if len(lote) == 1:
+            return {}, {lote[0]: str(e)}
+
+    cotacoes, falhas = {}, {}
+    for ticker in lote:
+        try:
+            cotacoes[ticker] = buscar_cotacao(ticker, params, timeout)
+        except Exception as e:
+            falhas[ticker] = str(e)
+    return cotacoes, falhas
+
+
+def buscar_cotacoes_concorrente(tickers, params=None, max_concorrencia=None, timeout=None, tamanho_lote=None,
+                                ao_concluir_lote=None):
+    """
+    Busca cotações de vários tickers agrupando-os em lotes de `tamanho_lote`
+    (uma requisição /quote/{T1,...,TN} por lote) e disparando os lotes em
+    paralelo, com no máximo `max_concorrencia` requisições em voo e `timeout`
+    (segundos) por requisição.
+
+    Retorna (cotacoes, falhas): `cotacoes` mapeia ticker -> quote (ou None se a
+    BRAPI não trouxe resultado) e `falhas` mapeia ticker -> mensagem de erro.
+    `ao_concluir_lote(cotacoes_lote, falhas_lote)`, se informado, é chamado na
+    thread de quem chamou a cada lote concluído (para relatar progresso).
+    """
+    max_concorrencia = max(1, max_concorrencia or MAX_CONCORRENCIA_PADRAO)
+    lotes = dividir_em_lotes(list(tickers), tamanho_lote or TAMANHO_LOTE_PADRAO)
+    cotacoes, falhas = {}, {}
+
+    if not lotes:
+        return cotacoes, falhas
+
+    with ThreadPoolExecutor(max_workers=min(max_concorrencia, len(lotes))) as executor:
+        futuros = [
+            executor.submit(_buscar_lote_com_fallback, lote, params, timeout)
+            for lote in lotes
+        ]
+        for futuro in as_completed(futuros):
+            cotacoes_lote, falhas_lote = futuro.result()
+            cotacoes.update(cotacoes_lote)
+            falhas.update(falhas_lote)
+            if ao_concluir_lote is not None:
+                ao_concluir_lote(cotacoes_lote, falhas_lote)
+
+    return cotacoes, falhas
+
+
+async def buscar_cotacoes_lote_async(cliente, tickers, params=None, timeout=None):
+    """
+    Versão assíncrona de buscar_cotacoes_lote usando um httpx.AsyncClient.
+    """
+    data = await get_cliente().get_json_async(cliente, f"/quote/{','.join(tickers)}", params, timeout)
+    por_simbolo = {
+        simbolo_base(r.get("symbol")): r
+        for r in (data.get("results") or [])
+    }
+    return {t: por_simbolo.get(simbolo_base(t)) for t in tickers}
+
+
+async def buscar_cotacoes_async(tickers, params=None, max_concorrencia=None, timeout=None, tamanho_lote=None, cliente=None):
+    """
+    Equivalente assíncrono de buscar_cotacoes_concorrente: os lotes são disparados
+    no mesmo event loop, limitados por um semáforo de `max_concorrencia`.
+    Retorna (cotacoes, falhas).
+    """
+    semaforo = asyncio.Semaphore(max(1, max_concorrencia or MAX_CONCORRENCIA_PADRAO))
+    lotes = dividir_em_lotes(list(tickers), tamanho_lote or TAMANHO_LOTE_PADRAO)
+    cotacoes, falhas = {}, {}
+
+    async def buscar_lote(c, lote):
+        async with semaforo:
+            try:
+                cotacoes.update(await buscar_cotacoes_lote_async(c, lote, params, timeout))
+                return
+            except Exception as e:
+                if len(lote) == 1:
+                    falhas[lote[0]] = str(e)
+                    return
+        # Lote agrupado falhou: refaz ticker a ticker para isolar a falha
+        await asyncio.gather(*(buscar_lote(c, [t]) for t in lote))
+
+    if cliente is not None:
+        await asyncio.gather(*(buscar_lote(cliente, lote) for lote in lotes))
+    else:
+        async with httpx.AsyncClient() as c:
+            await asyncio.gather(*(buscar_lote(c, lote) for lote in lotes))
+
+    return cotacoes, falhas
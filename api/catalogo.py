@@ -0,0 +1,217 @@
+"""
+Catálogo local de tickers da BRAPI.
+
+O /quote/list é copiado para o CatalogoTicker e carregado num índice em
+memória: dicionários para ticker e nome exatos e uma trie de prefixos sobre o
+ticker e cada palavra do nome, tudo sem acento e sem maiúsculas. As buscas não
+fazem chamada externa; quando o catálogo passa de CATALOGO_TTL_SEGUNDOS ele é
+baixado de novo numa thread em segundo plano e o índice é trocado de uma vez.
+"""
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api import brapi
+from tela_cadastro.models import CatalogoTicker
+
+TTL_PADRAO = 24 * 3600
+# Depois de uma atualização com falha, espera isso antes de tentar de novo
+ESPERA_APOS_FALHA = 300
+TAMANHO_PAGINA = 1000
+
+
+def normalizar(texto):
+    """
+    Remove acentos e aplica casefold ("Petróleo" -> "petroleo").
+    """
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold().strip()
+
+
+class IndiceCatalogo:
+    """
+    Índice imutável: para atualizar, monte outro e troque a referência.
+    """
+
+    def __init__(self, itens):
+        # itens: lista de dicts com ticker, nome, tipo e setor
+        self.itens = list(itens)
+        self.por_ticker = {}
+        self.por_nome = {}
+        self.trie = {}
+        self.tickers = [normalizar(item["ticker"]) for item in self.itens]
+        self.carregado_em = time.time()
+
+        for i, item in enumerate(self.itens):
+            ticker = self.tickers[i]
+            nome = normalizar(item["nome"])
+            self.por_ticker.setdefault(ticker, i)
+            self.por_nome.setdefault(nome, i)
+            for chave in {ticker, *nome.split()}:
+                self._inserir(chave, i)
+
+    def _inserir(self, chave, i):
+        no = self.trie
+        for c in chave:
+            no = no.setdefault(c, {})
+            no.setdefault(None, []).append(i)
+
+    def _prefixo(self, prefixo):
+        no = self.trie
+        for c in prefixo:
+            no = no.get(c)
+            if no is None:
+                return []
+        return no.get(None, [])
+
+    def candidatos(self, termo):
+        """
+        Índices dos itens cujo ticker ou alguma palavra do nome começa com cada
+        palavra do termo, em ordem de relevância.
+        """
+        palavras = normalizar(termo).split()
+        if not palavras:
+            return []
+        conjunto = None
+        for palavra in palavras:
+            achados = set(self._prefixo(palavra))
+            conjunto = achados if conjunto is None else conjunto & achados
+            if not conjunto:
+                return []
+
+        primeira = palavras[0]
+        return sorted(
+            conjunto,
+            key=lambda i: (not self.tickers[i].startswith(primeira), len(self.tickers[i]), self.tickers[i]),
+        )
+
+    def buscar(self, termo):
+        """
+        Melhor correspondência: ticker exato, nome exato ou prefixo.
+        """
+        chave = normalizar(termo)
+        for mapa in (self.por_ticker, self.por_nome):
+            if chave in mapa:
+                return self.itens[mapa[chave]]
+        candidatos = self.candidatos(termo)
+        return self.itens[candidatos[0]] if candidatos else None
+
+    def sugerir(self, termo, limite=10):
+        chave = normalizar(termo)
+        ordem = [self.por_ticker[chave]] if chave in self.por_ticker else []
+        ordem += [i for i in self.candidatos(termo) if i not in ordem]
+        return [self.itens[i] for i in ordem[:limite]]
+
+
+def baixar_lista(timeout=None):
+    """
+    Baixa todas as páginas do /quote/list da BRAPI.
+    """
+    itens, pagina = [], 1
+    while True:
+        # Sem cache de resposta: o próprio catálogo já é a cópia local
+        data = brapi.get_cliente().get_json(
+            "/quote/list",
+            {"limit": TAMANHO_PAGINA, "page": pagina},
+            timeout=timeout,
+            ttl=0,
+        )
+        for s in data.get("stocks", []):
+            if s.get("stock"):
+                itens.append({
+                    "ticker": s["stock"],
+                    "nome": s.get("name") or s["stock"],
+                    "tipo": s.get("type") or "",
+                    "setor": s.get("sector"),
+                })
+        if not data.get("hasNextPage"):
+            return itens
+        pagina += 1
+
+
+class Catalogo:
+
+    def __init__(self):
+        self._indice = None
+        self._lock = threading.Lock()
+        self._atualizando = False
+        self._proxima_tentativa = 0
+
+    @staticmethod
+    def _ttl():
+        return getattr(settings, "CATALOGO_TTL_SEGUNDOS", TTL_PADRAO)
+
+    def _carregar_do_banco(self):
+        itens = list(CatalogoTicker.objects.values("ticker", "nome", "tipo", "setor", "atualizado_em"))
+        indice = IndiceCatalogo(itens)
+        if itens:
+            # Idade do índice = idade da cópia no banco, não do processo
+            indice.carregado_em = min(i["atualizado_em"] for i in itens).timestamp()
+        return indice
+
+    def atualizar(self):
+        """
+        Baixa a lista da BRAPI, grava no CatalogoTicker e troca o índice.
+        Tickers que saíram da lista são apagados na mesma transação (senão o
+        atualizado_em antigo deles deixaria o catálogo sempre vencido).
+        """
+        itens = baixar_lista()
+        agora = timezone.now()
+        with transaction.atomic():
+            CatalogoTicker.objects.bulk_create(
+                [CatalogoTicker(atualizado_em=agora, **item) for item in itens],
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=["ticker"],
+                update_fields=["nome", "tipo", "setor", "atualizado_em"],
+            )
+            if itens:
+                CatalogoTicker.objects.filter(atualizado_em__lt=agora).delete()
+        self._indice = IndiceCatalogo(itens)
+        print(f"✓ Catálogo de tickers atualizado ({len(itens)} itens)")
+        return len(itens)
+
+    def _atualizar_em_segundo_plano(self):
+        try:
+            self.atualizar()
+        except Exception as e:
+            print(f"⚠️ Falha ao atualizar catálogo de tickers: {e}")
+            self._proxima_tentativa = time.time() + ESPERA_APOS_FALHA
+        finally:
+            self._atualizando = False
+
+    def indice(self):
+        """
+        Índice atual. Carrega do banco na primeira chamada (baixando da BRAPI se
+        estiver vazio); depois, se estiver velho, dispara uma atualização em
+        segundo plano e segue respondendo com o índice antigo.
+        """
+        if self._indice is None:
+            with self._lock:
+                if self._indice is None:
+                    indice = self._carregar_do_banco()
+                    if not indice.itens:
+                        self.atualizar()
+                    else:
+                        self._indice = indice
+
+        agora = time.time()
+        if agora - self._indice.carregado_em > self._ttl() and agora >= self._proxima_tentativa and not self._atualizando:
+            with self._lock:
+                if not self._atualizando:
+                    self._atualizando = True
+                    threading.Thread(target=self._atualizar_em_segundo_plano, daemon=True).start()
+        return self._indice
+
+    def buscar(self, termo):
+        return self.indice().buscar(termo)
+
+    def sugerir(self, termo, limite=10):
+        return self.indice().sugerir(termo, limite)
+
+
+catalogo = Catalogo()
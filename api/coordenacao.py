@@ -0,0 +1,98 @@
+"""
+Coalescência de requisições à BRAPI entre processos.
+
+Dentro de um processo o ClienteBrapi já junta requisições iguais simultâneas.
+Com vários workers (gunicorn, serviços do Monitoramento usando o Django), o
+CoordenadorPostgres faz a líder de cada processo pegar um advisory lock de
+sessão do Postgres para a chave (fora de transação: nenhuma transação fica
+aberta durante a chamada HTTP): a primeira busca e grava a resposta no cache
+do Django, as outras esperam o lock e leem dali. Para isso o cache precisa ser
+compartilhado (Redis/Memcached); com o LocMemCache cada processo ainda busca,
+mas um de cada vez.
+"""
+import hashlib
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connection
+
+from api import brapi
+
+PREFIXO = "brapi:resposta:"
+
+
+class CoordenadorPostgres:
+
+    def __init__(self, alias_cache="default", espera_maxima=30):
+        self.alias_cache = alias_cache
+        self.espera_maxima = espera_maxima
+
+    @staticmethod
+    def _chave_cache(chave):
+        # Chaves do Memcached não aceitam espaços nem passam de 250 caracteres
+        return PREFIXO + hashlib.md5(chave.encode()).hexdigest()
+
+    def _tentar_travar(self, chave):
+        """
+        pg_try_advisory_lock em intervalos crescentes até `espera_maxima`
+        segundos. Retorna se o lock foi obtido.
+        """
+        limite = time.monotonic() + self.espera_maxima
+        intervalo = 0.05
+        with connection.cursor() as cur:
+            while True:
+                cur.execute("SELECT pg_try_advisory_lock(hashtextextended(%s, 0))", [chave])
+                if cur.fetchone()[0]:
+                    return True
+                if time.monotonic() >= limite:
+                    return False
+                time.sleep(intervalo)
+                intervalo = min(intervalo * 2, 0.5)
+
+    @contextmanager
+    def travar(self, chave):
+        """
+        Segura o advisory lock de sessão da chave até o fim do bloco, sem abrir
+        transação. Se o lock não sair em `espera_maxima` segundos, segue sem ele
+        (só perde a coalescência).
+        """
+        travado = False
+        try:
+            travado = self._tentar_travar(chave)
+            if not travado:
+                print(f"⚠️ Sem lock entre processos para {chave}: espera de {self.espera_maxima}s esgotada")
+        except DatabaseError as e:
+            print(f"⚠️ Sem lock entre processos para {chave}: {e}")
+        try:
+            yield
+        finally:
+            if travado:
+                try:
+                    with connection.cursor() as cur:
+                        cur.execute("SELECT pg_advisory_unlock(hashtextextended(%s, 0))", [chave])
+                except DatabaseError as e:
+                    # Se a conexão caiu, o Postgres já soltou o lock junto com a sessão
+                    print(f"⚠️ Falha ao soltar lock de {chave}: {e}")
+
+    def obter(self, chave):
+        return caches[self.alias_cache].get(self._chave_cache(chave))
+
+    def guardar(self, chave, valor, ttl):
+        caches[self.alias_cache].set(self._chave_cache(chave), valor, timeout=ttl)
+
+
+def instalar_coordenador():
+    """
+    Liga o CoordenadorPostgres no cliente compartilhado quando
+    BRAPI_COALESCER_ENTRE_PROCESSOS está ativo e o banco é Postgres.
+    """
+    if not getattr(settings, "BRAPI_COALESCER_ENTRE_PROCESSOS", False):
+        return
+    if connection.vendor != "postgresql":
+        print("⚠️ BRAPI_COALESCER_ENTRE_PROCESSOS exige Postgres; usando só a coalescência por processo")
+        return
+    brapi.get_cliente().coordenador = CoordenadorPostgres(
+        alias_cache=getattr(settings, "COTACOES_CACHE_ALIAS", "default"),
+    )
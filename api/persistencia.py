@@ -0,0 +1,105 @@
+from datetime import datetime
+
+from django.db import transaction
+
+from api.brapi import safe_get
+from tela_cadastro.cache_cotacoes import invalidar_cotacoes
+from tela_cadastro.models import Acao, AcaoHistorico
+
+TAMANHO_LOTE_BANCO = 500
+
+CAMPOS_HISTORICO = ("abertura", "fechamento", "alta", "baixa", "volume")
+
+
+def salvar_acoes_em_lote(linhas, tamanho_lote=TAMANHO_LOTE_BANCO):
+    """
+    Grava várias ações de uma vez com um upsert set-based
+    (INSERT ... ON CONFLICT (abreviacao) DO UPDATE) dentro de uma única transação.
+
+    `linhas` é uma lista de dicts com `abreviacao` e os demais campos do Acao;
+    se o mesmo ticker aparecer mais de uma vez, vale a última linha. Linhas
+    com conjuntos de campos diferentes vão em upserts separados, cada um
+    atualizando só os seus campos (um campo ausente não volta ao default).
+    Retorna (criadas, atualizadas) com os tickers de cada grupo.
+    """
+    por_ticker = {linha["abreviacao"]: linha for linha in linhas}
+    if not por_ticker:
+        return [], []
+
+    por_campos = {}
+    for linha in por_ticker.values():
+        por_campos.setdefault(frozenset(linha), []).append(linha)
+
+    with transaction.atomic():
+        existentes = set(
+            Acao.objects.filter(abreviacao__in=list(por_ticker))
+            .values_list("abreviacao", flat=True)
+        )
+        for campos, grupo in por_campos.items():
+            Acao.objects.bulk_create(
+                [Acao(**linha) for linha in grupo],
+                batch_size=tamanho_lote,
+                update_conflicts=True,
+                unique_fields=["abreviacao"],
+                update_fields=sorted((campos - {"abreviacao"}) | {"atualizado_em"}),
+            )
+        # bulk_create não dispara post_save: invalida o cache das cotações aqui
+        transaction.on_commit(invalidar_cotacoes)
+
+    criadas = [t for t in por_ticker if t not in existentes]
+    atualizadas = [t for t in por_ticker if t in existentes]
+    return criadas, atualizadas
+
+
+def salvar_historico_em_lote(acao, precos, tamanho_lote=TAMANHO_LOTE_BANCO, ignorar_inalterados=False):
+    """
+    Grava a série `historicalDataPrice` da BRAPI no AcaoHistorico com um upsert
+    por lote de `tamanho_lote` pontos, chaveado em (acao, data), tudo dentro de
+    uma única transação. Qualquer período buscado na BRAPI cai no mesmo candle diário.
+
+    Com `ignorar_inalterados`, dias já gravados com os mesmos valores não são
+    reescritos nem contados.
+
+    Retorna (inseridos, atualizados).
+    """
+    por_data = {}
+    for p in precos:
+        data_p = datetime.fromtimestamp(p["date"]).date()
+        por_data[data_p] = AcaoHistorico(
+            acao=acao,
+            data=data_p,
+            abertura=safe_get(p, "open", 0),
+            fechamento=safe_get(p, "close", 0),
+            alta=safe_get(p, "high", 0),
+            baixa=safe_get(p, "low", 0),
+            volume=safe_get(p, "volume", 0),
+        )
+    if not por_data:
+        return 0, 0
+
+    with transaction.atomic():
+        existentes = AcaoHistorico.objects.filter(
+            acao=acao,
+            data__gte=min(por_data),
+            data__lte=max(por_data),
+        ).values_list("data", *CAMPOS_HISTORICO)
+        atualizados = 0
+        for d, *valores in existentes:
+            novo = por_data.get(d)
+            if novo is None:
+                continue
+            if ignorar_inalterados and valores == [getattr(novo, c) for c in CAMPOS_HISTORICO]:
+                del por_data[d]
+            else:
+                atualizados += 1
+
+        if por_data:
+            AcaoHistorico.objects.bulk_create(
+                list(por_data.values()),
+                batch_size=tamanho_lote,
+                update_conflicts=True,
+                unique_fields=["acao", "data"],
+                update_fields=list(CAMPOS_HISTORICO),
+            )
+
+    return len(por_data) - atualizados, atualizados
@@ -0,0 +1,229 @@
+"""
+Tarefas assíncronas de atualização da BRAPI.
+
+Os endpoints criam uma Tarefa e devolvem o id na hora; o trabalho
+(api/atualizacoes.py) roda fora do worker web:
+
+- "local" (padrão): pool de threads do próprio processo (TAREFAS_THREADS_LOCAIS).
+- "rabbitmq": publica `tarefa.<tipo>` no stock_topic, consumido por
+  `python manage.py executar_tarefas` (fila_tarefas). Só ative com esse
+  consumidor rodando. Se a publicação falhar, cai para o executor local.
+- "imediato": executa na thread de quem criou, depois do commit (testes/dev).
+
+O progresso por ticker fica na própria Tarefa e é lido pelo endpoint de status.
+Uma tarefa em execução há mais de TAREFAS_TIMEOUT_SEGUNDOS é considerada
+interrompida (executor caiu): pode ser retomada por outro executor e aparece
+como falha no status. Uma pendente há mais que esse tempo (a mensagem ou a
+thread que a executaria se perdeu) também aparece como falha.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from api import atualizacoes
+from tela_cadastro.models import Tarefa
+
+EXCHANGE = "stock_topic"
+FILA = "fila_tarefas"
+
+EXECUTORES = {
+    Tarefa.TipoChoices.ATUALIZAR_ACOES: atualizacoes.executar_atualizar_acoes,
+    Tarefa.TipoChoices.HISTORICO: atualizacoes.executar_historico,
+}
+
+_executor_local = None
+_lock_executor = threading.Lock()
+
+
+class Progresso:
+    """
+    Grava o andamento na Tarefa com UPDATEs diretos (sem carregar o objeto).
+    """
+
+    def __init__(self, tarefa_id):
+        self.tarefa_id = tarefa_id
+        self.por_ticker = {}
+
+    def definir_total(self, total):
+        Tarefa.objects.filter(id=self.tarefa_id).update(total=total)
+
+    def registrar(self, resultados):
+        self.por_ticker.update(resultados)
+        Tarefa.objects.filter(id=self.tarefa_id).update(
+            por_ticker=self.por_ticker,
+            processados=len(self.por_ticker),
+        )
+
+
+def _modo():
+    return getattr(settings, "TAREFAS_MODO", "local")
+
+
+def _limite_execucao():
+    """
+    Tarefas EXECUTANDO iniciadas antes disso estão travadas.
+    """
+    return timezone.now() - timedelta(seconds=getattr(settings, "TAREFAS_TIMEOUT_SEGUNDOS", 1800))
+
+
+def _get_executor_local():
+    global _executor_local
+    if _executor_local is None:
+        with _lock_executor:
+            if _executor_local is None:
+                _executor_local = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "TAREFAS_THREADS_LOCAIS", 2),
+                    thread_name_prefix="tarefa",
+                )
+    return _executor_local
+
+
+def executar(tarefa_id, retomar=False):
+    """
+    Executa a tarefa `tarefa_id` e grava o resultado. Retorna False se ela não
+    foi assumida (já terminou ou está com outro executor).
+
+    Assume tarefas pendentes e as EXECUTANDO travadas; com `retomar=True`
+    (mensagem reentregue pelo broker: o consumidor anterior caiu sem ack),
+    assume também qualquer uma EXECUTANDO.
+    """
+    em_execucao = Q(status=Tarefa.StatusChoices.EXECUTANDO)
+    if not retomar:
+        em_execucao &= Q(iniciada_em__lt=_limite_execucao())
+    iniciou = Tarefa.objects.filter(
+        Q(status=Tarefa.StatusChoices.PENDENTE) | em_execucao, id=tarefa_id,
+    ).update(status=Tarefa.StatusChoices.EXECUTANDO, iniciada_em=timezone.now())
+    if not iniciou:
+        return False
+
+    tarefa = Tarefa.objects.get(id=tarefa_id)
+    try:
+        resultado = EXECUTORES[tarefa.tipo](progresso=Progresso(tarefa_id), **tarefa.parametros)
+    except Exception as e:
+        print(f"❌ Tarefa {tarefa_id} ({tarefa.tipo}) falhou: {e}")
+        Tarefa.objects.filter(id=tarefa_id).update(
+            status=Tarefa.StatusChoices.FALHOU,
+            resultado={"ok": False, "erro": str(e)},
+            erro=str(e),
+            concluida_em=timezone.now(),
+        )
+        return True
+
+    Tarefa.objects.filter(id=tarefa_id).update(
+        status=Tarefa.StatusChoices.CONCLUIDA,
+        resultado=resultado,
+        erro=None,
+        concluida_em=timezone.now(),
+    )
+    return True
+
+
+def marcar_travada(tarefa):
+    """
+    Se `tarefa` está EXECUTANDO (desde iniciada_em) ou PENDENTE (desde criada_em)
+    além do limite, grava como falha (e atualiza o objeto). Um executor que ainda
+    esteja vivo sobrescreve isso ao terminar; uma pendente marcada não é mais assumida.
+    """
+    if tarefa.status == Tarefa.StatusChoices.EXECUTANDO:
+        campo, erro = "iniciada_em", "Tarefa interrompida: o executor parou sem concluí-la."
+    elif tarefa.status == Tarefa.StatusChoices.PENDENTE:
+        campo, erro = "criada_em", "Tarefa não iniciada: nenhum executor a assumiu a tempo."
+    else:
+        return
+    desde = getattr(tarefa, campo)
+    if desde >= _limite_execucao():
+        return
+    agora = timezone.now()
+    marcadas = Tarefa.objects.filter(id=tarefa.id, status=tarefa.status, **{campo: desde}).update(
+        status=Tarefa.StatusChoices.FALHOU, erro=erro, resultado={"ok": False, "erro": erro}, concluida_em=agora,
+    )
+    if marcadas:
+        tarefa.status, tarefa.erro, tarefa.concluida_em = Tarefa.StatusChoices.FALHOU, erro, agora
+        tarefa.resultado = {"ok": False, "erro": erro}
+
+
+def _executar_em_thread(tarefa_id):
+    try:
+        executar(tarefa_id)
+    finally:
+        # Threads do pool não passam pelo ciclo de requisição do Django
+        connection.close()
+
+
+def _executar_localmente(tarefa_id):
+    _get_executor_local().submit(_executar_em_thread, tarefa_id)
+
+
+def publicar_tarefa(tarefa):
+    """
+    Publica `tarefa.<tipo>` no stock_topic pelo pool de conexões do processo.
+    """
+    import pika
+    from Monitoramento.config.rabbitmq_pool import get_pool
+
+    get_pool().publicar(
+        EXCHANGE,
+        f"tarefa.{tarefa.tipo}",
+        json.dumps({"id": str(tarefa.id), "tipo": tarefa.tipo}),
+        pika.BasicProperties(delivery_mode=2, content_type="application/json"),
+    )
+
+
+def _despachar(tarefa):
+    modo = _modo()
+    if modo == "imediato":
+        executar(tarefa.id)
+        return
+    if modo == "rabbitmq":
+        try:
+            publicar_tarefa(tarefa)
+            return
+        except Exception as e:
+            print(f"⚠️ Falha ao publicar tarefa {tarefa.id}, executando localmente: {e}")
+    _executar_localmente(tarefa.id)
+
+
+def enfileirar(tipo, **parametros):
+    """
+    Cria a Tarefa e agenda a execução para depois do commit. Retorna a Tarefa.
+    """
+    tarefa = Tarefa.objects.create(tipo=tipo, parametros=parametros)
+    transaction.on_commit(lambda: _despachar(tarefa))
+    return tarefa
+
+
+def processar_mensagem(corpo, reentregue=False):
+    """
+    Executa a tarefa de uma mensagem da fila_tarefas (usado pelo executar_tarefas).
+    """
+    close_old_connections()
+    try:
+        return executar(json.loads(corpo)["id"], retomar=reentregue)
+    finally:
+        close_old_connections()
+
+
+def status(tarefa):
+    """
+    Corpo do endpoint de status.
+    """
+    return {
+        "ok": True,
+        "id": str(tarefa.id),
+        "tipo": tarefa.tipo,
+        "status": tarefa.status,
+        "total": tarefa.total,
+        "processados": tarefa.processados,
+        "progresso": round(100 * tarefa.processados / tarefa.total) if tarefa.total else 0,
+        "por_ticker": tarefa.por_ticker,
+        "resultado": tarefa.resultado,
+        "erro": tarefa.erro,
+        "criada_em": tarefa.criada_em.isoformat(),
+        "concluida_em": tarefa.concluida_em.isoformat() if tarefa.concluida_em else None,
+    }
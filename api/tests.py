@@ -1,3 +1,399 @@
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta
+from unittest import mock
+
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from api import brapi, tarefas
+from api.catalogo import catalogo
+from api.coordenacao import CoordenadorPostgres
+from api.persistencia import salvar_acoes_em_lote
+from tela_cadastro.models import Acao, AcaoHistorico, CatalogoTicker, Tarefa
+
+
+class RespostaFalsa:
+    def __init__(self, data, status_code=200, headers=None):
+        self._data = data
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = str(data)
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise brapi.requests.HTTPError(f"{self.status_code}", response=self)
+
+
+def brapi_falsa(url, headers=None, params=None, timeout=None):
+    if url.endswith("/quote/list"):
+        return RespostaFalsa({"stocks": [
+            {"stock": "PETR4", "name": "Petrobras", "close": 30.0},
+            {"stock": "VALE3", "name": "Vale", "close": 60.0},
+            {"stock": "ERRO3", "name": "Erro"},
+        ]})
+    tickers = url.rsplit("/", 1)[-1].split(",")
+    if "ERRO3" in tickers:
+        raise TimeoutError("timeout")
+    return RespostaFalsa({"results": [
+        {
+            "symbol": t.replace(".SA", ""),
+            "regularMarketDayHigh": 99.0,
+            "historicalDataPrice": [
+                {"date": 1700000000, "open": 10.0, "close": 11.0, "high": 12.0, "low": 9.0, "volume": 100},
+                {"date": 1700086400, "open": 11.0, "close": 12.0, "high": 13.0, "low": 10.0, "volume": 200},
+            ],
+        }
+        for t in tickers
+    ]})
+
+
+class BrapiTestCase(TestCase):
+    def setUp(self):
+        # O cliente guarda respostas entre requisições; cada teste começa do zero
+        brapi.get_cliente().cache.limpar()
+
+    def executar_tarefa(self, url, params=None):
+        """
+        Cria a tarefa pelo endpoint, executa na mesma thread e devolve o status final.
+        """
+        with self.settings(TAREFAS_MODO="imediato"), self.captureOnCommitCallbacks(execute=True):
+            criada = self.client.get(url, params or {})
+        self.assertEqual(criada.status_code, 202)
+        return self.client.get(criada.json()["status_url"]).json()
+
+
+class AtualizarAcoesCompletasTests(BrapiTestCase):
+    def test_relatorio_de_criadas_atualizadas_e_falhas(self):
+        Acao.objects.create(abreviacao="VALE3", nome="Vale")
+
+        with mock.patch("requests.Session.get", side_effect=brapi_falsa):
+            status = self.executar_tarefa(reverse("testar_essencial"))
+
+        data = status["resultado"]
+        self.assertEqual(status["status"], "concluida")
+        self.assertEqual((status["processados"], status["total"]), (3, 3))
+        self.assertEqual(status["por_ticker"]["PETR4"], {"ok": True, "acao": "criada"})
+        self.assertFalse(status["por_ticker"]["ERRO3"]["ok"])
+        self.assertTrue(data["ok"])
+        self.assertEqual(data["criadas"], ["PETR4"])
+        self.assertEqual(data["atualizadas"], ["VALE3"])
+        self.assertEqual(list(data["falhas"][0]), ["ERRO3"])
+        self.assertEqual(data["qtde_processadas"], 3)
+        self.assertEqual(Acao.objects.get(abreviacao="PETR4").alta_dia, 99.0)
+        self.assertEqual(Acao.objects.get(abreviacao="VALE3").valor_atual, 60.0)
+
+    def test_agrupa_tickers_em_lotes(self):
+        with mock.patch("requests.Session.get", side_effect=brapi_falsa) as get, \
+                self.settings(BRAPI_TAMANHO_LOTE=2):
+            self.executar_tarefa(reverse("testar_essencial"))
+
+        urls = [c.args[0] for c in get.call_args_list]
+        # lista + lote [PETR4, VALE3] + lote [ERRO3]
+        self.assertEqual(len(urls), 3)
+        self.assertTrue(any(u.endswith("/quote/PETR4,VALE3") for u in urls))
+
+
+class SalvarAcoesEmLoteTests(TestCase):
+    def setUp(self):
+        Acao.objects.create(abreviacao="PETR4", nome="Petrobras", valor_atual=30.0, setor="Energia")
+
+    def test_separa_criadas_e_atualizadas_e_ultima_linha_vence(self):
+        criadas, atualizadas = salvar_acoes_em_lote([
+            {"abreviacao": "VALE3", "nome": "Vale", "valor_atual": 60.0},
+            {"abreviacao": "PETR4", "nome": "Petrobras", "valor_atual": 31.0},
+            {"abreviacao": "VALE3", "nome": "Vale", "valor_atual": 61.0},
+        ])
+
+        self.assertEqual((criadas, atualizadas), (["VALE3"], ["PETR4"]))
+        self.assertEqual(Acao.objects.get(abreviacao="VALE3").valor_atual, 61.0)
+        self.assertEqual(Acao.objects.get(abreviacao="PETR4").valor_atual, 31.0)
+        self.assertEqual(Acao.objects.count(), 2)
+
+    def test_atualiza_so_os_campos_de_cada_linha(self):
+        with mock.patch.object(Acao.objects, "bulk_create", wraps=Acao.objects.bulk_create) as bulk_create:
+            salvar_acoes_em_lote([
+                {"abreviacao": "PETR4", "nome": "Petrobras", "valor_atual": 32.0},
+                {"abreviacao": "VALE3", "nome": "Vale", "valor_atual": 60.0, "setor": "Mineração"},
+                {"abreviacao": "ITUB4", "nome": "Itaú", "valor_atual": 30.0},
+            ])
+
+        campos = sorted(tuple(c.kwargs["update_fields"]) for c in bulk_create.call_args_list)
+        self.assertEqual(campos, [
+            ("atualizado_em", "nome", "setor", "valor_atual"),
+            ("atualizado_em", "nome", "valor_atual"),
+        ])
+        petr4 = Acao.objects.get(abreviacao="PETR4")
+        self.assertEqual((petr4.valor_atual, petr4.setor), (32.0, "Energia"))
+        self.assertEqual(Acao.objects.get(abreviacao="VALE3").setor, "Mineração")
+
+    def test_lote_vazio(self):
+        self.assertEqual(salvar_acoes_em_lote([]), ([], []))
+
+
+class HistoricoAcaoTests(BrapiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.petr4 = Acao.objects.create(abreviacao="PETR4", nome="Petrobras")
+        self.vale3 = Acao.objects.create(abreviacao="VALE3", nome="Vale")
+
+    def test_um_ticker(self):
+        with mock.patch("requests.Session.get", side_effect=brapi_falsa):
+            data = self.executar_tarefa(reverse("ajax_historico_acao", args=["PETR4"]), {"periodo": "1mo"})["resultado"]
+
+        self.assertTrue(data["ok"])
+        self.assertIn("2 registros inseridos", data["msg"])
+        self.assertEqual(AcaoHistorico.objects.filter(acao=self.petr4).count(), 2)
+
+    def test_varios_tickers_em_uma_requisicao(self):
+        with mock.patch("requests.Session.get", side_effect=brapi_falsa) as get:
+            status = self.executar_tarefa(reverse("ajax_historico_acao", args=["PETR4,VALE3"]))
+
+        data = status["resultado"]
+        self.assertEqual(status["por_ticker"]["PETR4"]["inseridos"], 2)
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(data["por_ticker"]["VALE3"], {"ok": True, "inseridos": 2, "atualizados": 0})
+        self.assertEqual(AcaoHistorico.objects.filter(acao=self.vale3).count(), 2)
+
+    def test_reingestao_atualiza_sem_duplicar(self):
+        url = reverse("ajax_historico_acao", args=["PETR4"])
+        with mock.patch("requests.Session.get", side_effect=brapi_falsa):
+            self.executar_tarefa(url, {"periodo": "1mo"})
+            data = self.executar_tarefa(url, {"periodo": "1mo"})["resultado"]
+
+        self.assertEqual((data["inseridos"], data["atualizados"]), (0, 2))
+        self.assertEqual(AcaoHistorico.objects.filter(acao=self.petr4).count(), 2)
+
+    def test_sync_busca_so_os_dias_que_faltam(self):
+        ontem = date.today() - timedelta(days=1)
+        for d in (date.today() - timedelta(days=364), ontem):
+            AcaoHistorico.objects.create(
+                acao=self.petr4, data=d, abertura=10, fechamento=11, alta=12, baixa=9, volume=100,
+            )
+
+        def ponto(d, fechamento):
+            return {"date": int(time.mktime(datetime.combine(d, datetime.min.time()).timetuple())) + 43200,
+                    "open": 10.0, "close": fechamento, "high": 12.0, "low": 9.0, "volume": 100}
+
+        def brapi_recente(url, headers=None, params=None, timeout=None):
+            return RespostaFalsa({"results": [{"symbol": "PETR4", "historicalDataPrice": [
+                ponto(ontem - timedelta(days=1), 10.5), ponto(ontem, 11.0), ponto(date.today(), 11.5),
+            ]}]})
+
+        with mock.patch("requests.Session.get", side_effect=brapi_recente) as get:
+            data = self.executar_tarefa(reverse("ajax_historico_acao", args=["PETR4"]), {"periodo": "1y", "sync": "1"})["resultado"]
+
+        self.assertEqual(get.call_args.kwargs["params"]["range"], "5d")
+        self.assertEqual((data["inseridos"], data["atualizados"], data["faixa"]), (1, 0, "5d"))
+        self.assertEqual(AcaoHistorico.objects.filter(acao=self.petr4).count(), 3)
+
+    def test_sync_completa_o_comeco_do_periodo(self):
+        # Só há 1mo gravado: pedir 1y precisa buscar o ano inteiro, não só a cauda
+        for dias in range(1, 31):
+            AcaoHistorico.objects.create(
+                acao=self.petr4, data=date.today() - timedelta(days=dias),
+                abertura=10, fechamento=11, alta=12, baixa=9, volume=100,
+            )
+
+        with mock.patch("requests.Session.get", side_effect=brapi_falsa) as get:
+            data = self.executar_tarefa(reverse("ajax_historico_acao", args=["PETR4"]), {"periodo": "1y", "sync": "1"})["resultado"]
+
+        self.assertEqual(get.call_args.kwargs["params"]["range"], "1y")
+        self.assertEqual((data["faixa"], data["inseridos"]), ("1y", 2))
+
+
+class ViewsAsyncTests(BrapiTestCase):
+    async def test_historico_async_grava_varios_tickers(self):
+        petr4 = await Acao.objects.acreate(abreviacao="PETR4", nome="Petrobras")
+        await Acao.objects.acreate(abreviacao="VALE3", nome="Vale")
+
+        async def get_async(url, headers=None, params=None, timeout=None):
+            return brapi_falsa(url, headers, params, timeout)
+
+        with mock.patch("httpx.AsyncClient.get", side_effect=get_async) as get:
+            resp = await self.async_client.get(reverse("ajax_historico_acao_async", args=["PETR4,VALE3"]))
+
+        data = resp.json()
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(data["por_ticker"]["PETR4"], {"ok": True, "inseridos": 2, "atualizados": 0})
+        self.assertEqual(await AcaoHistorico.objects.filter(acao=petr4).acount(), 2)
+
+
+class TarefasTests(BrapiTestCase):
+    def test_responde_na_hora_e_cai_para_execucao_local(self):
+        with self.settings(TAREFAS_MODO="rabbitmq"), \
+                mock.patch("api.tarefas.publicar_tarefa", side_effect=ConnectionError("sem broker")), \
+                mock.patch("api.tarefas._executar_localmente") as local, \
+                self.captureOnCommitCallbacks(execute=True):
+            criada = self.client.get(reverse("ajax_historico_acao", args=["PETR4"]))
+
+        tarefa_id = criada.json()["tarefa_id"]
+        local.assert_called_once()
+        self.assertEqual(str(local.call_args.args[0]), tarefa_id)
+        status = self.client.get(criada.json()["status_url"]).json()
+        self.assertEqual((status["status"], status["progresso"]), ("pendente", 0))
+        self.assertEqual(Tarefa.objects.get(id=tarefa_id).parametros, {"tickers": ["PETR4"], "periodo": "1mo", "sync": False})
+
+    def _tarefa_executando(self, ha_segundos):
+        return Tarefa.objects.create(
+            tipo=Tarefa.TipoChoices.ATUALIZAR_ACOES,
+            status=Tarefa.StatusChoices.EXECUTANDO,
+            iniciada_em=timezone.now() - timedelta(seconds=ha_segundos),
+        )
+
+    def test_retoma_tarefa_travada_ou_reentregue(self):
+        recente, travada = self._tarefa_executando(10), self._tarefa_executando(7200)
+        with self.settings(TAREFAS_TIMEOUT_SEGUNDOS=1800), \
+                mock.patch.dict(tarefas.EXECUTORES, {Tarefa.TipoChoices.ATUALIZAR_ACOES: lambda progresso: {"ok": True}}):
+            self.assertFalse(tarefas.executar(recente.id))
+            self.assertTrue(tarefas.executar(travada.id))
+            self.assertTrue(tarefas.processar_mensagem(json.dumps({"id": str(recente.id)}), reentregue=True))
+
+        for tarefa in (recente, travada):
+            tarefa.refresh_from_db()
+            self.assertEqual((tarefa.status, tarefa.resultado), ("concluida", {"ok": True}))
+
+    def test_status_marca_tarefa_travada_como_falha(self):
+        travada = self._tarefa_executando(7200)
+        with self.settings(TAREFAS_TIMEOUT_SEGUNDOS=1800):
+            status = self.client.get(reverse("api_status_tarefa", args=[travada.id])).json()
+
+        self.assertEqual(status["status"], "falhou")
+        self.assertIn("interrompida", status["erro"])
+
+    def test_status_marca_pendente_antiga_como_falha(self):
+        antiga = Tarefa.objects.create(tipo=Tarefa.TipoChoices.ATUALIZAR_ACOES)
+        Tarefa.objects.filter(id=antiga.id).update(criada_em=timezone.now() - timedelta(seconds=7200))
+        recente = Tarefa.objects.create(tipo=Tarefa.TipoChoices.ATUALIZAR_ACOES)
+        with self.settings(TAREFAS_TIMEOUT_SEGUNDOS=1800):
+            status_antiga = self.client.get(reverse("api_status_tarefa", args=[antiga.id])).json()
+            status_recente = self.client.get(reverse("api_status_tarefa", args=[recente.id])).json()
+            # Marcada como falha, não é mais assumida por um executor atrasado
+            self.assertFalse(tarefas.executar(antiga.id))
+
+        self.assertEqual(status_antiga["status"], "falhou")
+        self.assertIn("não iniciada", status_antiga["erro"])
+        self.assertEqual(status_recente["status"], "pendente")
+
+
+class CatalogoTests(BrapiTestCase):
+    def setUp(self):
+        super().setUp()
+        catalogo._indice = None
+        CatalogoTicker.objects.create(ticker="PETR4", nome="Petróleo Brasileiro S.A. - Petrobras")
+        CatalogoTicker.objects.create(ticker="PETR3", nome="Petrobras ON")
+        CatalogoTicker.objects.create(ticker="VALE3", nome="Vale S.A.")
+
+    def tearDown(self):
+        catalogo._indice = None
+
+    def test_sugestoes_sem_chamada_externa(self):
+        with mock.patch("requests.Session.get") as get:
+            por_nome = self.client.get(reverse("ajax_sugerir_tickers"), {"q": "PETROLEO bras"}).json()
+            por_prefixo = self.client.get(reverse("ajax_sugerir_tickers"), {"q": "pet"}).json()
+
+        get.assert_not_called()
+        self.assertEqual([s["ticker"] for s in por_nome["sugestoes"]], ["PETR4"])
+        self.assertEqual([s["ticker"] for s in por_prefixo["sugestoes"]], ["PETR3", "PETR4"])
+
+    def test_adicionar_usa_catalogo_local(self):
+        with mock.patch("requests.Session.get", side_effect=brapi_falsa) as get:
+            data = self.client.post(reverse("ajax_adicionar_acao_completa"), {"busca": "vale s.a."}).json()
+
+        self.assertTrue(data["ok"])
+        self.assertEqual(data["ticker"], "VALE3")
+        self.assertFalse(any(c.args[0].endswith("/quote/list") for c in get.call_args_list))
+
+
+    def test_atualizar_apaga_tickers_que_sairam_da_lista(self):
+        with mock.patch("requests.Session.get", side_effect=brapi_falsa):
+            self.assertEqual(catalogo.atualizar(), 3)
+
+        self.assertEqual(
+            sorted(CatalogoTicker.objects.values_list("ticker", flat=True)), ["ERRO3", "PETR4", "VALE3"],
+        )
+        catalogo._indice = None
+        self.assertLess(time.time() - catalogo._carregar_do_banco().carregado_em, 60)
+
+
+class ClienteBrapiTests(TestCase):
+    def setUp(self):
+        self.cliente = brapi.ClienteBrapi(cache_ttl=60, por_minuto=6000, max_tentativas=3)
+
+    def test_repete_em_429_respeitando_retry_after(self):
+        respostas = [RespostaFalsa({}, 429, {"Retry-After": "0"}), RespostaFalsa({"results": []})]
+        with mock.patch.object(self.cliente.session, "get", side_effect=respostas) as get, \
+                mock.patch("api.brapi.time.sleep") as dorme:
+            data = self.cliente.get_json("/quote/PETR4")
+
+        self.assertEqual(data, {"results": []})
+        self.assertEqual(get.call_count, 2)
+        self.assertIn(mock.call(0.0), dorme.call_args_list)
+
+    def test_cache_por_url_e_parametros(self):
+        with mock.patch.object(self.cliente.session, "get", return_value=RespostaFalsa({"results": []})) as get:
+            self.cliente.get_json("/quote/PETR4", {"range": "1d", "interval": "1d"})
+            self.cliente.get_json("/quote/PETR4", {"interval": "1d", "range": "1d"})
+            self.cliente.get_json("/quote/PETR4", {"range": "5d"})
+            self.cliente.get_json("/quote/PETR4", {"range": "1d", "interval": "1d"}, ttl=0)
+
+        self.assertEqual(get.call_count, 3)
+
+    def test_requisicoes_simultaneas_iguais_viram_uma(self):
+        liberar = threading.Event()
+
+        def lenta(url, headers=None, params=None, timeout=None):
+            liberar.wait(5)
+            return RespostaFalsa({"results": [{"symbol": "PETR4"}]})
+
+        resultados = []
+        with mock.patch.object(self.cliente.session, "get", side_effect=lenta) as get:
+            threads = [
+                threading.Thread(target=lambda: resultados.append(self.cliente.get_json("/quote/PETR4", {"range": "1mo"}, ttl=0)))
+                for _ in range(5)
+            ]
+            for t in threads:
+                t.start()
+            time.sleep(0.1)
+            liberar.set()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(len(resultados), 5)
+        self.assertTrue(all(r is resultados[0] for r in resultados))
+
+
+class CoordenadorPostgresTests(TestCase):
+    def _cursor(self, tentativas):
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value = cursor
+        cursor.fetchone.side_effect = [(ok,) for ok in tentativas]
+        return cursor
+
+    def test_lock_de_sessao_fora_de_transacao(self):
+        cursor = self._cursor([False, False, True])
+        with mock.patch("api.coordenacao.connection") as conexao, mock.patch("api.coordenacao.time.sleep") as sleep:
+            conexao.cursor.return_value = cursor
+            with CoordenadorPostgres().travar("/quote/PETR4?"):
+                comandos = [c.args[0] for c in cursor.execute.call_args_list]
+
+        self.assertEqual(comandos, ["SELECT pg_try_advisory_lock(hashtextextended(%s, 0))"] * 3)
+        self.assertEqual(cursor.execute.call_args.args[0], "SELECT pg_advisory_unlock(hashtextextended(%s, 0))")
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_sem_lock_no_prazo_segue_sem_soltar(self):
+        cursor = self._cursor([False] * 100)
+        with mock.patch("api.coordenacao.connection") as conexao, mock.patch("api.coordenacao.time.sleep"), \
+                mock.patch("api.coordenacao.time.monotonic", side_effect=[0, 1, 2, 3]), mock.patch("builtins.print"):
+            conexao.cursor.return_value = cursor
+            with CoordenadorPostgres(espera_maxima=2).travar("/quote/PETR4?"):
+                pass
 
-# Create your tests here.
+        comandos = {c.args[0] for c in cursor.execute.call_args_list}
+        self.assertEqual(comandos, {"SELECT pg_try_advisory_lock(hashtextextended(%s, 0))"})
@@ -0,0 +1,193 @@
+"""
+Versões assíncronas (ASGI) dos endpoints da BRAPI.
+
+Diferente de api/views.py, que agenda tarefas, estas fazem o trabalho na
+própria requisição: sob ASGI ela só ocupa o event loop enquanto espera a BRAPI,
+então um worker mantém centenas de chamadas em voo. As chamadas passam pelo
+ClienteBrapi (cache, orçamento, retries, single-flight) com um
+httpx.AsyncClient por event loop, e as leituras usam o ORM assíncrono.
+
+O Django 4.2 não tem transações assíncronas: os upserts em lote (que dependem
+de transaction.atomic/on_commit) e o recálculo de indicadores rodam em
+sync_to_async, numa thread única compartilhada. O método HTTP é conferido à
+mão porque require_GET/require_POST só aceitam views async a partir do Django 5.0.
+"""
+import asyncio
+import weakref
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotAllowed, JsonResponse
+
+from api import atualizacoes, brapi
+from api.catalogo import catalogo
+from api.persistencia import salvar_acoes_em_lote
+from tela_cadastro.models import Acao
+
+_clientes_http = weakref.WeakKeyDictionary()
+
+
+def _cliente_http():
+    """
+    httpx.AsyncClient do event loop atual (reaproveita conexões entre requisições).
+    """
+    loop = asyncio.get_running_loop()
+    cliente = _clientes_http.get(loop)
+    if cliente is None:
+        limite = getattr(settings, "BRAPI_ASYNC_MAX_CONEXOES", 200)
+        cliente = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=limite, max_keepalive_connections=limite),
+        )
+        _clientes_http[loop] = cliente
+    return cliente
+
+
+def _opcoes_busca():
+    return {
+        "max_concorrencia": getattr(settings, "BRAPI_ASYNC_MAX_CONCORRENCIA", 50),
+        "timeout": getattr(settings, "BRAPI_TIMEOUT", brapi.TIMEOUT_PADRAO),
+        "tamanho_lote": getattr(settings, "BRAPI_TAMANHO_LOTE", brapi.TAMANHO_LOTE_PADRAO),
+    }
+
+
+async def atualizar_acoes_completas(request):
+    opcoes = _opcoes_busca()
+    http = _cliente_http()
+
+    params = {"limit": 100, "sortBy": "volume", "sortOrder": "desc"}
+    try:
+        data = await brapi.get_cliente().get_json_async(http, "/quote/list", params, opcoes["timeout"])
+    except httpx.HTTPStatusError as e:
+        return JsonResponse({
+            "ok": False,
+            "erro": f"Falha ao buscar lista ({e.response.status_code})",
+            "detalhe": e.response.text,
+        })
+
+    stocks = data.get("stocks", [])
+    cotacoes, falhas = await brapi.buscar_cotacoes_async(
+        [s.get("stock") for s in stocks], params={"range": "1d"}, cliente=http, **opcoes,
+    )
+
+    linhas, erros = atualizacoes.montar_linhas(stocks, cotacoes, falhas)
+    try:
+        criadas, atualizadas = await sync_to_async(salvar_acoes_em_lote)(linhas)
+    except Exception as e:
+        criadas, atualizadas = [], []
+        erros.extend({linha["abreviacao"]: str(e)} for linha in linhas)
+
+    return JsonResponse({
+        "ok": True,
+        "criadas": criadas,
+        "atualizadas": atualizadas,
+        "falhas": erros,
+        "qtde_processadas": len(stocks),
+    })
+
+
+async def adicionar_acao_completa(request):
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    nome_ou_ticker = request.POST.get("busca", "").strip()
+    if not nome_ou_ticker:
+        return JsonResponse({"ok": False, "erro": "Campo de busca vazio."})
+
+    cliente = brapi.get_cliente()
+    http = _cliente_http()
+
+    try:
+        # O índice do catálogo pode precisar ser carregado do banco na primeira chamada
+        stock = await sync_to_async(catalogo.buscar)(nome_ou_ticker)
+        if not stock:
+            return JsonResponse({"ok": False, "erro": f"Ação '{nome_ou_ticker}' não encontrada na BRAPI."})
+
+        ticker = stock["ticker"]
+        nome = stock["nome"]
+
+        detail_data = await cliente.get_json_async(http, f"/quote/{ticker}", {"range": "1d", "modules": "summaryProfile"})
+        quote = detail_data.get("results", [{}])[0]
+        profile = dict(quote.get("summaryProfile", {}))
+
+        base_ticker = atualizacoes.ticker_para_fallback(ticker, profile)
+        if base_ticker:
+            try:
+                data2 = await cliente.get_json_async(http, f"/quote/{base_ticker}", {"modules": "summaryProfile"}, timeout=10)
+                prof2 = data2.get("results", [{}])[0].get("summaryProfile", {})
+                if prof2:
+                    profile.update(prof2)
+            except Exception as e:
+                print(f"⚠️ Falha no fallback global: {e}")
+
+        await sync_to_async(salvar_acoes_em_lote)([atualizacoes.linha_acao_detalhada(ticker, nome, quote, profile)])
+        acao = await Acao.objects.only("id").aget(abreviacao=ticker)
+
+        return JsonResponse({
+            "ok": True,
+            "msg": f"Ação {ticker} ({nome}) adicionada com sucesso!",
+            "ticker": ticker,
+            "nome": nome,
+            "acao_id": acao.id
+        })
+
+    except Exception as e:
+        return JsonResponse({"ok": False, "erro": str(e)})
+
+
+async def historico_acao(request, ticker):
+    """
+    Mesmo contrato do antigo historico_acao síncrono (periodo, sync=1, vários
+    tickers separados por vírgula), respondendo com o resultado final.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+
+    periodo = request.GET.get("periodo", "1mo")
+    sync = request.GET.get("sync", "").lower() in ("1", "true", "sim")
+    tickers = [t.strip() for t in ticker.split(",") if t.strip()]
+    if not tickers:
+        return JsonResponse({"ok": False, "erro": "Nenhum ticker informado."})
+    tickers_brapi = {t: t if "." in t else f"{t}.SA" for t in tickers}
+
+    try:
+        if sync:
+            bases = [brapi.simbolo_base(t) for t in tickers]
+            datas = {t: (p, u) async for t, p, u in atualizacoes.consulta_datas_gravadas(bases)}
+            faixas = atualizacoes.calcular_faixas(bases, periodo, datas)
+            faixas = {t: faixas[brapi.simbolo_base(t)] for t in tickers}
+        else:
+            faixas = {t: (periodo, None) for t in tickers}
+
+        # Todas as faixas ao mesmo tempo, cada uma com seus lotes /quote/{T1,...,TN}
+        http = _cliente_http()
+        por_faixa = list(dict.fromkeys(f for f, _ in faixas.values()))
+        buscas = await asyncio.gather(*(
+            brapi.buscar_cotacoes_async(
+                [tickers_brapi[t] for t, (ft, _) in faixas.items() if ft == faixa],
+                params={"range": faixa, "interval": "1d"},
+                cliente=http,
+                **_opcoes_busca(),
+            )
+            for faixa in por_faixa
+        ))
+        cotacoes, falhas = {}, {}
+        for c, f in buscas:
+            cotacoes.update(c)
+            falhas.update(f)
+
+        salvar = sync_to_async(atualizacoes.salvar_historico)
+        por_ticker = {}
+        for t, t_brapi in tickers_brapi.items():
+            if t_brapi in falhas:
+                por_ticker[t] = {"ok": False, "erro": falhas[t_brapi]}
+            else:
+                faixa, ultima = faixas[t]
+                por_ticker[t] = await salvar(t, cotacoes.get(t_brapi), periodo, desde=ultima)
+                if sync:
+                    por_ticker[t]["faixa"] = faixa
+
+        return JsonResponse(atualizacoes.resumo_historico(por_ticker, periodo))
+
+    except Exception as e:
+        return JsonResponse({"ok": False, "erro": str(e)})
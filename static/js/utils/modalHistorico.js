@@ -6,6 +6,31 @@ document.addEventListener('DOMContentLoaded', () => {
   const resultado = document.getElementById('resultadoHistorico');
   let simboloAtual = null;
 
+  const INTERVALO_POLLING_MS = 1000;
+  const ESPERA_MAXIMA_MS = 5 * 60 * 1000;
+  const esperar = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+  // 🔁 Consulta o status da tarefa até ela terminar (ou até ESPERA_MAXIMA_MS), mostrando o progresso
+  async function acompanharTarefa(statusUrl) {
+    const limite = Date.now() + ESPERA_MAXIMA_MS;
+    while (Date.now() < limite) {
+      const resp = await fetch(statusUrl);
+      const tarefa = await resp.json();
+
+      if (!tarefa.ok) return tarefa;
+      if (tarefa.status === "concluida" || tarefa.status === "falhou") {
+        return tarefa.resultado || { ok: false, erro: tarefa.erro };
+      }
+
+      const andamento = tarefa.total ? ` (${tarefa.processados}/${tarefa.total})` : "";
+      resultado.innerHTML = tarefa.status === "pendente"
+        ? "⏳ Na fila..."
+        : `⏳ Buscando e salvando histórico${andamento}...`;
+      await esperar(INTERVALO_POLLING_MS);
+    }
+    return { ok: false, erro: "A atualização está demorando mais que o esperado. Tente consultar novamente mais tarde." };
+  }
+
   // 🔍 Abrir modal ao clicar na lupa
   document.querySelectorAll('.btn-add').forEach(btn => {
     btn.addEventListener('click', () => {
@@ -29,7 +54,11 @@ document.addEventListener('DOMContentLoaded', () => {
 
     try {
       const resp = await fetch(`/api/historico/${simboloAtual}/?periodo=${periodo}`);
-      const data = await resp.json();
+      let data = await resp.json();
+
+      if (data.ok && data.status_url) {
+        data = await acompanharTarefa(data.status_url);
+      }
 
       if (data.ok) {
         resultado.innerHTML = `✅ ${data.msg}`;
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class TelaCadastroConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tela_cadastro'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from api.coordenacao import instalar_coordenador
+        instalar_coordenador()
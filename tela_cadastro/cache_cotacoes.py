@@ -0,0 +1,55 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+CHAVE_VERSAO = "cotacoes:versao"
+
+
+def _cache():
+    return caches[getattr(settings, "COTACOES_CACHE_ALIAS", "default")]
+
+
+def _ttl():
+    return getattr(settings, "COTACOES_CACHE_TTL", 300)
+
+
+def versao_cotacoes():
+    """
+    Versão atual dos dados de Acao. Começa no relógio (em ms) para não repetir
+    versões antigas de um backend compartilhado depois de um restart.
+    """
+    cache = _cache()
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        versao = int(time.time() * 1000)
+        if not cache.add(CHAVE_VERSAO, versao, timeout=None):
+            versao = cache.get(CHAVE_VERSAO, versao)
+    return versao
+
+
+def invalidar_cotacoes():
+    """
+    Troca a versão: os payloads gravados com a versão anterior deixam de ser lidos.
+    """
+    cache = _cache()
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.set(CHAVE_VERSAO, int(time.time() * 1000), timeout=None)
+
+
+def payload_em_cache(nome, construir):
+    """
+    Retorna (corpo, etag) do payload `nome` na versão atual, chamando
+    `construir()` (que devolve bytes) só quando ele ainda não está no cache.
+    """
+    cache = _cache()
+    chave = f"cotacoes:{nome}:{versao_cotacoes()}"
+    guardado = cache.get(chave)
+    if guardado is None:
+        corpo = construir()
+        guardado = (corpo, f'"{hashlib.md5(corpo).hexdigest()}"')
+        cache.set(chave, guardado, timeout=_ttl())
+    return guardado
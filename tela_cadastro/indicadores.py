@@ -0,0 +1,190 @@
+"""
+Indicadores técnicos sobre o fechamento diário do AcaoHistorico.
+
+Os cálculos são vetorizados com NumPy (janelas deslizantes para médias,
+Bollinger e volatilidade; médias exponenciais resolvidas em blocos).
+atualizar_indicadores só recalcula a cauda: carrega também os AQUECIMENTO
+dias anteriores a ela, para que as janelas e as médias exponenciais continuem
+de onde pararam, e grava apenas os dias da cauda.
+"""
+from datetime import timedelta
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from django.db import transaction
+from django.db.models import Max
+
+from tela_cadastro.models import Acao, AcaoHistorico, AcaoIndicador
+
+# Dias anteriores recarregados no modo incremental. Com 250 pregões o peso do
+# valor inicial das EMAs (≤ 26 dias) e do RSI (14) já é desprezível.
+AQUECIMENTO = 250
+
+DIAS_UTEIS_ANO = 252
+TAMANHO_LOTE_BANCO = 500
+
+
+def sma(x, janela):
+    saida = np.full(len(x), np.nan)
+    if len(x) >= janela:
+        saida[janela - 1:] = sliding_window_view(x, janela).mean(axis=1)
+    return saida
+
+
+def desvio_movel(x, janela):
+    saida = np.full(len(x), np.nan)
+    if len(x) >= janela:
+        saida[janela - 1:] = sliding_window_view(x, janela).std(axis=1)
+    return saida
+
+
+def ema(x, alpha, bloco=64):
+    """
+    Média exponencial y[t] = alpha * x[t] + (1 - alpha) * y[t-1], com y[0] = x[0].
+
+    Dentro de cada bloco a recorrência vira uma soma acumulada ponderada por
+    potências de (1 - alpha); blocos curtos mantêm essas potências em uma faixa
+    sem perda de precisão.
+    """
+    n = len(x)
+    saida = np.empty(n)
+    if n == 0:
+        return saida
+    decai = 1.0 - alpha
+    anterior = x[0]
+    saida[0] = x[0]
+    for inicio in range(1, n, bloco):
+        segmento = x[inicio:inicio + bloco]
+        k = np.arange(1, len(segmento) + 1)
+        potencias = decai ** k
+        acumulado = np.cumsum(segmento / potencias)
+        saida[inicio:inicio + len(segmento)] = potencias * (anterior + alpha * acumulado)
+        anterior = saida[inicio + len(segmento) - 1]
+    return saida
+
+
+def rsi(fechamentos, periodo=14):
+    """
+    RSI com a suavização de Wilder (média exponencial com alpha = 1/periodo).
+    """
+    saida = np.full(len(fechamentos), np.nan)
+    if len(fechamentos) <= periodo:
+        return saida
+    delta = np.diff(fechamentos)
+    ganhos = ema(np.clip(delta, 0, None), 1 / periodo)
+    perdas = ema(np.clip(-delta, 0, None), 1 / periodo)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        valores = np.where(perdas == 0, 100.0, 100.0 - 100.0 / (1.0 + ganhos / perdas))
+    saida[periodo:] = valores[periodo - 1:]
+    return saida
+
+
+def calcular_indicadores(fechamentos):
+    """
+    Recebe o array de fechamentos em ordem cronológica e devolve um dict
+    campo -> array, na mesma ordem dos campos do AcaoIndicador.
+    """
+    x = np.asarray(fechamentos, dtype=float)
+    media_20 = sma(x, 20)
+    desvio_20 = desvio_movel(x, 20)
+
+    volatilidade = np.full(len(x), np.nan)
+    if len(x) > 20:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            retornos = np.diff(np.log(x))
+        volatilidade[1:] = desvio_movel(retornos, 20) * np.sqrt(DIAS_UTEIS_ANO)
+
+    return {
+        "sma_20": media_20,
+        "sma_50": sma(x, 50),
+        "ema_12": ema(x, 2 / 13),
+        "ema_26": ema(x, 2 / 27),
+        "rsi_14": rsi(x, 14),
+        "bollinger_superior": media_20 + 2 * desvio_20,
+        "bollinger_inferior": media_20 - 2 * desvio_20,
+        "volatilidade_20": volatilidade,
+    }
+
+
+def _serie_fechamentos(acao, desde=None):
+    qs = AcaoHistorico.objects.filter(acao=acao)
+    if desde is not None:
+        qs = qs.filter(data__gte=desde)
+    linhas = list(qs.order_by("data").values_list("data", "fechamento"))
+    datas = [d for d, _ in linhas]
+    return datas, np.array([f for _, f in linhas], dtype=float)
+
+
+def atualizar_indicadores(acao, desde=None, completo=False):
+    """
+    Calcula e grava os indicadores da ação. Retorna quantos dias foram gravados.
+
+    No modo incremental recalcula só os dias depois do último indicador
+    gravado, ou a partir de `desde` (primeiro dia cujo histórico mudou, ex.: o
+    pregão atual re-ingerido). Se o histórico ganhou dias antigos (backfill) ou
+    `completo=True`, recalcula a série inteira.
+    """
+    corte = None
+    inicio_janela = None
+    if not completo:
+        ultimo = AcaoIndicador.objects.filter(acao=acao).aggregate(u=Max("data"))["u"]
+        if ultimo is not None:
+            calculados = AcaoIndicador.objects.filter(acao=acao).count()
+            no_historico = AcaoHistorico.objects.filter(acao=acao, data__lte=ultimo).count()
+            if calculados == no_historico:
+                corte = ultimo + timedelta(days=1)
+                if desde is not None:
+                    corte = min(corte, desde)
+                inicio_janela = (
+                    AcaoIndicador.objects.filter(acao=acao, data__lt=corte)
+                    .order_by("-data").values_list("data", flat=True)[AQUECIMENTO - 1:AQUECIMENTO].first()
+                )
+
+    datas, fechamentos = _serie_fechamentos(acao, inicio_janela)
+    if not datas:
+        return 0
+
+    indicadores = calcular_indicadores(fechamentos)
+    novos = np.arange(len(datas))
+    if corte is not None:
+        novos = novos[np.array(datas) >= corte]
+    if not len(novos):
+        return 0
+
+    # NaN vira None (NULL) campo a campo
+    colunas = {
+        campo: np.where(np.isnan(valores[novos]), None, valores[novos]).tolist()
+        for campo, valores in indicadores.items()
+    }
+    objetos = [
+        AcaoIndicador(
+            acao=acao,
+            data=datas[i],
+            fechamento=float(fechamentos[i]),
+            **{campo: colunas[campo][posicao] for campo in colunas},
+        )
+        for posicao, i in enumerate(novos)
+    ]
+
+    with transaction.atomic():
+        if corte is None:
+            AcaoIndicador.objects.filter(acao=acao).delete()
+        AcaoIndicador.objects.bulk_create(
+            objetos,
+            batch_size=TAMANHO_LOTE_BANCO,
+            update_conflicts=True,
+            unique_fields=["acao", "data"],
+            update_fields=["fechamento", *indicadores],
+        )
+    return len(objetos)
+
+
+def atualizar_todos(tickers=None, completo=False):
+    """
+    Atualiza os indicadores do universo (ou dos `tickers` informados).
+    Retorna {ticker: dias gravados}.
+    """
+    acoes = Acao.objects.filter(historicos__isnull=False).distinct()
+    if tickers:
+        acoes = acoes.filter(abreviacao__in=[t.upper() for t in tickers])
+    return {acao.abreviacao: atualizar_indicadores(acao, completo=completo) for acao in acoes}
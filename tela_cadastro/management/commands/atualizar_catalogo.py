@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.catalogo import catalogo
+
+
+class Command(BaseCommand):
+    help = "Baixa o /quote/list da BRAPI para o catálogo local de tickers (CatalogoTicker)."
+
+    def handle(self, *args, **options):
+        total = catalogo.atualizar()
+        self.stdout.write(self.style.SUCCESS(f"✓ {total} tickers no catálogo"))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tela_cadastro.indicadores import atualizar_todos
+
+
+class Command(BaseCommand):
+    help = "Calcula os indicadores técnicos (AcaoIndicador) a partir do AcaoHistorico."
+
+    def add_arguments(self, parser):
+        parser.add_argument("tickers", nargs="*", help="Tickers a atualizar (padrão: todos com histórico)")
+        parser.add_argument("--completo", action="store_true", help="Recalcula a série inteira em vez de só a cauda")
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        gravados = atualizar_todos(options["tickers"], completo=options["completo"])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {sum(gravados.values())} dias gravados em {len(gravados)} ações "
+            f"({time.monotonic() - inicio:.2f}s)"
+        ))
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from api import brapi
+from api.catalogo import catalogo
+from tela_cadastro.models import CatalogoTicker
+
+
+def _servidor_brapi_falso(latencia):
+    """
+    BRAPI local que responde /quote/{T} depois de `latencia` segundos.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latencia)
+            ticker = self.path.split("?", 1)[0].rsplit("/", 1)[-1]
+            corpo = json.dumps({"results": [{
+                "symbol": ticker,
+                "regularMarketPrice": 10.0,
+                "summaryProfile": {"sector": "Benchmark", "industry": "Benchmark"},
+            }]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    class Servidor(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    servidor = Servidor(("127.0.0.1", 0), Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def _resumo(nome, resultados, total):
+    """
+    `resultados`: (duração, ok) por requisição. Vazão e latências contam só as
+    que deram certo; as falhas aparecem ao lado.
+    """
+    duracoes = sorted(d for d, ok in resultados if ok)
+    falhas = len(resultados) - len(duracoes)
+    if not duracoes:
+        return f"{nome:<6} nenhuma requisição bem-sucedida ({falhas} falhas)   total {total:.1f}s"
+    return (
+        f"{nome:<6} {len(duracoes) / total:8.1f} req/s ok ({falhas} falhas)   "
+        f"p50 {statistics.median(duracoes) * 1000:7.0f} ms   "
+        f"p95 {duracoes[max(int(len(duracoes) * 0.95) - 1, 0)] * 1000:7.0f} ms   "
+        f"total {total:.1f}s"
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a vazão de adicionar_acao_completa síncrona (handler WSGI, N threads) com a "
+        "versão async (handler ASGI, um event loop) contra uma BRAPI falsa com latência fixa. "
+        "Roda num banco de teste descartável; para medir servidores reais, suba gunicorn "
+        "(Consultor_bolsa.wsgi) e uvicorn (Consultor_bolsa.asgi) e aponte um gerador de carga "
+        "para /ajax/adicionar-acao-completa/ e /ajax/async/adicionar-acao-completa/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requisicoes", type=int, default=200, help="Requisições por modo.")
+        parser.add_argument("--latencia-ms", type=int, default=200, help="Latência da BRAPI falsa.")
+        parser.add_argument("--threads", type=int, default=8, help="Threads de worker no modo WSGI.")
+        parser.add_argument("--concorrencia", type=int, default=200, help="Requisições em voo no modo ASGI.")
+
+    def handle(self, *args, **options):
+        n = options["requisicoes"]
+        servidor = _servidor_brapi_falso(options["latencia_ms"] / 1000)
+        cliente_original = brapi._cliente
+        # Sem cache nem orçamento: toda requisição vai à BRAPI falsa
+        brapi._cliente = brapi.ClienteBrapi(
+            base_url=f"http://127.0.0.1:{servidor.server_port}",
+            cache_ttl=0,
+            por_minuto=10 ** 9,
+            tamanho_pool=max(options["threads"], 10) * 2,
+        )
+
+        setup_test_environment()
+        arquivo_db = None
+        if connection.vendor == "sqlite":
+            # Arquivo em vez de memória: as threads do modo WSGI gravam ao mesmo tempo
+            arquivo_db = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False).name
+            settings.DATABASES["default"].setdefault("TEST", {})["NAME"] = arquivo_db
+        nome_original = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        try:
+            # Um ticker diferente por requisição, para o single-flight não juntar nada
+            CatalogoTicker.objects.bulk_create([
+                CatalogoTicker(ticker=f"BNC{i:05d}", nome=f"Benchmark {i:05d}") for i in range(2 * n)
+            ])
+            catalogo._indice = None
+            tickers = [f"BNC{i:05d}" for i in range(2 * n)]
+
+            self.stdout.write(
+                f"{n} requisições por modo, BRAPI com {options['latencia_ms']} ms de latência, "
+                f"WSGI com {options['threads']} threads, ASGI com {options['concorrencia']} em voo\n"
+            )
+            if arquivo_db:
+                self.stdout.write(self.style.WARNING(
+                    "SQLite: gravações simultâneas das threads WSGI podem falhar com 'database is locked' "
+                    "(contadas em falhas, fora do req/s); no ASGI o ORM já roda numa thread só. Use Postgres para números comparáveis.\n"
+                ))
+            self.stdout.write(self._wsgi(tickers[:n], options["threads"]))
+            self.stdout.write(self._asgi(tickers[n:], options["concorrencia"]))
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teardown_test_environment()
+            brapi._cliente = cliente_original
+            catalogo._indice = None
+            servidor.shutdown()
+            if arquivo_db and os.path.exists(arquivo_db):
+                os.remove(arquivo_db)
+
+    def _wsgi(self, tickers, threads):
+        url = reverse("ajax_adicionar_acao_completa")
+        local = threading.local()
+
+        def requisitar(ticker):
+            if not hasattr(local, "client"):
+                local.client = Client()
+            inicio = time.perf_counter()
+            try:
+                ok = local.client.post(url, {"busca": ticker}).json().get("ok")
+            except Exception:
+                ok = False
+            return time.perf_counter() - inicio, bool(ok)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            resultados = list(executor.map(requisitar, tickers))
+        total = time.perf_counter() - inicio
+        return _resumo("WSGI", resultados, total)
+
+    def _asgi(self, tickers, concorrencia):
+        url = reverse("ajax_adicionar_acao_completa_async")
+
+        async def executar():
+            client = AsyncClient()
+            semaforo = asyncio.Semaphore(concorrencia)
+
+            async def requisitar(ticker):
+                async with semaforo:
+                    inicio = time.perf_counter()
+                    try:
+                        ok = (await client.post(url, {"busca": ticker})).json().get("ok")
+                    except Exception:
+                        ok = False
+                    return time.perf_counter() - inicio, bool(ok)
+
+            return await asyncio.gather(*(requisitar(t) for t in tickers))
+
+        inicio = time.perf_counter()
+        resultados = asyncio.run(executar())
+        total = time.perf_counter() - inicio
+        return _resumo("ASGI", resultados, total)
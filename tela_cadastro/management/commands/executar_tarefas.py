@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from api import tarefas
+from Monitoramento.config.rabbitmq_config import RabbitMQConfig
+
+
+class Command(BaseCommand):
+    help = "Consome a fila_tarefas do RabbitMQ e executa as tarefas de atualização da BRAPI."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefetch", type=int, default=1,
+                            help="Tarefas recebidas de uma vez (cada uma pode levar minutos).")
+
+    def handle(self, *args, **options):
+        rabbitmq = RabbitMQConfig()
+        connection = rabbitmq.get_connection()
+        channel = connection.channel()
+        rabbitmq.setup_exchanges_and_queues(channel)
+        channel.basic_qos(prefetch_count=options["prefetch"])
+
+        self.stdout.write(f"Consumindo {tarefas.FILA}...")
+        try:
+            for method, properties, body in channel.consume(tarefas.FILA):
+                try:
+                    # Reentregue = o consumidor anterior caiu no meio: retoma mesmo EXECUTANDO
+                    tarefas.processar_mensagem(body, reentregue=method.redelivered)
+                except Exception as e:
+                    # Falhas da própria tarefa já ficam gravadas nela; aqui só sobra erro de mensagem/banco
+                    self.stderr.write(f"⚠️ Mensagem de tarefa descartada: {e}")
+                    channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                    continue
+                channel.basic_ack(delivery_tag=method.delivery_tag)
+        except KeyboardInterrupt:
+            self.stdout.write("\nEncerrando executor de tarefas...")
+        finally:
+            if channel.is_open:
+                channel.cancel()
+            if connection.is_open:
+                connection.close()
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.25 on 2026-10-18 10:56
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remover_duplicados(apps, schema_editor):
+    """
+    Mantém só o registro mais recente de cada (acao, data, periodo) antes de
+    recriar a restrição de unicidade.
+    """
+    AcaoHistorico = apps.get_model("tela_cadastro", "AcaoHistorico")
+    duplicados = (
+        AcaoHistorico.objects.values("acao", "data", "periodo")
+        .annotate(ultimo=Max("id"), total=Count("id"))
+        .filter(total__gt=1)
+    )
+    for d in duplicados:
+        AcaoHistorico.objects.filter(
+            acao=d["acao"], data=d["data"], periodo=d["periodo"]
+        ).exclude(id=d["ultimo"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tela_cadastro', '0006_remove_dividendo_acao_remove_empresaperfil_acao_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='acaohistorico',
+            options={'ordering': ['-data'], 'verbose_name': 'Histórico da Ação', 'verbose_name_plural': 'Históricos das Ações'},
+        ),
+        migrations.RunPython(remover_duplicados, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='acaohistorico',
+            unique_together={('acao', 'data', 'periodo')},
+        ),
+        migrations.AddIndex(
+            model_name='acaohistorico',
+            index=models.Index(fields=['acao', 'data'], name='tela_cadast_acao_id_cef9c2_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.25 on 2026-10-18 11:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tela_cadastro', '0007_acaohistorico_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AcaoIndicador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('fechamento', models.FloatField()),
+                ('sma_20', models.FloatField(blank=True, null=True)),
+                ('sma_50', models.FloatField(blank=True, null=True)),
+                ('ema_12', models.FloatField(blank=True, null=True)),
+                ('ema_26', models.FloatField(blank=True, null=True)),
+                ('rsi_14', models.FloatField(blank=True, null=True)),
+                ('bollinger_superior', models.FloatField(blank=True, null=True)),
+                ('bollinger_inferior', models.FloatField(blank=True, null=True)),
+                ('volatilidade_20', models.FloatField(blank=True, help_text='Desvio padrão anualizado dos retornos log (20 dias)', null=True)),
+                ('acao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indicadores', to='tela_cadastro.acao')),
+            ],
+            options={
+                'verbose_name': 'Indicador da Ação',
+                'verbose_name_plural': 'Indicadores das Ações',
+                'ordering': ['-data'],
+                'unique_together': {('acao', 'data')},
+            },
+        ),
+    ]
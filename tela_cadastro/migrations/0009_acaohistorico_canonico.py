@@ -0,0 +1,72 @@
+# Generated by Django 4.2.25 on 2026-10-18 11:12
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def unificar_periodos(apps, schema_editor):
+    """
+    O mesmo candle diário podia estar gravado uma vez por período da BRAPI
+    (1mo, 3mo, 1y...). Mantém só o registro mais recente de cada (acao, data).
+    """
+    AcaoHistorico = apps.get_model("tela_cadastro", "AcaoHistorico")
+    mantidos = AcaoHistorico.objects.values("acao", "data").annotate(ultimo=Max("id")).values("ultimo")
+    AcaoHistorico.objects.exclude(id__in=mantidos).delete()
+
+
+def cobrir_restricao_unica(apps, schema_editor):
+    """
+    No Postgres a própria restrição única passa a carregar os preços
+    (UNIQUE ... INCLUDE), mantendo o nome: as consultas por faixa de datas viram
+    index-only sem um segundo índice. O estado do Django fica com a restrição
+    sem include, porque nos outros bancos uma UniqueConstraint com include não
+    é criada (nem recriada quando o SQLite refaz a tabela) e o upsert do
+    histórico depende dela.
+    """
+    if schema_editor.connection.vendor == "postgresql":
+        _trocar_restricao_unica(schema_editor, " INCLUDE (abertura, fechamento, alta, baixa, volume)")
+
+
+def descobrir_restricao_unica(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        _trocar_restricao_unica(schema_editor, "")
+
+
+def _trocar_restricao_unica(schema_editor, include):
+    schema_editor.execute("ALTER TABLE tela_cadastro_acaohistorico DROP CONSTRAINT acaohistorico_acao_data_uniq")
+    schema_editor.execute(
+        "ALTER TABLE tela_cadastro_acaohistorico "
+        "ADD CONSTRAINT acaohistorico_acao_data_uniq UNIQUE (acao_id, data)" + include
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tela_cadastro', '0008_acaoindicador'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='acaohistorico',
+            name='tela_cadast_acao_id_cef9c2_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='acaohistorico',
+            unique_together=set(),
+        ),
+        migrations.RunPython(unificar_periodos, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='acaohistorico',
+            name='periodo',
+        ),
+        migrations.RemoveField(
+            model_name='acaohistorico',
+            name='variacao',
+        ),
+        migrations.AddConstraint(
+            model_name='acaohistorico',
+            constraint=models.UniqueConstraint(fields=('acao', 'data'), name='acaohistorico_acao_data_uniq'),
+        ),
+        migrations.RunPython(cobrir_restricao_unica, descobrir_restricao_unica),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.25 on 2026-10-18 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tela_cadastro', '0009_acaohistorico_canonico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogoTicker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=20, unique=True)),
+                ('nome', models.CharField(max_length=200)),
+                ('tipo', models.CharField(blank=True, default='', max_length=20)),
+                ('setor', models.CharField(blank=True, max_length=100, null=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Ticker do Catálogo',
+                'verbose_name_plural': 'Catálogo de Tickers',
+                'ordering': ['ticker'],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.25 on 2026-10-18 11:18
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tela_cadastro', '0010_catalogoticker'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarefa',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('atualizar_acoes', 'Atualizar ações'), ('historico', 'Histórico')], max_length=20)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=20)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('processados', models.PositiveIntegerField(default=0)),
+                ('por_ticker', models.JSONField(blank=True, default=dict)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('erro', models.TextField(blank=True, null=True)),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciada_em', models.DateTimeField(blank=True, null=True)),
+                ('concluida_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Tarefa',
+                'verbose_name_plural': 'Tarefas',
+                'ordering': ['-criada_em'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tela_cadastro', '0011_tarefa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='chat_id',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+    ]
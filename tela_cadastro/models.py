@@ -1,3 +1,5 @@
+import uuid
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
@@ -71,32 +73,49 @@ class AcaoHistorico(models.Model):
     alta = models.FloatField(default=0)
     baixa = models.FloatField(default=0)
     volume = models.FloatField(default=0)
-    variacao = models.FloatField(blank=True, null=True)
-    periodo = models.CharField(
-        max_length=10,
-        choices=PeriodoChoices.choices,
-        default=PeriodoChoices.D1,
-        help_text="Intervalo dos dados históricos conforme BRAPI"
-    )
 
     class Meta:
         verbose_name = "Histórico da Ação"
         verbose_name_plural = "Históricos das Ações"
         ordering = ["-data"]
-        unique_together = ("acao", "data", "periodo")
-        indexes = [
-            models.Index(fields=["acao", "data"]),
+        # Um candle diário por ação; os períodos da BRAPI (PeriodoChoices) são só
+        # faixas de busca. No Postgres a migration 0009 redefine esta restrição
+        # como UNIQUE (acao, data) INCLUDE (preços), para as consultas por faixa
+        # de datas serem index-only (sem include aqui: o SQLite ignoraria a
+        # restrição inteira).
+        constraints = [
+            models.UniqueConstraint(fields=["acao", "data"], name="acaohistorico_acao_data_uniq"),
         ]
 
     def __str__(self):
-        return f"{self.acao.abreviacao} ({self.data}) - {self.periodo}"
+        return f"{self.acao.abreviacao} ({self.data})"
+
+class AcaoIndicador(models.Model):
+    """
+    Indicadores técnicos diários calculados sobre o fechamento do AcaoHistorico
+    (ver tela_cadastro/indicadores.py). Campos ficam nulos enquanto a janela
+    do indicador ainda não tem dias suficientes.
+    """
+    acao = models.ForeignKey(Acao, on_delete=models.CASCADE, related_name="indicadores")
+    data = models.DateField()
+    fechamento = models.FloatField()
+    sma_20 = models.FloatField(blank=True, null=True)
+    sma_50 = models.FloatField(blank=True, null=True)
+    ema_12 = models.FloatField(blank=True, null=True)
+    ema_26 = models.FloatField(blank=True, null=True)
+    rsi_14 = models.FloatField(blank=True, null=True)
+    bollinger_superior = models.FloatField(blank=True, null=True)
+    bollinger_inferior = models.FloatField(blank=True, null=True)
+    volatilidade_20 = models.FloatField(blank=True, null=True, help_text="Desvio padrão anualizado dos retornos log (20 dias)")
 
     class Meta:
-        verbose_name = "Perfil da Empresa"
-        verbose_name_plural = "Perfis das Empresas"
+        verbose_name = "Indicador da Ação"
+        verbose_name_plural = "Indicadores das Ações"
+        ordering = ["-data"]
+        unique_together = ("acao", "data")
 
     def __str__(self):
-        return f"Perfil de {self.acao.abreviacao}"
+        return f"{self.acao.abreviacao} ({self.data})"
 
 class Monitoramento(models.Model):
     DIRECAO_CHOICES = [
@@ -111,4 +130,67 @@ class Monitoramento(models.Model):
     ativo = models.BooleanField(default=True)
     adicionado_em = models.DateTimeField(auto_now_add=True)
     preco_alvo = models.FloatField()
-    direcao = models.CharField(max_length=20, choices=DIRECAO_CHOICES)
\ No newline at end of file
+    direcao = models.CharField(max_length=20, choices=DIRECAO_CHOICES)
+
+
+# ==========================================================
+# 3︝⃣  CATÁLOGO DE TICKERS (cópia local da BRAPI)
+# ==========================================================
+class CatalogoTicker(models.Model):
+    """
+    Cópia local do /quote/list da BRAPI, usada na busca de ações (api/catalogo.py).
+    """
+    ticker = models.CharField(max_length=20, unique=True)
+    nome = models.CharField(max_length=200)
+    tipo = models.CharField(max_length=20, blank=True, default="")
+    setor = models.CharField(max_length=100, blank=True, null=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Ticker do Catálogo"
+        verbose_name_plural = "Catálogo de Tickers"
+        ordering = ["ticker"]
+
+    def __str__(self):
+        return f"{self.ticker} - {self.nome}"
+
+
+# ==========================================================
+# 4︝⃣  TAREFAS (atualizações da BRAPI em segundo plano)
+# ==========================================================
+class Tarefa(models.Model):
+    """
+    Atualização da BRAPI executada fora da requisição (ver api/tarefas.py).
+    `por_ticker` vai sendo preenchido durante a execução; `resultado` guarda o
+    resumo final, no mesmo formato que o endpoint síncrono devolvia.
+    """
+    class TipoChoices(models.TextChoices):
+        ATUALIZAR_ACOES = "atualizar_acoes", "Atualizar ações"
+        HISTORICO = "historico", "Histórico"
+
+    class StatusChoices(models.TextChoices):
+        PENDENTE = "pendente", "Pendente"
+        EXECUTANDO = "executando", "Executando"
+        CONCLUIDA = "concluida", "Concluída"
+        FALHOU = "falhou", "Falhou"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tipo = models.CharField(max_length=20, choices=TipoChoices.choices)
+    parametros = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=StatusChoices.choices, default=StatusChoices.PENDENTE)
+    total = models.PositiveIntegerField(default=0)
+    processados = models.PositiveIntegerField(default=0)
+    por_ticker = models.JSONField(default=dict, blank=True)
+    resultado = models.JSONField(blank=True, null=True)
+    erro = models.TextField(blank=True, null=True)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    iniciada_em = models.DateTimeField(blank=True, null=True)
+    concluida_em = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Tarefa"
+        verbose_name_plural = "Tarefas"
+        ordering = ["-criada_em"]
+
+    def __str__(self):
+        return f"{self.tipo} ({self.status})"
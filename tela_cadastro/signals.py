@@ -0,0 +1,69 @@
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache_cotacoes import invalidar_cotacoes
+from .models import Acao, Monitoramento
+
+
+def _evento_monitoramento(monitoramento, ativo):
+    return {
+        "id": monitoramento.id,
+        "ticker": monitoramento.acao.abreviacao,
+        "preco_alvo": monitoramento.preco_alvo,
+        "direcao": monitoramento.direcao,
+        "ativo": ativo,
+        "usuario_id": monitoramento.usuario_id,
+        "chat_id": monitoramento.usuario.chat_id,
+        "telefone": monitoramento.usuario.telefone,
+    }
+
+
+def publicar_evento_monitoramento(evento):
+    """
+    Publica `monitoramento.<TICKER>` no stock_topic para o motor de alertas
+    atualizar seu índice sem recarregar a tabela inteira. Usa o pool de
+    conexões do processo, então não paga um handshake novo por evento.
+    """
+    import pika
+    from Monitoramento.config.rabbitmq_pool import get_pool
+
+    try:
+        get_pool().publicar(
+            "stock_topic",
+            f"monitoramento.{evento['ticker']}",
+            json.dumps(evento),
+            pika.BasicProperties(delivery_mode=2, content_type="application/json"),
+        )
+    except Exception as e:
+        print(f"⚠️ Falha ao publicar evento de monitoramento: {e}")
+
+
+def _agendar_publicacao(monitoramento, ativo):
+    if not getattr(settings, "MONITORAMENTO_PUBLICAR_EVENTOS", False):
+        return
+    evento = _evento_monitoramento(monitoramento, ativo)
+    # Só publica depois do commit e fora da thread da requisição
+    transaction.on_commit(
+        lambda: threading.Thread(target=publicar_evento_monitoramento, args=(evento,), daemon=True).start()
+    )
+
+
+@receiver(post_save, sender=Monitoramento)
+def monitoramento_salvo(sender, instance, **kwargs):
+    _agendar_publicacao(instance, instance.ativo)
+
+
+@receiver(post_delete, sender=Monitoramento)
+def monitoramento_removido(sender, instance, **kwargs):
+    _agendar_publicacao(instance, False)
+
+
+@receiver(post_save, sender=Acao)
+@receiver(post_delete, sender=Acao)
+def acao_alterada(sender, instance, **kwargs):
+    transaction.on_commit(invalidar_cotacoes)
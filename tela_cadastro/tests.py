@@ -1,3 +1,154 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from Consultor_bolsa.historico import lttb
+from tela_cadastro.indicadores import atualizar_indicadores
+from tela_cadastro.models import Acao, AcaoHistorico, AcaoIndicador, Monitoramento, Usuario
+
+
+class EventosMonitoramentoTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user("ana@x.com", "ana@x.com", "senha", chat_id="42")
+        self.acao = Acao.objects.create(abreviacao="PETR4", nome="Petrobras")
+
+    def _eventos_publicados(self, acao):
+        with mock.patch("tela_cadastro.signals.threading.Thread") as thread, \
+                self.captureOnCommitCallbacks(execute=True):
+            acao()
+        return [c.kwargs["args"][0] for c in thread.call_args_list]
+
+    def test_publica_criacao_e_desativacao(self):
+        with self.settings(MONITORAMENTO_PUBLICAR_EVENTOS=True):
+            criados = self._eventos_publicados(lambda: Monitoramento.objects.create(
+                usuario=self.usuario, acao=self.acao, preco_alvo=30, direcao="acima"
+            ))
+            m = Monitoramento.objects.get()
+            m.ativo = False
+            desativados = self._eventos_publicados(m.save)
+
+        self.assertEqual(criados[0]["ticker"], "PETR4")
+        self.assertEqual(criados[0]["chat_id"], "42")
+        self.assertTrue(criados[0]["ativo"])
+        self.assertFalse(desativados[0]["ativo"])
+
+    def test_nao_publica_sem_rabbitmq_configurado(self):
+        with self.settings(MONITORAMENTO_PUBLICAR_EVENTOS=False):
+            eventos = self._eventos_publicados(lambda: Monitoramento.objects.create(
+                usuario=self.usuario, acao=self.acao, preco_alvo=30, direcao="acima"
+            ))
+        self.assertEqual(eventos, [])
+
+
+class DadosBasicosCacheTests(TestCase):
+    url = "/banco/acoes/basicas/"
+
+    def setUp(self):
+        cache.clear()
+        Acao.objects.create(abreviacao="PETR4", nome="Petrobras", valor_atual=30)
+
+    def test_serve_do_cache_e_responde_304(self):
+        primeira = self.client.get(self.url)
+        self.assertEqual(primeira.json()["dados"][0]["ticker"], "PETR4")
+
+        with self.assertNumQueries(0):
+            segunda = self.client.get(self.url)
+            nao_modificada = self.client.get(self.url, HTTP_IF_NONE_MATCH=primeira["ETag"])
+
+        self.assertEqual(segunda.content, primeira.content)
+        self.assertEqual(nao_modificada.status_code, 304)
+
+    def test_gravacao_em_acao_invalida(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Acao.objects.filter(abreviacao="PETR4").get().save()
+            Acao.objects.create(abreviacao="VALE3", nome="Vale")
+
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([d["ticker"] for d in resposta.json()["dados"]], ["PETR4", "VALE3"])
+
+
+class HistoricoReduzidoTests(TestCase):
+    def setUp(self):
+        self.acao = Acao.objects.create(abreviacao="PETR4", nome="Petrobras")
+        segunda = date.today() - timedelta(days=date.today().weekday() + 21)
+        for i in range(14):
+            AcaoHistorico.objects.create(
+                acao=self.acao, data=segunda + timedelta(days=i),
+                abertura=10 + i, fechamento=11 + i, alta=12 + i, baixa=9 + i, volume=100,
+            )
+        self.url = "/banco/historico_ou_basico/PETR4/"
+
+    def test_candles_semanais(self):
+        dados = self.client.get(self.url, {"periodo": "1y", "resolucao": "semanal"}).json()["dados"]
+        self.assertEqual(len(dados), 2)
+        self.assertEqual(dados[0], {
+            "data": dados[0]["data"], "abertura": 10.0, "alta": 18.0, "baixa": 9.0, "fechamento": 17.0, "volume": 700,
+        })
+
+    def test_max_points_mantem_extremos(self):
+        resposta = self.client.get(self.url, {"periodo": "1y", "max_points": 5}).json()
+        self.assertEqual(resposta["total_pontos"], 14)
+        self.assertEqual(len(resposta["dados"]), 5)
+        self.assertEqual(resposta["dados"][0]["fechamento"], 11.0)
+        self.assertEqual(resposta["dados"][-1]["fechamento"], 24.0)
+
+    def test_lttb_mantem_picos_e_extremos(self):
+        serie = [(i, 10.0) for i in range(100)]
+        serie[37] = (37, 50.0)
+        serie[71] = (71, -20.0)
+
+        reduzida = lttb(serie, 10, valor=lambda p: p[1])
+        self.assertEqual(len(reduzida), 10)
+        self.assertEqual(reduzida[0], serie[0])
+        self.assertEqual(reduzida[-1], serie[-1])
+        self.assertIn(serie[37], reduzida)
+        self.assertIn(serie[71], reduzida)
+        self.assertEqual([p[0] for p in reduzida], sorted(p[0] for p in reduzida))
+        self.assertEqual(lttb(serie, 2, valor=lambda p: p[1]), [serie[0], serie[-1]])
+
+    def test_formato_colunar(self):
+        linhas = self.client.get(self.url, {"periodo": "1y"})
+        colunar = self.client.get(self.url, {"periodo": "1y", "formato": "colunar"})
+        dados = colunar.json()["dados"]
+
+        primeiro = AcaoHistorico.objects.order_by("data").first().data
+        self.assertEqual(dados["data"][0], (primeiro - date(1970, 1, 1)).days)
+        self.assertEqual(dados["fechamento"], [r["fechamento"] for r in linhas.json()["dados"]])
+        self.assertLess(len(colunar.content), len(linhas.content) / 2)
+
+
+class IndicadoresTests(TestCase):
+    def setUp(self):
+        self.acao = Acao.objects.create(abreviacao="PETR4", nome="Petrobras")
+        self.inicio = date.today() - timedelta(days=80)
+        for i in range(60):
+            self._dia(i, 30 + (i % 7) - i * 0.1)
+
+    def _dia(self, i, fechamento):
+        AcaoHistorico.objects.create(acao=self.acao, data=self.inicio + timedelta(days=i), fechamento=fechamento)
+
+    def test_calculo_e_cauda_incremental(self):
+        self.assertEqual(atualizar_indicadores(self.acao), 60)
+        ultimo = AcaoIndicador.objects.get(data=self.inicio + timedelta(days=59))
+        fechamentos = list(AcaoHistorico.objects.order_by("data").values_list("fechamento", flat=True))
+        self.assertAlmostEqual(ultimo.sma_20, sum(fechamentos[-20:]) / 20)
+        self.assertIsNone(AcaoIndicador.objects.get(data=self.inicio).sma_20)
+
+        self._dia(60, 25)
+        self.assertEqual(atualizar_indicadores(self.acao), 1)
+        incremental = list(AcaoIndicador.objects.order_by("data").values_list("ema_26", "rsi_14"))
+        atualizar_indicadores(self.acao, completo=True)
+        completo = list(AcaoIndicador.objects.order_by("data").values_list("ema_26", "rsi_14"))
+        self.assertEqual(len(incremental), 61)
+        for (ema_i, rsi_i), (ema_c, rsi_c) in zip(incremental[14:], completo[14:]):
+            self.assertAlmostEqual(ema_i, ema_c)
+            self.assertAlmostEqual(rsi_i, rsi_c)
+
+    def test_endpoint_calcula_sob_demanda(self):
+        dados = self.client.get("/banco/indicadores/PETR4/", {"periodo": "1y"}).json()["dados"]
+        self.assertEqual(len(dados), 60)
+        self.assertIn("bollinger_superior", dados[-1])